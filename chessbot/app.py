@@ -1,10 +1,16 @@
+import itertools
+import logging
 import os
+import threading
 from flask import Flask, render_template, jsonify, request
 from chessbot.board import Board
 from chessbot.move import Move
 from chessbot.square import Square
 from chessbot.piece import *
-from chessbot.chess_ai_bot import get_best_move
+from chessbot.chess_ai_bot import DIFFICULTY_LEVELS, DEFAULT_DIFFICULTY
+from chessbot.engine import EnginePool, DONE, FAILED
+from chessbot.polyglot import get_book
+from chessbot.ingest import get_index
 from chessbot.const import BOARD_HEIGHT, BOARD_WIDTH
 import json
 import traceback
@@ -21,8 +27,26 @@ if os.environ.get('FLASK_ENV') == 'production':
 else:
     app.config['DEBUG'] = True
 
+# Search statistics are logged, one JSON line per AI search
+logging.basicConfig(level=os.environ.get('LOG_LEVEL', 'INFO'))
+
 # Store active games in memory (in production, use a proper database)
 games = {}
+game_ids = itertools.count()
+# game id -> the AI's difficulty level in that game
+difficulties = {}
+# Held while a game's board is read or changed; AI moves land from another thread
+games_lock = threading.RLock()
+
+# AI moves are searched in background processes, not in the request
+engine = EnginePool()
+# Map the opening book and index now, so processes forked from this one share them
+get_book()
+get_index()
+# Longest a client may long-poll /ai_move, in seconds
+MAX_POLL_WAIT = 30
+# Set PONDER=1 to search the player's expected reply while they think
+PONDER = os.environ.get('PONDER', '0') == '1'
 
 
 @app.route('/')
@@ -39,18 +63,35 @@ def game():
 
 @app.route('/new_game', methods=['POST'])
 def new_game():
-    """Create a new game instance."""
+    """Create a new game instance, abandoning `previous_game_id` if given.
+
+    `difficulty` picks one of DIFFICULTY_LEVELS for the AI (default
+    DEFAULT_DIFFICULTY).
+    """
     try:
-        game_id = len(games)
-        new_game = Game()
-        new_game.reset()  # Ensure complete reset including captured pieces
-        games[game_id] = new_game.board  # This will be a fresh board with reset scores
-        return jsonify({
-            'game_id': game_id,
-            'board': get_board_state(games[game_id]),
-            'captured_pieces': games[game_id].captured_pieces,
-            'scores': {'white': games[game_id].white_score, 'black': games[game_id].black_score}
-        })
+        data = request.get_json(silent=True) or {}
+        difficulty = data.get('difficulty') or DEFAULT_DIFFICULTY
+        if difficulty not in DIFFICULTY_LEVELS:
+            return jsonify({'error': 'Unknown difficulty'}), 400
+        with games_lock:
+            previous = data.get('previous_game_id')
+            if previous in games:
+                # Stop searching for a game nobody is playing any more
+                engine.cancel_game(previous)
+                del games[previous]
+                del difficulties[previous]
+            game_id = next(game_ids)
+            new_game = Game()
+            new_game.reset()  # Ensure complete reset including captured pieces
+            games[game_id] = new_game.board  # This will be a fresh board with reset scores
+            difficulties[game_id] = difficulty
+            return jsonify({
+                'game_id': game_id,
+                'difficulty': difficulty,
+                'board': get_board_state(games[game_id]),
+                'captured_pieces': games[game_id].captured_pieces,
+                'scores': {'white': games[game_id].white_score, 'black': games[game_id].black_score}
+            })
     except Exception as e:
         print(f"Error creating new game: {str(e)}")
         traceback.print_exc()
@@ -66,21 +107,22 @@ def get_valid_moves():
         row = data.get('row')
         col = data.get('col')
 
-        if game_id not in games:
-            return jsonify({'error': 'Invalid game'}), 400
+        with games_lock:
+            if game_id not in games:
+                return jsonify({'error': 'Invalid game'}), 400
 
-        board = games[game_id]
-        piece = board.squares[row][col].piece
+            board = games[game_id]
+            piece = board.squares[row][col].piece
 
-        if not piece:
-            return jsonify({'error': 'No piece at selected position'}), 400
+            if not piece:
+                return jsonify({'error': 'No piece at selected position'}), 400
 
-        # Calculate valid moves
-        board.calc_moves(piece, row, col, bool=True)
+            # Calculate valid moves
+            moves = board.calc_moves(piece, row, col, bool=True)
 
         # Convert moves to list of coordinates
         valid_moves = [{'row': move.final.row, 'col': move.final.col}
-                       for move in piece.moves]
+                       for move in moves]
 
         return jsonify({'valid_moves': valid_moves})
 
@@ -92,97 +134,56 @@ def get_valid_moves():
 
 @app.route('/make_move', methods=['POST'])
 def make_move():
-    """Handle a move request."""
+    """Handle a move request.
+
+    The player's move is applied at once and the AI's reply is searched in
+    the background: the response carries a `job_id` to poll /ai_move with.
+    """
     try:
         data = request.get_json()
         game_id = data.get('game_id')
-        
-        if game_id not in games:
-            return jsonify({'error': 'Invalid game'}), 400
-
-        board = games[game_id]
-        
-        # Create move from the data
-        from_square = Square(data['from_row'], data['from_col'])
-        to_square = Square(data['to_row'], data['to_col'])
-        move = Move(from_square, to_square)
-
-        # Get the piece at the starting position
-        piece = board.squares[from_square.row][from_square.col].piece
-        if not piece:
-            return jsonify({'error': 'No piece at starting position'}), 400
-
-        # Validate and make the move
-        if board.valid_move(piece, move):
+
+        with games_lock:
+            if game_id not in games:
+                return jsonify({'error': 'Invalid game'}), 400
+
+            board = games[game_id]
+            if engine.is_busy(game_id):
+                return jsonify({'error': 'Waiting for the AI move'}), 409
+
+            # Create move from the data
+            from_square = Square(data['from_row'], data['from_col'])
+            to_square = Square(data['to_row'], data['to_col'])
+            move = Move(from_square, to_square)
+
+            # Get the piece at the starting position
+            piece = board.squares[from_square.row][from_square.col].piece
+            if not piece:
+                return jsonify({'error': 'No piece at starting position'}), 400
+
+            # Validate and make the move
+            if not board.valid_move(piece, move):
+                return jsonify({'error': 'Invalid move'}), 400
             board.move(piece, move)
-            
+
+            response = get_game_state(board)
             # Check for game end conditions after player's move
             if board.is_checkmate('black'):
-                return jsonify({
-                    'board': get_board_state(board),
-                    'captured_pieces': board.captured_pieces,
-                    'scores': {'white': board.white_score, 'black': board.black_score},
-                    'status': 'checkmate',
-                    'winner': 'white'
-                })
+                response.update(status='checkmate', winner='white')
+                engine.stop_ponder(game_id)
             elif board.is_stalemate('black'):
-                return jsonify({
-                    'board': get_board_state(board),
-                    'captured_pieces': board.captured_pieces,
-                    'scores': {'white': board.white_score, 'black': board.black_score},
-                    'status': 'stalemate'
-                })
-
-            # Get AI's move
-            ai_move = get_best_move(board, 'black')
-            if ai_move:
-                # Make AI's move
-                ai_piece = board.squares[ai_move.initial.row][ai_move.initial.col].piece
-                board.move(ai_piece, ai_move)
-                
-                # Check for game end conditions after AI's move
-                if board.is_checkmate('white'):
-                    return jsonify({
-                        'board': get_board_state(board),
-                        'captured_pieces': board.captured_pieces,
-                        'scores': {'white': board.white_score, 'black': board.black_score},
-                        'status': 'checkmate',
-                        'winner': 'black',
-                        'ai_move': {
-                            'from_row': ai_move.initial.row,
-                            'from_col': ai_move.initial.col,
-                            'to_row': ai_move.final.row,
-                            'to_col': ai_move.final.col
-                        }
-                    })
-                elif board.is_stalemate('white'):
-                    return jsonify({
-                        'board': get_board_state(board),
-                        'captured_pieces': board.captured_pieces,
-                        'scores': {'white': board.white_score, 'black': board.black_score},
-                        'status': 'stalemate',
-                        'ai_move': {
-                            'from_row': ai_move.initial.row,
-                            'from_col': ai_move.initial.col,
-                            'to_row': ai_move.final.row,
-                            'to_col': ai_move.final.col
-                        }
-                    })
-
-            # Return normal move response
-            return jsonify({
-                'board': get_board_state(board),
-                'captured_pieces': board.captured_pieces,
-                'scores': {'white': board.white_score, 'black': board.black_score},
-                'ai_move': {
-                    'from_row': ai_move.initial.row,
-                    'from_col': ai_move.initial.col,
-                    'to_row': ai_move.final.row,
-                    'to_col': ai_move.final.col
-                } if ai_move else None
-            })
-        else:
-            return jsonify({'error': 'Invalid move'}), 400
+                response.update(status='stalemate')
+                engine.stop_ponder(game_id)
+            else:
+                # Pondering on this very position gives the reply; any other
+                # is stopped. Only done once the response is built: a ponder
+                # that has finished plays its move on the board right away
+                job = engine.ponderhit(game_id, board.hash)
+                # Get AI's move in the background
+                job = job or engine.submit(game_id, board, 'black', apply_ai_move,
+                                           **DIFFICULTY_LEVELS[difficulties[game_id]])
+                response['job_id'] = job.id
+            return jsonify(response)
 
     except Exception as e:
         print(f"Error making move: {str(e)}")
@@ -190,6 +191,96 @@ def make_move():
         return jsonify({'error': 'Failed to make move'}), 500
 
 
+def apply_ai_move(job, ai_code):
+    """Play a finished search's move on its game; return the /ai_move reply.
+
+    Returns None when the game was abandoned or has moved on since the
+    search started.
+    """
+    with games_lock:
+        board = games.get(job.game_id)
+        if board is None or board.hash != job.position:
+            return None
+        # The engine works on move codes; the API speaks in squares
+        ai_move = Move.from_code(ai_code) if ai_code is not None else None
+        if not ai_move:
+            return dict(get_game_state(board), ai_move=None)
+
+        # Make AI's move
+        ai_piece = board.squares[ai_move.initial.row][ai_move.initial.col].piece
+        board.move(ai_piece, ai_move)
+
+        response = get_game_state(board)
+        response['ai_move'] = {
+            'from_row': ai_move.initial.row,
+            'from_col': ai_move.initial.col,
+            'to_row': ai_move.final.row,
+            'to_col': ai_move.final.col
+        }
+        # Check for game end conditions after AI's move
+        if board.is_checkmate('white'):
+            response.update(status='checkmate', winner='black')
+        elif board.is_stalemate('white'):
+            response.update(status='stalemate')
+        elif PONDER and job.reply:
+            # Think on the player's expected reply until they move
+            board.push(job.reply)
+            engine.submit(job.game_id, board, 'black', apply_ai_move, ponder=True,
+                          **DIFFICULTY_LEVELS[difficulties[job.game_id]])
+            board.pop()
+        return response
+
+
+@app.route('/ai_move', methods=['GET'])
+def ai_move():
+    """Poll for the AI's reply to a move.
+
+    With `wait`, the request is held up to that many seconds (at most
+    MAX_POLL_WAIT) for the move. `job_status` is 'pending' until the reply
+    is ready, then 'done' with the board as /make_move used to return it,
+    or 'cancelled' if the game moved on. With `stats=1` a finished reply
+    also carries the search's statistics.
+    """
+    try:
+        job_id = int(request.args.get('job_id', 0))
+        wait = min(max(float(request.args.get('wait', 0)), 0), MAX_POLL_WAIT)
+        job = engine.wait(job_id, wait)
+        if job is None:
+            return jsonify({'error': 'Unknown job'}), 404
+        if job.status == FAILED:
+            return jsonify({'error': 'AI move failed', 'job_id': job.id}), 500
+        response = dict(job.result) if job.status == DONE else {}
+        if job.status == DONE and request.args.get('stats') == '1':
+            response['stats'] = job.stats
+        response.update(job_id=job.id, job_status=job.status)
+        return jsonify(response)
+    except Exception as e:
+        print(f"Error getting AI move: {str(e)}")
+        traceback.print_exc()
+        return jsonify({'error': 'Internal server error'}), 500
+
+
+@app.route('/cancel_job', methods=['POST'])
+def cancel_job():
+    """Cancel a pending AI move, such as when a game is abandoned."""
+    try:
+        data = request.get_json()
+        return jsonify({'cancelled': engine.cancel(data.get('job_id'))})
+    except Exception as e:
+        print(f"Error cancelling job: {str(e)}")
+        traceback.print_exc()
+        return jsonify({'error': 'Internal server error'}), 500
+
+
+def get_game_state(board):
+    """Helper function to get the board, captured pieces and scores."""
+    return {
+        'board': get_board_state(board),
+        'captured_pieces': board.captured_pieces,
+        'scores': {'white': board.white_score, 'black': board.black_score}
+    }
+
+
 def get_board_state(board):
     """Helper function to get current board state."""
     board_state = []
@@ -213,33 +304,34 @@ def get_board():
     """Get current board state."""
     try:
         game_id = int(request.args.get('game_id', 0))
-        if game_id not in games:
-            return jsonify({'error': 'Invalid game'}), 400
-
-        board = games[game_id]
-        board_state = []
-
-        for row in range(8):
-            board_row = []
-            for col in range(8):
-                piece = board.squares[row][col].piece
-                if piece:
-                    board_row.append({
-                        'type': piece.__class__.__name__.lower(),
-                        'color': piece.color
-                    })
-                else:
-                    board_row.append(None)
-            board_state.append(board_row)
-
-        return jsonify({
-            'board': board_state,
-            'captured_pieces': board.captured_pieces,
-            'scores': {
-                'white': board.white_score,
-                'black': board.black_score
-            }
-        })
+        with games_lock:
+            if game_id not in games:
+                return jsonify({'error': 'Invalid game'}), 400
+
+            board = games[game_id]
+            board_state = []
+
+            for row in range(8):
+                board_row = []
+                for col in range(8):
+                    piece = board.squares[row][col].piece
+                    if piece:
+                        board_row.append({
+                            'type': piece.__class__.__name__.lower(),
+                            'color': piece.color
+                        })
+                    else:
+                        board_row.append(None)
+                board_state.append(board_row)
+
+            return jsonify({
+                'board': board_state,
+                'captured_pieces': board.captured_pieces,
+                'scores': {
+                    'white': board.white_score,
+                    'black': board.black_score
+                }
+            })
     except Exception as e:
         print(f"Error getting board state: {str(e)}")
         traceback.print_exc()
@@ -0,0 +1,274 @@
+"""Evaluate many positions at once with NumPy.
+
+Positions are encoded as an (N, 12, 64) occupancy tensor with one plane
+per color and piece type: white's pawns, knights, bishops, rooks, queens
+and king, then black's. evaluate_batch computes every term of
+evaluate_board with array operations. Material and piece-square values
+are one tensor contraction. Pawn structure comes from per-file pawn
+counts and pawns smeared along their files. Mobility and checks come
+from rays precomputed for every square. The scores are the same as
+evaluate_board's, so the search can score the children of a frontier
+node in one call (see BATCH_EVAL in chess_ai_bot) and analysis jobs
+can score positions in bulk.
+
+NumPy is optional: without it this module cannot be imported, and
+positions are evaluated one at a time.
+
+Usage:
+    python -m chessbot.batch                     # check against evaluate_board, time both
+    python -m chessbot.batch -f positions.fen    # print the score of each FEN
+"""
+import argparse
+import sys
+import time
+import numpy as np
+from chessbot.board import Board, MATERIAL_VALUES, SQUARE_VALUES
+from chessbot.bitboard import (PAWN, KNIGHT, BISHOP, ROOK, QUEEN, KING, WHITE, BLACK, FULL,
+                               FILE_MASKS)
+from chessbot.pawns import (DOUBLED_PAWN_PENALTY, ISOLATED_PAWN_PENALTY,
+                            BACKWARD_PAWN_PENALTY, PASSED_PAWN_BONUS)
+from chessbot.perft import SUITE
+
+PLANES = 12
+
+try:
+    popcount = np.bitwise_count
+except AttributeError:  # NumPy < 2.0
+    def popcount(bitboards):
+        bits = np.unpackbits(bitboards[..., None].view(np.uint8), axis=-1)
+        return bits.sum(axis=-1, dtype=np.uint8)
+
+# Material plus piece-square value of every plane and square, from white's side
+WEIGHTS = np.array([(1 if color == WHITE else -1)
+                    * (MATERIAL_VALUES[kind] + SQUARE_VALUES[color][kind][sq])
+                    for color in (WHITE, BLACK) for kind in range(6) for sq in range(64)],
+                   dtype=np.int64)
+FILES = np.array(FILE_MASKS, dtype=np.uint64)[:, None]
+ONE, EIGHT = np.uint64(1), np.uint64(8)
+
+
+def _steps(offsets):
+    """Shift groups for (row, col) offsets: (shifts, landing masks, whether
+    left), one group for each way the bitboards shift."""
+    groups = []
+    for left in (True, False):
+        shifts, masks = [], []
+        for dr, dc in offsets:
+            step = dr * 8 + dc
+            if (step > 0) != left:
+                continue
+            # A step across the board edge would wrap into these files
+            wrapped = range(dc) if dc > 0 else range(8 + dc, 8)
+            mask = FULL
+            for col in wrapped:
+                mask &= ~FILE_MASKS[col]
+            shifts.append(abs(step))
+            masks.append(mask)
+        groups.append((np.array(shifts, dtype=np.uint64)[:, None, None],
+                       np.array(masks, dtype=np.uint64)[:, None, None], left))
+    return groups
+
+
+# Rook directions, then bishop directions; a shift group keeps that order
+ROOK_OFFSETS = ((1, 0), (0, 1), (-1, 0), (0, -1))
+BISHOP_OFFSETS = ((1, -1), (1, 1), (-1, -1), (-1, 1))
+SLIDER_STEPS = _steps(ROOK_OFFSETS + BISHOP_OFFSETS)
+KNIGHT_STEPS = _steps(((-2, -1), (-2, 1), (-1, -2), (-1, 2), (1, -2), (1, 2), (2, -1), (2, 1)))
+# A king steps the way the sliders slide
+KING_STEPS = SLIDER_STEPS
+# Captures toward lower rows for white, higher rows for black
+PAWN_STEPS = [_steps(((-1, -1), (-1, 1))), _steps(((1, -1), (1, 1)))]
+
+
+def _shift(bitboards, shifts, left):
+    return np.left_shift(bitboards, shifts) if left else np.right_shift(bitboards, shifts)
+
+
+def _slide(sliders, empty, shifts, masks, left):
+    """Squares sliders attack along each direction of a group, up to and
+    including the first piece in the way (Kogge-Stone fill)."""
+    open_squares = empty & masks
+    sliders = sliders | (open_squares & _shift(sliders, shifts, left))
+    open_squares = open_squares & _shift(open_squares, shifts, left)
+    sliders = sliders | (open_squares & _shift(sliders, shifts * 2, left))
+    open_squares = open_squares & _shift(open_squares, shifts * 2, left)
+    sliders = sliders | (open_squares & _shift(sliders, shifts * 4, left))
+    return _shift(sliders, shifts, left) & masks
+
+
+def _fill(bitboards, left):
+    """Bitboards with every piece smeared along its file: toward higher
+    rows when `left`, lower rows otherwise, including its own square."""
+    for shift in (8, 16, 32):
+        bitboards = bitboards | _shift(bitboards, np.uint64(shift), left)
+    return bitboards
+
+
+def _sideways(bitboards):
+    """Squares one file either side of the squares set."""
+    return (((bitboards << ONE) & ~np.uint64(FILE_MASKS[0]))
+            | ((bitboards >> ONE) & ~np.uint64(FILE_MASKS[7])))
+
+
+def encode_bitboards(rows):
+    """Occupancy tensor of positions given as 12 bitboards each, in plane order."""
+    bitboards = np.array(rows, dtype='<u8').reshape(-1, PLANES)
+    return np.unpackbits(bitboards.view(np.uint8).reshape(-1, PLANES, 8), axis=2,
+                         bitorder='little')
+
+
+def encode(boards):
+    """Occupancy tensor of a sequence of boards."""
+    return encode_bitboards([board.pieces[WHITE] + board.pieces[BLACK] for board in boards])
+
+
+def evaluate_batch(occupancy):
+    """evaluate_board's score, from white's side, of every position in a tensor."""
+    planes = np.asarray(occupancy, dtype=np.uint8)
+    count = len(planes)
+    score = planes.reshape(count, PLANES * 64) @ WEIGHTS
+
+    # The same planes as a bitboard per color and piece type: shape (2, 6, N)
+    pieces = (np.packbits(planes, axis=2, bitorder='little').view('<u8')
+              .reshape(count, 2, 6).transpose(1, 2, 0))
+    own = np.bitwise_or.reduce(pieces, axis=1)
+    empty = ~(own[WHITE] | own[BLACK])
+    not_own = ~own
+
+    # Mobility bonus. Attacks in one direction never overlap between
+    # pieces, so counting each direction's attacks of all pieces at once
+    # adds up every piece's own count; the attacks of each color are also
+    # kept for the checks
+    mobility = np.zeros((2, count), dtype=np.int64)
+    attacked = np.zeros((2, count), dtype=np.uint64)
+    straight = pieces[:, ROOK] | pieces[:, QUEEN]
+    diagonal = pieces[:, BISHOP] | pieces[:, QUEEN]
+    for shifts, masks, left in SLIDER_STEPS:
+        half = len(shifts) // 2
+        sliders = np.concatenate([np.broadcast_to(straight, (half, 2, count)),
+                                  np.broadcast_to(diagonal, (half, 2, count))])
+        attacks = _slide(sliders, empty, shifts, masks, left)
+        mobility += popcount(attacks & not_own).sum(axis=0, dtype=np.int64)
+        attacked |= np.bitwise_or.reduce(attacks, axis=0)
+    for shifts, masks, left in KNIGHT_STEPS:
+        attacks = _shift(pieces[:, KNIGHT], shifts, left) & masks
+        mobility += popcount(attacks & not_own).sum(axis=0, dtype=np.int64)
+        attacked |= np.bitwise_or.reduce(attacks, axis=0)
+    for shifts, masks, left in KING_STEPS:
+        attacked |= np.bitwise_or.reduce(_shift(pieces[:, KING], shifts, left) & masks, axis=0)
+    pawn_attacks = np.zeros((2, count), dtype=np.uint64)
+    for us in (WHITE, BLACK):
+        for shifts, masks, left in PAWN_STEPS[us]:
+            attacks = _shift(pieces[us, PAWN], shifts[:, 0], left) & masks[:, 0]
+            pawn_attacks[us] |= np.bitwise_or.reduce(attacks, axis=0)
+    attacked |= pawn_attacks
+    value = 5 * mobility
+
+    # Pawn structure. Files are filled toward lower rows (ahead of white's
+    # pawns) by right shifts and toward higher rows by left shifts
+    pawns = pieces[:, PAWN]
+    ahead = [_fill(pawns[WHITE], False), _fill(pawns[BLACK], True)]
+    behind = [_fill(pawns[WHITE], True), _fill(pawns[BLACK], False)]
+    neighbours = _sideways(np.stack(ahead) | np.stack(behind))
+    all_pawns = pawns[WHITE] | pawns[BLACK]
+    for us, them in ((WHITE, BLACK), (BLACK, WHITE)):
+        # Doubled pawns penalty, for every pawn on a file with another
+        files = popcount(pawns[us][None] & FILES).astype(np.int64)
+        value[us] -= DOUBLED_PAWN_PENALTY * np.where(files > 1, files, 0).sum(axis=0)
+        # Isolated pawns penalty: no own pawn on an adjacent file
+        isolated = pawns[us] & ~neighbours[us]
+        value[us] -= ISOLATED_PAWN_PENALTY * popcount(isolated).astype(np.int64)
+        # Backward pawns penalty: no own pawn on an adjacent file level or
+        # behind, and an enemy pawn guards the square in front
+        guarded = (pawn_attacks[them] << EIGHT if us == WHITE
+                   else pawn_attacks[them] >> EIGHT)
+        backward = pawns[us] & neighbours[us] & ~_sideways(ahead[us]) & guarded
+        value[us] -= BACKWARD_PAWN_PENALTY * popcount(backward).astype(np.int64)
+        # Passed pawn bonus: no pawn ahead on the file
+        blocked = (_fill(all_pawns >> EIGHT, False) if us == WHITE
+                   else _fill(all_pawns << EIGHT, True))
+        value[us] += PASSED_PAWN_BONUS * popcount(pawns[us] & ~blocked).astype(np.int64)
+
+    score += value[WHITE] - value[BLACK]
+
+    # Quick check evaluation with higher penalty in endgame, as Board.is_endgame
+    counts = popcount(pieces).astype(np.int64)
+    total = counts[:, :KING].sum(axis=(0, 1))
+    majors = counts[:, ROOK].sum(axis=0) + counts[:, QUEEN].sum(axis=0)
+    endgame = (total <= 10) & ((total < 10) | (majors <= 2))
+    penalty = np.where(endgame, 80, 50)
+    kings = pieces[:, KING]
+    score -= penalty * ((kings[WHITE] & attacked[BLACK]) != 0)
+    score += penalty * ((kings[BLACK] & attacked[WHITE]) != 0)
+    return score
+
+
+def evaluate_boards(boards):
+    """evaluate_board's score of each board, as a list."""
+    return evaluate_batch(encode(boards)).tolist()
+
+
+def boards_from_fens(fens):
+    """A board set up for each FEN."""
+    boards = []
+    for fen in fens:
+        board = Board()
+        board.set_fen(fen)
+        boards.append(board)
+    return boards
+
+
+def regression_set(depth=2):
+    """Boards of the perft suite positions and every position up to
+    `depth` plies below them."""
+    fens = []
+
+    def walk(board, plies):
+        fens.append(board.fen())
+        if plies:
+            for move in board.legal_moves():
+                board.push(move)
+                walk(board, plies - 1)
+                board.pop()
+
+    for _, fen, _ in SUITE:
+        board = Board()
+        board.set_fen(fen)
+        walk(board, depth)
+    return boards_from_fens(fens)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='python -m chessbot.batch',
+                                     description='Evaluate positions in NumPy batches.')
+    parser.add_argument('-f', '--fen-file', help='file of FENs, one per line, to score')
+    parser.add_argument('-d', '--depth', type=int, default=2,
+                        help='plies below the perft suite positions to check (default 2)')
+    args = parser.parse_args(argv)
+
+    if args.fen_file:
+        with open(args.fen_file) as f:
+            fens = [line.strip() for line in f if line.strip()]
+        for fen, score in zip(fens, evaluate_boards(boards_from_fens(fens))):
+            print('%6d  %s' % (score, fen))
+        return 0
+
+    # Imported here: the search imports this module
+    from chessbot.chess_ai_bot import evaluate_board
+    boards = regression_set(args.depth)
+    start = time.perf_counter()
+    expected = [evaluate_board(board) for board in boards]
+    single_time = time.perf_counter() - start
+    start = time.perf_counter()
+    scores = evaluate_boards(boards)
+    batch_time = time.perf_counter() - start
+
+    mismatches = sum(1 for score, want in zip(scores, expected) if score != want)
+    print('%d positions, %d mismatches' % (len(boards), mismatches))
+    print('evaluate_board  %8.0f positions/s' % (len(boards) / single_time))
+    print('evaluate_batch  %8.0f positions/s' % (len(boards) / batch_time))
+    return 1 if mismatches else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,166 @@
+"""Bitboard primitives and precomputed attack tables.
+
+Squares are numbered ``row * 8 + col`` so they line up with
+``Board.squares`` and the piece-square tables: square 0 is a8 (black's
+back rank) and square 63 is h1. Bit ``sq`` of a bitboard is set when that
+square is part of the set.
+"""
+
+WHITE, BLACK = 0, 1
+COLORS = ('white', 'black')
+COLOR_INDEX = {'white': WHITE, 'black': BLACK}
+
+PAWN, KNIGHT, BISHOP, ROOK, QUEEN, KING = range(6)
+
+FULL = (1 << 64) - 1
+BIT = [1 << sq for sq in range(64)]
+
+try:
+    popcount = int.bit_count
+except AttributeError:  # Python < 3.10
+    def popcount(bb):
+        return bin(bb).count('1')
+
+
+def square(row, col):
+    return row * 8 + col
+
+
+def lsb(bb):
+    """Index of the least significant set bit."""
+    return (bb & -bb).bit_length() - 1
+
+
+def iter_bits(bb):
+    """Yield the square index of every set bit, lowest first."""
+    while bb:
+        low = bb & -bb
+        yield low.bit_length() - 1
+        bb ^= low
+
+
+def _on_board(row, col):
+    return 0 <= row < 8 and 0 <= col < 8
+
+
+def _step_targets(sq, offsets):
+    row, col = divmod(sq, 8)
+    bb = 0
+    for dr, dc in offsets:
+        if _on_board(row + dr, col + dc):
+            bb |= BIT[(row + dr) * 8 + col + dc]
+    return bb
+
+
+def _ray(sq, dr, dc, occupied=0):
+    """Squares reached from ``sq`` stepping (dr, dc) until the first blocker."""
+    row, col = divmod(sq, 8)
+    bb = 0
+    row, col = row + dr, col + dc
+    while _on_board(row, col):
+        bb |= BIT[row * 8 + col]
+        if occupied & BIT[row * 8 + col]:
+            break
+        row, col = row + dr, col + dc
+    return bb
+
+
+KNIGHT_OFFSETS = ((-2, -1), (-2, 1), (-1, -2), (-1, 2),
+                  (1, -2), (1, 2), (2, -1), (2, 1))
+KING_OFFSETS = ((-1, -1), (-1, 0), (-1, 1), (0, -1),
+                (0, 1), (1, -1), (1, 0), (1, 1))
+
+KNIGHT_ATTACKS = [_step_targets(sq, KNIGHT_OFFSETS) for sq in range(64)]
+KING_ATTACKS = [_step_targets(sq, KING_OFFSETS) for sq in range(64)]
+# White pawns advance towards row 0, black pawns towards row 7.
+PAWN_ATTACKS = [
+    [_step_targets(sq, ((-1, -1), (-1, 1))) for sq in range(64)],
+    [_step_targets(sq, ((1, -1), (1, 1))) for sq in range(64)],
+]
+
+RANK_MASKS = [0xFF << (8 * row) for row in range(8)]
+FILE_MASKS = [0x0101010101010101 << col for col in range(8)]
+# Squares on the same file strictly ahead of a pawn of the given color.
+FRONT_SPANS = [
+    [FILE_MASKS[sq & 7] & ((1 << (sq & ~7)) - 1) for sq in range(64)],
+    [FILE_MASKS[sq & 7] & ~((1 << ((sq | 7) + 1)) - 1) & FULL for sq in range(64)],
+]
+# Squares on the files either side of a file.
+ADJACENT_FILES = [(FILE_MASKS[col - 1] if col else 0) | (FILE_MASKS[col + 1] if col < 7 else 0)
+                  for col in range(8)]
+# Squares on the adjacent files level with or behind a pawn of the given color.
+SUPPORT_SPANS = [
+    [ADJACENT_FILES[sq & 7] & ~((1 << (sq & ~7)) - 1) & FULL for sq in range(64)],
+    [ADJACENT_FILES[sq & 7] & ((1 << ((sq | 7) + 1)) - 1) for sq in range(64)],
+]
+
+
+def _line_tables(directions):
+    """Build (mask, attacks) tables for one line through every square.
+
+    ``mask[sq]`` holds the squares on the line whose occupancy can change
+    the attack set (the edge squares never can), and ``attacks[sq]`` maps
+    every subset of that mask to the resulting attack bitboard.
+    """
+    masks, tables = [], []
+    for sq in range(64):
+        mask = 0
+        for dr, dc in directions:
+            ray = _ray(sq, dr, dc)
+            if ray:
+                # Drop the square on the edge of the board.
+                edge = ray.bit_length() - 1 if dr * 8 + dc > 0 else lsb(ray)
+                mask |= ray ^ BIT[edge]
+        table = {}
+        subset = 0
+        while True:
+            attacks = 0
+            for dr, dc in directions:
+                attacks |= _ray(sq, dr, dc, subset)
+            table[subset] = attacks
+            subset = (subset - mask) & mask
+            if not subset:
+                break
+        masks.append(mask)
+        tables.append(table)
+    return masks, tables
+
+
+RANK_LINE_MASK, RANK_ATTACKS = _line_tables(((0, -1), (0, 1)))
+FILE_LINE_MASK, FILE_ATTACKS = _line_tables(((-1, 0), (1, 0)))
+DIAG_LINE_MASK, DIAG_ATTACKS = _line_tables(((-1, -1), (1, 1)))
+ANTI_LINE_MASK, ANTI_ATTACKS = _line_tables(((-1, 1), (1, -1)))
+
+
+def rook_attacks(sq, occupied):
+    return (RANK_ATTACKS[sq][occupied & RANK_LINE_MASK[sq]]
+            | FILE_ATTACKS[sq][occupied & FILE_LINE_MASK[sq]])
+
+
+def bishop_attacks(sq, occupied):
+    return (DIAG_ATTACKS[sq][occupied & DIAG_LINE_MASK[sq]]
+            | ANTI_ATTACKS[sq][occupied & ANTI_LINE_MASK[sq]])
+
+
+def queen_attacks(sq, occupied):
+    return rook_attacks(sq, occupied) | bishop_attacks(sq, occupied)
+
+
+def _between(a, b):
+    ar, ac = divmod(a, 8)
+    br, bc = divmod(b, 8)
+    dr, dc = br - ar, bc - ac
+    if a == b or not (dr == 0 or dc == 0 or abs(dr) == abs(dc)):
+        return 0
+    dr = (dr > 0) - (dr < 0)
+    dc = (dc > 0) - (dc < 0)
+    bb = 0
+    row, col = ar + dr, ac + dc
+    while (row, col) != (br, bc):
+        bb |= BIT[row * 8 + col]
+        row, col = row + dr, col + dc
+    return bb
+
+
+# Squares strictly between two squares sharing a rank, file or diagonal.
+BETWEEN = [[_between(a, b) for b in range(64)] for a in range(64)]
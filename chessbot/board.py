@@ -1,25 +1,105 @@
 from chessbot.const import *
 from chessbot.square import Square
 from chessbot.piece import *
-from chessbot.move import Move
-import copy
-import os
+from chessbot.move import *
+from chessbot.bitboard import *
+from chessbot.zobrist import PIECE_KEYS, SIDE_KEY, CASTLING_KEYS, EP_KEYS
+from array import array
+from collections import OrderedDict
+
+# Bitboard index for every piece class, and back
+PIECE_TYPES = {Pawn: PAWN, Knight: KNIGHT, Bishop: BISHOP,
+               Rook: ROOK, Queen: QUEEN, King: KING}
+PIECE_CLASSES = [Pawn, Knight, Bishop, Rook, Queen, King]
+
+# Centipawn material per piece type, as in chess_ai_bot.PIECE_VALUES; the
+# king is left out since both sides always have one
+MATERIAL_VALUES = (100, 320, 330, 500, 900, 0)
+
+# Piece-square tables in centipawns, from white's side of the board;
+# black's are read with the rows flipped
+PAWN_TABLE = [
+    0,  0,  0,  0,  0,  0,  0,  0,
+    50, 50, 50, 50, 50, 50, 50, 50,
+    10, 10, 20, 30, 30, 20, 10, 10,
+    5,  5, 10, 25, 25, 10,  5,  5,
+    0,  0,  0, 20, 20,  0,  0,  0,
+    5, -5,-10,  0,  0,-10, -5,  5,
+    5, 10, 10,-20,-20, 10, 10,  5,
+    0,  0,  0,  0,  0,  0,  0,  0
+]
+
+KNIGHT_TABLE = [
+    -50,-40,-30,-30,-30,-30,-40,-50,
+    -40,-20,  0,  0,  0,  0,-20,-40,
+    -30,  0, 10, 15, 15, 10,  0,-30,
+    -30,  5, 15, 20, 20, 15,  5,-30,
+    -30,  0, 15, 20, 20, 15,  0,-30,
+    -30,  5, 10, 15, 15, 10,  5,-30,
+    -40,-20,  0,  5,  5,  0,-20,-40,
+    -50,-40,-30,-30,-30,-30,-40,-50
+]
+
+BISHOP_TABLE = [
+    -20,-10,-10,-10,-10,-10,-10,-20,
+    -10,  0,  0,  0,  0,  0,  0,-10,
+    -10,  0,  5, 10, 10,  5,  0,-10,
+    -10,  5,  5, 10, 10,  5,  5,-10,
+    -10,  0, 10, 10, 10, 10,  0,-10,
+    -10, 10, 10, 10, 10, 10, 10,-10,
+    -10,  5,  0,  0,  0,  0,  5,-10,
+    -20,-10,-10,-10,-10,-10,-10,-20
+]
+
+# Per color, piece type and square: the piece-square value a piece there
+# adds to its side's placement score
+_SQUARE_TABLES = {PAWN: PAWN_TABLE, KNIGHT: KNIGHT_TABLE, BISHOP: BISHOP_TABLE}
+SQUARE_VALUES = [[[_SQUARE_TABLES[kind][sq ^ flip] if kind in _SQUARE_TABLES else 0
+                   for sq in range(64)] for kind in range(6)] for flip in (0, 56)]
+
+# Castling rights bits with the king and rook home squares they depend on
+WHITE_KINGSIDE, WHITE_QUEENSIDE, BLACK_KINGSIDE, BLACK_QUEENSIDE = 1, 2, 4, 8
+CASTLING_SQUARES = ((WHITE_KINGSIDE, 60, 63), (WHITE_QUEENSIDE, 60, 56),
+                    (BLACK_KINGSIDE, 4, 7), (BLACK_QUEENSIDE, 4, 0))
+CASTLING_MASK = BIT[0] | BIT[4] | BIT[7] | BIT[56] | BIT[60] | BIT[63]
+CASTLING_LETTERS = 'KQkq'
+
+FEN_PIECES = {'p': Pawn, 'n': Knight, 'b': Bishop, 'r': Rook, 'q': Queen, 'k': King}
+FEN_LETTERS = {cls: letter for letter, cls in FEN_PIECES.items()}
+
+# Promotion piece types in the order they are generated
+PROMOTIONS = (QUEEN, KNIGHT, ROOK, BISHOP)
+
+# Maximum number of (position, square) entries in the legal-move cache
+MOVE_CACHE_SIZE = 10000
 
 
 class Board:
     def __init__(self):
-        self.squares = [[Square(row, col) for col in range(BOARD_WIDTH)]
-                        for row in range(BOARD_HEIGHT)]
-        self.last_move = None
+        # Per-color, per-piece-type bitboards are the primary position;
+        # the mailbox maps squares to the shared Piece objects on them.
         self.reset_scores()
-        self.move_history = []
         self._create()
         self._add_pieces('white')
         self._add_pieces('black')
+        # Squares whose piece has not moved yet (castling, development)
+        self.unmoved = self.occupied
+        self.turn = 'white'
+        self.castling_rights = self._castling_rights()
+        self.hash = self._compute_hash()
         # Cache for position evaluations
         self.position_cache = {}
-        # Cache for move calculations
-        self.move_cache = {}
+        # LRU cache of legal moves keyed by (position hash, square)
+        self.move_cache = OrderedDict()
+        # Search transposition table, created by the AI on first use
+        self.transposition_table = None
+
+    def __getstate__(self):
+        # Caches and the search table are rebuilt on demand, not copied
+        state = self.__dict__.copy()
+        state.update(_squares=None, position_cache={}, move_cache=OrderedDict(),
+                     transposition_table=None)
+        return state
 
     def reset_scores(self):
         """Reset all score-related attributes for a new game."""
@@ -28,15 +108,35 @@ class Board:
         self.black_score = 0
         self.move_history = []
         self.last_move = None
+        self.ep_square = None
+        self._undo = []
         # Clear caches
         self.position_cache = {}
-        self.move_cache = {}
+        self.move_cache = OrderedDict()
+
+    @property
+    def squares(self):
+        """8x8 grid of Square objects derived from the bitboards."""
+        if self._squares is None:
+            mailbox = self.mailbox
+            self._squares = [[Square(row, col, mailbox[row * 8 + col])
+                              for col in range(BOARD_WIDTH)]
+                             for row in range(BOARD_HEIGHT)]
+        return self._squares
 
     def _create(self):
         """Initialize the board with empty squares."""
-        for row in range(BOARD_HEIGHT):
-            for col in range(BOARD_WIDTH):
-                self.squares[row][col] = Square(row, col)
+        self.pieces = [[0] * 6 for _ in COLORS]
+        self.occupancy = [0, 0]
+        self.occupied = 0
+        self.mailbox = [None] * 64
+        self.unmoved = 0
+        # Kept up to date by _put_piece/_remove_piece
+        self.king_squares = [None, None]
+        self.material = [0, 0]
+        self.placement = [0, 0]
+        self._squares = None
+        self.hash = 0
 
     def _add_pieces(self, color):
         """Initialize all chess pieces on the board."""
@@ -44,609 +144,693 @@ class Board:
 
         # Place pawns
         for col in range(BOARD_WIDTH):
-            self.squares[row_pawn][col].piece = Pawn(color)
+            self._put_piece(Pawn(color), square(row_pawn, col))
 
         # Place main pieces
-        self.squares[row_main][0].piece = Rook(color)
-        self.squares[row_main][7].piece = Rook(color)
-        self.squares[row_main][1].piece = Knight(color)
-        self.squares[row_main][6].piece = Knight(color)
-        self.squares[row_main][2].piece = Bishop(color)
-        self.squares[row_main][5].piece = Bishop(color)
-        self.squares[row_main][3].piece = Queen(color)
-        self.squares[row_main][4].piece = King(color)
+        self._put_piece(Rook(color), square(row_main, 0))
+        self._put_piece(Rook(color), square(row_main, 7))
+        self._put_piece(Knight(color), square(row_main, 1))
+        self._put_piece(Knight(color), square(row_main, 6))
+        self._put_piece(Bishop(color), square(row_main, 2))
+        self._put_piece(Bishop(color), square(row_main, 5))
+        self._put_piece(Queen(color), square(row_main, 3))
+        self._put_piece(King(color), square(row_main, 4))
+
+    def set_fen(self, fen):
+        """Set up the position described by a FEN string."""
+        placement, turn, castling, ep = (fen.split() + ['-'] * 3)[:4]
+        self._create()
+        self.reset_scores()
+
+        for row, rank in enumerate(placement.split('/')):
+            col = 0
+            for char in rank:
+                if char.isdigit():
+                    col += int(char)
+                    continue
+                piece = FEN_PIECES[char.lower()]('white' if char.isupper() else 'black')
+                self._put_piece(piece, square(row, col))
+                col += 1
+
+        # Only kings and rooks named by the castling field are unmoved
+        for letter, (right, king_sq, rook_sq) in zip(CASTLING_LETTERS, CASTLING_SQUARES):
+            king, rook = self.mailbox[king_sq], self.mailbox[rook_sq]
+            if letter in castling and isinstance(king, King) and isinstance(rook, Rook):
+                self.unmoved |= BIT[king_sq] | BIT[rook_sq]
+
+        self.turn = 'black' if turn == 'b' else 'white'
+        if ep != '-':
+            self.ep_square = square(8 - int(ep[1]), ord(ep[0]) - ord('a'))
+        self.castling_rights = self._castling_rights()
+        self.hash = self._compute_hash()
+
+    def fen(self):
+        """FEN string for the current position."""
+        ranks = []
+        for row in range(BOARD_HEIGHT):
+            rank, empty = '', 0
+            for col in range(BOARD_WIDTH):
+                piece = self.mailbox[row * 8 + col]
+                if not piece:
+                    empty += 1
+                    continue
+                if empty:
+                    rank, empty = rank + str(empty), 0
+                letter = FEN_LETTERS[type(piece)]
+                rank += letter.upper() if piece.color == 'white' else letter
+            ranks.append(rank + (str(empty) if empty else ''))
+
+        castling = ''.join(letter for i, letter in enumerate(CASTLING_LETTERS)
+                           if self.castling_rights & (1 << i)) or '-'
+        ep = '-' if self.ep_square is None else \
+            'abcdefgh'[self.ep_square & 7] + str(8 - (self.ep_square >> 3))
+        return '%s %s %s %s 0 %d' % ('/'.join(ranks), self.turn[0], castling, ep,
+                                     len(self.move_history) // 2 + 1)
+
+    def _put_piece(self, piece, sq):
+        """Place a piece on an empty square."""
+        bit = BIT[sq]
+        color = COLOR_INDEX[piece.color]
+        kind = PIECE_TYPES[type(piece)]
+        self.pieces[color][kind] |= bit
+        self.occupancy[color] |= bit
+        self.occupied |= bit
+        self.mailbox[sq] = piece
+        self.hash ^= PIECE_KEYS[color][kind][sq]
+        self.material[color] += MATERIAL_VALUES[kind]
+        self.placement[color] += SQUARE_VALUES[color][kind][sq]
+        if kind == KING:
+            self.king_squares[color] = sq
+        self._squares = None
+
+    def _remove_piece(self, sq):
+        """Lift the piece off a square and return it."""
+        piece = self.mailbox[sq]
+        if piece:
+            mask = ~BIT[sq]
+            color = COLOR_INDEX[piece.color]
+            kind = PIECE_TYPES[type(piece)]
+            self.pieces[color][kind] &= mask
+            self.occupancy[color] &= mask
+            self.occupied &= mask
+            self.mailbox[sq] = None
+            self.hash ^= PIECE_KEYS[color][kind][sq]
+            self.material[color] -= MATERIAL_VALUES[kind]
+            self.placement[color] -= SQUARE_VALUES[color][kind][sq]
+            if kind == KING:
+                self.king_squares[color] = None
+            self._squares = None
+        return piece
+
+    def _castling_rights(self):
+        """Castling rights mask derived from the unmoved kings and rooks."""
+        rights = 0
+        for right, king_sq, rook_sq in CASTLING_SQUARES:
+            king, rook = self.mailbox[king_sq], self.mailbox[rook_sq]
+            if isinstance(king, King) and isinstance(rook, Rook) and \
+               self.unmoved & BIT[king_sq] and self.unmoved & BIT[rook_sq]:
+                rights |= right
+        return rights
+
+    def _compute_hash(self):
+        """Zobrist hash of the position computed from scratch."""
+        key = 0
+        for sq in iter_bits(self.occupied):
+            piece = self.mailbox[sq]
+            key ^= PIECE_KEYS[COLOR_INDEX[piece.color]][PIECE_TYPES[type(piece)]][sq]
+        if self.turn == 'black':
+            key ^= SIDE_KEY
+        key ^= CASTLING_KEYS[self.castling_rights]
+        if self.ep_square is not None:
+            key ^= EP_KEYS[self.ep_square & 7]
+        return key
+
+    def piece_squares(self, color):
+        """Yield (row, col, piece) for every piece of the given color."""
+        mailbox = self.mailbox
+        for sq in iter_bits(self.occupancy[COLOR_INDEX[color]]):
+            yield sq >> 3, sq & 7, mailbox[sq]
+
+    def king_square(self, color):
+        """Square index of the given color's king, or None."""
+        return self.king_squares[COLOR_INDEX[color]]
+
+    def push(self, move, score=False):
+        """Make a move code, recording everything pop() needs to take it back.
+
+        With `score` set the capture is also credited to captured_pieces and
+        the mover's score, as for a real game move. Returns the captured piece.
+        """
+        from_sq, to_sq = move & 63, move >> 6 & 63
+        prev_hash = self.hash
+        piece = self._remove_piece(from_sq)
+        unmoved = self.unmoved
+
+        # En passant takes the pawn beside the destination square
+        captured = None
+        captured_sq = to_sq
+        if move & CAPTURE:
+            if move & EN_PASSANT:
+                captured_sq = to_sq + (8 if piece.color == 'white' else -8)
+            captured = self._remove_piece(captured_sq)
+
+        # Handle pawn promotion
+        promoted = None
+        if move >> PROMOTION_SHIFT:
+            promoted = PIECE_CLASSES[move >> PROMOTION_SHIFT](piece.color)
+            self._put_piece(promoted, to_sq)
+        else:
+            self._put_piece(piece, to_sq)
+
+        # Handle castling
+        castle = None
+        if move & CASTLING:
+            rook_from, rook_to = (from_sq + 3, from_sq + 1) if to_sq > from_sq \
+                else (from_sq - 4, from_sq - 1)
+            rook = self._remove_piece(rook_from)
+            self._put_piece(rook, rook_to)
+            castle = (rook, rook_from, rook_to)
+            self.unmoved &= ~BIT[rook_from]
+
+        if captured and score:
+            piece_type = captured.__class__.__name__.lower()
+            self.captured_pieces[piece.color].append(piece_type)
+            if piece.color == "white":
+                self.white_score += captured.value
+            else:
+                self.black_score += captured.value
+
+        # Undo record: everything the move overwrites
+        self._undo.append((move, piece, unmoved, captured, captured_sq, castle,
+                           self.ep_square, self.castling_rights, prev_hash,
+                           self.last_move, bool(captured) and score))
+
+        self.unmoved &= ~(BIT[from_sq] | BIT[captured_sq])
+        # The piece keys were updated by _put_piece/_remove_piece; fold in
+        # the side to move, en-passant file and castling rights.
+        key = self.hash ^ SIDE_KEY
+        if self.ep_square is not None:
+            key ^= EP_KEYS[self.ep_square & 7]
+        self.ep_square = (from_sq + to_sq) // 2 if move & DOUBLE_PUSH else None
+        if self.ep_square is not None:
+            key ^= EP_KEYS[self.ep_square & 7]
+        if (BIT[from_sq] | BIT[captured_sq]) & CASTLING_MASK:
+            rights = self._castling_rights()
+            key ^= CASTLING_KEYS[self.castling_rights] ^ CASTLING_KEYS[rights]
+            self.castling_rights = rights
+        self.hash = key
+
+        self.turn = 'black' if self.turn == 'white' else 'white'
+        self.last_move = move
+        self.move_history.append(move)
+        return captured
+
+    def push_null(self):
+        """Pass the turn without moving, for null-move pruning; pop() undoes it."""
+        self._undo.append((NULL_MOVE, None, self.unmoved, None, 0, None, self.ep_square,
+                           self.castling_rights, self.hash, self.last_move, False))
+        key = self.hash ^ SIDE_KEY
+        if self.ep_square is not None:
+            key ^= EP_KEYS[self.ep_square & 7]
+            self.ep_square = None
+        self.hash = key
+        self.turn = 'black' if self.turn == 'white' else 'white'
+        self.last_move = NULL_MOVE
+        self.move_history.append(NULL_MOVE)
+
+    def pop(self):
+        """Take back the last pushed move and return its code."""
+        (move, piece, unmoved, captured, captured_sq, castle, ep_square,
+         castling_rights, prev_hash, last_move, scored) = self._undo.pop()
+
+        # A null move has no pieces to put back
+        if piece:
+            self._remove_piece(move >> 6 & 63)
+            self._put_piece(piece, move & 63)
+            if captured:
+                self._put_piece(captured, captured_sq)
+            if castle:
+                rook, rook_from, rook_to = castle
+                self._remove_piece(rook_to)
+                self._put_piece(rook, rook_from)
+
+        self.unmoved = unmoved
+
+        if scored:
+            self.captured_pieces[piece.color].pop()
+            if piece.color == "white":
+                self.white_score -= captured.value
+            else:
+                self.black_score -= captured.value
+
+        self.ep_square = ep_square
+        self.castling_rights = castling_rights
+        self.hash = prev_hash
+        self.turn = 'black' if self.turn == 'white' else 'white'
+        self.last_move = last_move
+        self.move_history.pop()
+        return move
+
+    def encode_move(self, move):
+        """Move code for a Move object in the current position."""
+        from_sq = move.initial.row * 8 + move.initial.col
+        to_sq = move.final.row * 8 + move.final.col
+        flags = CAPTURE if self.mailbox[to_sq] else 0
+        piece = self.mailbox[from_sq]
+        if isinstance(piece, Pawn):
+            if to_sq == self.ep_square:
+                flags |= CAPTURE | EN_PASSANT
+            elif abs(to_sq - from_sq) == 16:
+                flags |= DOUBLE_PUSH
+            if move.final.row in (0, 7):
+                return encode_move(from_sq, to_sq, flags, PROMOTION_TYPES[move.promotion])
+        elif isinstance(piece, King) and abs(to_sq - from_sq) == 2:
+            flags |= CASTLING
+        return encode_move(from_sq, to_sq, flags)
+
+    def find_move(self, from_sq, to_sq, promotion=QUEEN):
+        """Legal move code from from_sq to to_sq for the piece there, or None."""
+        piece = self.mailbox[from_sq]
+        if not piece:
+            return None
+        for move in self.legal_moves(piece.color, from_sq=from_sq):
+            if move >> 6 & 63 == to_sq and move >> PROMOTION_SHIFT in (0, promotion):
+                return move
+        return None
 
     def move(self, piece, move, testing=False):
         """Execute a move on the board."""
-        initial, final = move.initial, move.final
-        
         # Clear caches on actual moves
         if not testing:
             self.position_cache.clear()
-            self.move_cache.clear()
-        
-        # Store the captured piece if any
-        captured_piece = self.squares[final.row][final.col].piece
-        
-        if captured_piece and not testing:
-            piece_type = captured_piece.__class__.__name__.lower()
-            self.captured_pieces[piece.color].append(piece_type)
-            if piece.color == "white":
-                self.white_score += captured_piece.value
-            else:
-                self.black_score += captured_piece.value
 
-        # Move the piece
-        self.squares[initial.row][initial.col].piece = None
-        self.squares[final.row][final.col].piece = piece
-        
-        # Handle pawn promotion
-        if isinstance(piece, Pawn) and final.row in (0, 7):
-            promoted_piece = Queen(piece.color)
-            self.squares[final.row][final.col].piece = promoted_piece
-            if not testing:
-                promoted_piece.moved = True
-        
-        if not testing:
-            piece.moved = True
-            piece.clear_moves()
-            self.last_move = move
-            self.move_history.append(move)
-            
-            # Handle castling
-            if isinstance(piece, King) and abs(final.col - initial.col) == 2:
-                # Kingside castling
-                if final.col > initial.col:
-                    rook = self.squares[initial.row][7].piece
-                    self.squares[initial.row][7].piece = None
-                    self.squares[initial.row][5].piece = rook
-                    rook.moved = True
-                # Queenside castling
-                else:
-                    rook = self.squares[initial.row][0].piece
-                    self.squares[initial.row][0].piece = None
-                    self.squares[initial.row][3].piece = rook
-                    rook.moved = True
+        self.push(self.encode_move(move), score=not testing)
 
     def undo_move(self, piece, move, captured_piece):
         """Undo a move on the board."""
-        # Restore pieces to their original positions
-        self.squares[move.initial.row][move.initial.col].piece = piece
-        self.squares[move.final.row][move.final.col].piece = captured_piece
-        
-        # Only update game state if this wasn't a testing move
-        if self.last_move == move:
-            piece.moved = False
-            if captured_piece:
-                piece_type = captured_piece.__class__.__name__.lower()
-                if piece_type in self.captured_pieces[piece.color]:
-                    self.captured_pieces[piece.color].remove(piece_type)
-                if piece.color == "white":
-                    self.white_score -= captured_piece.value
-                else:
-                    self.black_score -= captured_piece.value
-            self.last_move = None
-            piece.clear_moves()
+        self.pop()
 
     def valid_move(self, piece, move):
         """Validate if a move is legal."""
         if not piece:  # Add check for piece existence
             return False
-            
+
         if not (0 <= move.final.row < BOARD_HEIGHT and 0 <= move.final.col < BOARD_WIDTH):
             return False
 
         # Check if target square has a piece of the same color
-        target_piece = self.squares[move.final.row][move.final.col].piece
+        target_piece = self.mailbox[move.final.row * 8 + move.final.col]
         if target_piece and target_piece.color == piece.color:
             return False
-            
+
         # Prevent king captures
         if target_piece and isinstance(target_piece, King):
             return False
 
-        # Check if the move is in the piece's valid moves
-        valid = False
-        for valid_move in piece.moves:
-            if move.initial.row == valid_move.initial.row and \
-               move.initial.col == valid_move.initial.col and \
-               move.final.row == valid_move.final.row and \
-               move.final.col == valid_move.final.col:
-                valid = True
-                break
-                
-        if not valid:
+        # The piece must be on the starting square and the move among its
+        # legal moves, which never leave the king in check
+        from_sq = move.initial.row * 8 + move.initial.col
+        if self.mailbox[from_sq] is not piece:
             return False
+        for _, targets in self._legal_targets(COLOR_INDEX[piece.color], from_sq):
+            return bool(targets & BIT[move.final.row * 8 + move.final.col])
+        return False
 
-        # Create a lightweight board copy for check testing
-        temp_squares = [[self.squares[r][c].piece for c in range(BOARD_WIDTH)]
-                        for r in range(BOARD_HEIGHT)]
-        
-        # Simulate the move
-        temp_squares[move.final.row][move.final.col] = temp_squares[move.initial.row][move.initial.col]
-        temp_squares[move.initial.row][move.initial.col] = None
-        
-        # Check if the move puts or leaves the king in check
-        if self._is_in_check_fast(piece.color, temp_squares):
-            return False
-                
-        return True
-
-    def _is_in_check_fast(self, color, board_state):
-        """A faster version of is_in_check for move validation."""
-        # Find the king position - cache it for repeated calls
-        king_pos = None
-        for row in range(BOARD_HEIGHT):
-            for col in range(BOARD_WIDTH):
-                piece = board_state[row][col]
-                if piece and isinstance(piece, King) and piece.color == color:
-                    king_pos = (row, col)
+    def attackers_to(self, sq, color, occupied=None):
+        """Bitboard of the given color's pieces attacking a square."""
+        if occupied is None:
+            occupied = self.occupied
+        pieces = self.pieces[color]
+        return ((KNIGHT_ATTACKS[sq] & pieces[KNIGHT])
+                | (PAWN_ATTACKS[color ^ 1][sq] & pieces[PAWN])
+                | (KING_ATTACKS[sq] & pieces[KING])
+                | (bishop_attacks(sq, occupied) & (pieces[BISHOP] | pieces[QUEEN]))
+                | (rook_attacks(sq, occupied) & (pieces[ROOK] | pieces[QUEEN])))
+
+    def see(self, move):
+        """Static exchange evaluation of a move code.
+
+        Plays out the sequence of captures on the destination square, each
+        side always recapturing with its least valuable attacker (x-rays
+        included) and stopping when continuing would lose material, and
+        returns the centipawn balance for the side making the move.
+        """
+        from_sq, to_sq = move & 63, move >> 6 & 63
+        piece = self.mailbox[from_sq]
+        side = COLOR_INDEX[piece.color]
+        occupied = self.occupied ^ BIT[from_sq]
+        if move & EN_PASSANT:
+            occupied ^= BIT[to_sq + (8 if side == WHITE else -8)]
+            gain = [MATERIAL_VALUES[PAWN]]
+        else:
+            target = self.mailbox[to_sq]
+            gain = [MATERIAL_VALUES[PIECE_TYPES[type(target)]] if target else 0]
+        # Value of the piece now standing on the square
+        value = MATERIAL_VALUES[PIECE_TYPES[type(piece)]]
+        if move >> PROMOTION_SHIFT:
+            value = MATERIAL_VALUES[move >> PROMOTION_SHIFT]
+            gain[0] += value - MATERIAL_VALUES[PAWN]
+
+        diagonal = (self.pieces[WHITE][BISHOP] | self.pieces[WHITE][QUEEN]
+                    | self.pieces[BLACK][BISHOP] | self.pieces[BLACK][QUEEN])
+        straight = (self.pieces[WHITE][ROOK] | self.pieces[WHITE][QUEEN]
+                    | self.pieces[BLACK][ROOK] | self.pieces[BLACK][QUEEN])
+        attackers = (self.attackers_to(to_sq, WHITE, occupied)
+                     | self.attackers_to(to_sq, BLACK, occupied)) & occupied
+        while True:
+            side ^= 1
+            own = attackers & self.occupancy[side]
+            if not own:
+                break
+            for kind in range(6):
+                candidates = own & self.pieces[side][kind]
+                if candidates:
                     break
-            if king_pos:
+            # The king may only take when nothing can take it back
+            if kind == KING and attackers & self.occupancy[side ^ 1]:
                 break
+            gain.append(value - gain[-1])
+            value = MATERIAL_VALUES[kind]
+            occupied ^= candidates & -candidates
+            # Sliders lined up behind the capturer join in
+            attackers = (attackers | (bishop_attacks(to_sq, occupied) & diagonal)
+                         | (rook_attacks(to_sq, occupied) & straight)) & occupied
+
+        for i in range(len(gain) - 1, 0, -1):
+            gain[i - 1] = -max(-gain[i - 1], gain[i])
+        return gain[0]
+
+    def _is_square_attacked(self, sq, by, occupied, captured=0):
+        """Fast check if a square is attacked by the `by` color.
+
+        `occupied` is the occupancy to slide through and `captured` masks
+        out an attacker that has just been taken.
+        """
+        pieces = self.pieces[by]
+        alive = ~captured
+        if KNIGHT_ATTACKS[sq] & pieces[KNIGHT] & alive:
+            return True
+        if PAWN_ATTACKS[by ^ 1][sq] & pieces[PAWN] & alive:
+            return True
+        if KING_ATTACKS[sq] & pieces[KING]:
+            return True
+        sliders = (pieces[BISHOP] | pieces[QUEEN]) & alive
+        if sliders and bishop_attacks(sq, occupied) & sliders:
+            return True
+        sliders = (pieces[ROOK] | pieces[QUEEN]) & alive
+        if sliders and rook_attacks(sq, occupied) & sliders:
+            return True
+        return False
 
-        if not king_pos:
+    def _leaves_king_attacked(self, from_sq, to_sq, color):
+        """Check whether moving from_sq -> to_sq exposes color's king."""
+        king_sq = self.king_squares[color]
+        if king_sq is None:
             return False
-
-        row, col = king_pos
-
-        # Check knight attacks first (they're simpler)
-        knight_moves = [
-            (-2, -1), (-2, 1), (-1, -2), (-1, 2),
-            (1, -2), (1, 2), (2, -1), (2, 1)
-        ]
-        for dr, dc in knight_moves:
-            r, c = row + dr, col + dc
-            if 0 <= r < BOARD_HEIGHT and 0 <= c < BOARD_WIDTH:
-                piece = board_state[r][c]
-                if piece and piece.color != color and isinstance(piece, Knight):
-                    return True
-
-        # Check pawn attacks
-        pawn_direction = -1 if color == 'white' else 1
-        for dc in [-1, 1]:
-            r, c = row + pawn_direction, col + dc
-            if 0 <= r < BOARD_HEIGHT and 0 <= c < BOARD_WIDTH:
-                piece = board_state[r][c]
-                if piece and piece.color != color and isinstance(piece, Pawn):
-                    return True
-
-        # Check sliding pieces (more expensive, do last)
-        # Combine diagonal and straight checks for efficiency
-        directions = [
-            (-1, -1), (-1, 0), (-1, 1),
-            (0, -1),           (0, 1),
-            (1, -1),  (1, 0),  (1, 1)
-        ]
-        
-        for dr, dc in directions:
-            r, c = row + dr, col + dc
-            diagonal = dr != 0 and dc != 0
-            
-            while 0 <= r < BOARD_HEIGHT and 0 <= c < BOARD_WIDTH:
-                piece = board_state[r][c]
-                if piece:
-                    if piece.color != color:
-                        if diagonal and (isinstance(piece, Bishop) or isinstance(piece, Queen)):
-                            return True
-                        if not diagonal and (isinstance(piece, Rook) or isinstance(piece, Queen)):
-                            return True
-                    break
-                r, c = r + dr, c + dc
-
-        return False
+        if king_sq == from_sq:
+            king_sq = to_sq
+        captured = BIT[to_sq]
+        if to_sq == self.ep_square and self.pieces[color][PAWN] & BIT[from_sq]:
+            captured = BIT[to_sq + (8 if color == WHITE else -8)]
+        occupied = (self.occupied & ~BIT[from_sq] & ~captured) | BIT[to_sq]
+        return self._is_square_attacked(king_sq, color ^ 1, occupied, captured)
 
     def is_in_check(self, color):
         """Determine if the given color's king is in check."""
-        # Find the king
-        king_pos = None
-        for row in range(BOARD_HEIGHT):
-            for col in range(BOARD_WIDTH):
-                piece = self.squares[row][col].piece
-                if isinstance(piece, King) and piece.color == color:
-                    king_pos = (row, col)
-                    break
-            if king_pos:
-                break
-
-        if not king_pos:
+        us = COLOR_INDEX[color]
+        king_sq = self.king_squares[us]
+        if king_sq is None:
             return False
-
-        # Check if any opponent's piece can attack the king
-        for row in range(BOARD_HEIGHT):
-            for col in range(BOARD_WIDTH):
-                piece = self.squares[row][col].piece
-                if piece and piece.color != color:
-                    # Calculate moves for the opponent's piece
-                    self.calc_moves(piece, row, col, bool=False)
-                    # Check if any move can capture the king
-                    for move in piece.moves:
-                        if move.final.row == king_pos[0] and move.final.col == king_pos[1]:
-                            return True
-                    piece.clear_moves()
-
+        return self._is_square_attacked(king_sq, us ^ 1, self.occupied)
+
+    def _legal_targets(self, us, from_sq=None):
+        """Yield (square, targets) for each of us's pieces that can move.
+
+        Checkers and pins are worked out once for the position: in check only
+        captures of the checker and blocks on the line to the king are
+        allowed, and pinned pieces stay on their pin line. `from_sq`
+        restricts the result to one piece.
+        """
+        them = us ^ 1
+        own = self.occupancy[us]
+        occupied = self.occupied
+        king = self.pieces[us][KING]
+        king_sq = self.king_squares[us]
+        if king_sq is None:
+            for sq in iter_bits(own if from_sq is None else own & BIT[from_sq]):
+                targets = self._pseudo_targets(self.mailbox[sq], sq)
+                if targets:
+                    yield sq, targets
+            return
+        enemy = self.pieces[them]
+        checkers = self.attackers_to(king_sq, them)
+
+        if from_sq is None or from_sq == king_sq:
+            # The king may not step along the line it is being attacked on
+            without_king = occupied ^ king
+            targets = 0
+            for to_sq in iter_bits(KING_ATTACKS[king_sq] & ~own):
+                if not self._is_square_attacked(to_sq, them, without_king, BIT[to_sq]):
+                    targets |= BIT[to_sq]
+            # Castling: not out of, through or into check
+            if not checkers and self.unmoved & king:
+                for to_sq in iter_bits(self._castling_targets(king_sq)):
+                    if not self._is_square_attacked((king_sq + to_sq) // 2, them, without_king) \
+                            and not self._is_square_attacked(to_sq, them, without_king):
+                        targets |= BIT[to_sq]
+            if targets:
+                yield king_sq, targets
+
+        # Double check: only the king can move
+        if checkers & (checkers - 1):
+            return
+        # Squares that resolve a single check: capture the checker or block
+        evasions = checkers | BETWEEN[king_sq][lsb(checkers)] if checkers else FULL
+
+        # A lone own piece between the king and an enemy slider is pinned
+        pins = {}
+        snipers = ((rook_attacks(king_sq, 0) & (enemy[ROOK] | enemy[QUEEN]))
+                   | (bishop_attacks(king_sq, 0) & (enemy[BISHOP] | enemy[QUEEN])))
+        for sniper in iter_bits(snipers):
+            blockers = BETWEEN[king_sq][sniper] & occupied
+            if blockers & own and not blockers & (blockers - 1):
+                pins[lsb(blockers)] = BETWEEN[king_sq][sniper] | BIT[sniper]
+
+        movers = own ^ king if from_sq is None else own & ~king & BIT[from_sq]
+        ep = self.ep_square
+        for sq in iter_bits(movers):
+            pseudo = self._pseudo_targets(self.mailbox[sq], sq)
+            targets = pseudo & evasions & pins.get(sq, FULL)
+            # En passant removes a pawn the masks know nothing about
+            if ep is not None and pseudo & BIT[ep] and self.pieces[us][PAWN] & BIT[sq]:
+                targets &= ~BIT[ep]
+                if not self._leaves_king_attacked(sq, ep, us):
+                    targets |= BIT[ep]
+            if targets:
+                yield sq, targets
+
+    def legal_moves(self, color=None, out=None, from_sq=None):
+        """Move codes of every legal move for a color (default: side to move).
+
+        Pass a preallocated array('I') as `out` to have it refilled instead
+        of allocating a new list. `from_sq` restricts the moves to the
+        piece on that square.
+        """
+        us = COLOR_INDEX[color or self.turn]
+        if out is None:
+            out = array('I')
+        else:
+            del out[:]
+        append = out.append
+        enemy = self.occupancy[us ^ 1]
+        pawns = self.pieces[us][PAWN]
+        king = self.pieces[us][KING]
+        ep = self.ep_square
+        for from_sq, targets in self._legal_targets(us, from_sq):
+            bit = BIT[from_sq]
+            if pawns & bit:
+                for to_sq in iter_bits(targets):
+                    move = from_sq | to_sq << 6
+                    if enemy & BIT[to_sq]:
+                        move |= CAPTURE
+                    elif to_sq == ep:
+                        move |= CAPTURE | EN_PASSANT
+                    elif to_sq - from_sq in (16, -16):
+                        move |= DOUBLE_PUSH
+                    if to_sq < 8 or to_sq >= 56:
+                        for promotion in PROMOTIONS:
+                            append(move | promotion << PROMOTION_SHIFT)
+                    else:
+                        append(move)
+            elif king & bit:
+                for to_sq in iter_bits(targets):
+                    if to_sq - from_sq in (2, -2):
+                        append(from_sq | to_sq << 6 | CASTLING)
+                    elif enemy & BIT[to_sq]:
+                        append(from_sq | to_sq << 6 | CAPTURE)
+                    else:
+                        append(from_sq | to_sq << 6)
+            else:
+                for to_sq in iter_bits(targets & enemy):
+                    append(from_sq | to_sq << 6 | CAPTURE)
+                for to_sq in iter_bits(targets & ~enemy):
+                    append(from_sq | to_sq << 6)
+        return out
+
+    def _has_legal_move(self, color):
+        """Whether the given color has at least one legal move."""
+        for _ in self._legal_targets(COLOR_INDEX[color]):
+            return True
         return False
 
-    def _get_checking_pieces_and_squares(self, color):
-        """Get the pieces giving check and the squares between them and the king."""
-        # Find the king
-        king_pos = None
-        for row in range(BOARD_HEIGHT):
-            for col in range(BOARD_WIDTH):
-                piece = self.squares[row][col].piece
-                if isinstance(piece, King) and piece.color == color:
-                    king_pos = (row, col)
-                    break
-            if king_pos:
-                break
-
-        if not king_pos:
-            return [], []
-
-        checking_pieces = []
-        blocking_squares = set()
-
-        # Check for attacking pieces
-        for row in range(BOARD_HEIGHT):
-            for col in range(BOARD_WIDTH):
-                piece = self.squares[row][col].piece
-                if piece and piece.color != color:
-                    self.calc_moves(piece, row, col, bool=False)
-                    for move in piece.moves:
-                        if move.final.row == king_pos[0] and move.final.col == king_pos[1]:
-                            checking_pieces.append((piece, (row, col)))
-                            
-                            # For sliding pieces (Bishop, Rook, Queen), add squares between
-                            if isinstance(piece, (Bishop, Rook, Queen)):
-                                row_diff = king_pos[0] - row
-                                col_diff = king_pos[1] - col
-                                
-                                # Determine direction of attack
-                                row_step = 0 if row_diff == 0 else row_diff // abs(row_diff)
-                                col_step = 0 if col_diff == 0 else col_diff // abs(col_diff)
-                                
-                                # Add all squares between piece and king
-                                curr_row = row + row_step
-                                curr_col = col + col_step
-                                while (curr_row, curr_col) != king_pos:
-                                    blocking_squares.add((curr_row, curr_col))
-                                    curr_row += row_step
-                                    curr_col += col_step
-
-        return checking_pieces, list(blocking_squares)
-
     def is_checkmate(self, color):
         """Check if the given color is in checkmate."""
         # First verify if the king is in check
         if not self.is_in_check(color):
             return False
-
-        # Find the king
-        king = None
-        king_pos = None
-        for row in range(BOARD_HEIGHT):
-            for col in range(BOARD_WIDTH):
-                piece = self.squares[row][col].piece
-                if isinstance(piece, King) and piece.color == color:
-                    king = piece
-                    king_pos = (row, col)
-                    break
-            if king:
-                break
-
-        if not king:
-            return False
-
-        # Try every piece's moves to see if they can prevent check
-        for row in range(BOARD_HEIGHT):
-            for col in range(BOARD_WIDTH):
-                piece = self.squares[row][col].piece
-                if piece and piece.color == color:
-                    # Calculate all possible moves for this piece
-                    self.calc_moves(piece, row, col, bool=True)
-                    
-                    # Try each move
-                    for move in piece.moves:
-                        # Store current state
-                        captured_piece = self.squares[move.final.row][move.final.col].piece
-                        
-                        # Make the test move
-                        self.move(piece, move, testing=True)
-                        
-                        # Check if we're still in check after this move
-                        still_in_check = self.is_in_check(color)
-                        
-                        # Undo the test move
-                        self.squares[move.initial.row][move.initial.col].piece = piece
-                        self.squares[move.final.row][move.final.col].piece = captured_piece
-                        piece.moved = False
-                        
-                        # If any move gets us out of check, it's not checkmate
-                        if not still_in_check:
-                            return False
-                    
-                    piece.clear_moves()
-
         # If no moves get us out of check, it's checkmate
-        return True
+        return not self._has_legal_move(color)
 
     def is_stalemate(self, color):
         """Check if the given color is in stalemate."""
         # If in check, it's not stalemate
         if self.is_in_check(color):
             return False
-
-        # Try every possible move
-        for row in range(BOARD_HEIGHT):
-            for col in range(BOARD_WIDTH):
-                piece = self.squares[row][col].piece
-                if piece and piece.color == color:
-                    self.calc_moves(piece, row, col, bool=True)
-                    for move in piece.moves:
-                        if self.valid_move(piece, move):
-                            return False
-                    piece.clear_moves()
-
         # If no legal moves found and not in check, it's stalemate
-        return True
+        return not self._has_legal_move(color)
 
     def castling(self, initial, final):
-        king = self.squares[initial.row][initial.col].piece
-        if not isinstance(king, King) or king.moved:
+        king = self.mailbox[initial.row * 8 + initial.col]
+        if not isinstance(king, King) or not self.unmoved & BIT[initial.row * 8 + initial.col]:
             return False
         diff = final.col - initial.col
         if abs(diff) != 2:
             return False
         rook_col = 0 if diff < 0 else 7
-        rook = self.squares[initial.row][rook_col].piece
-        if not isinstance(rook, Rook) or rook.moved:
+        rook = self.mailbox[initial.row * 8 + rook_col]
+        if not isinstance(rook, Rook) or not self.unmoved & BIT[initial.row * 8 + rook_col]:
             return False
         step = -1 if diff < 0 else 1
         for col in range(initial.col + step, rook_col, step):
-            if self.squares[initial.row][col].has_piece() or self.is_in_check(king.color):
+            if self.mailbox[initial.row * 8 + col] or self.is_in_check(king.color):
                 return False
         return True
 
     def calc_moves(self, piece, row, col, bool=True):
-        """Calculate all the possible moves for a piece at the given position."""
+        """List the possible moves for a piece at the given position."""
         # For non-validation calls, skip caching
         if not bool:
-            piece.clear_moves()
-            self._calculate_piece_moves(piece, row, col)
-            return
-
-        # Use simpler cache key for better performance
-        cache_key = (
-            piece.__class__.__name__,
-            piece.color,
-            row,
-            col,
-            piece.moved,  # Important for kings and pawns
-            self.last_move.final.row if self.last_move else None,  # For en passant
-            self.last_move.final.col if self.last_move else None
-        )
-        
-        if cache_key in self.move_cache:
-            piece.moves = self.move_cache[cache_key].copy()
-            return
-
-        piece.clear_moves()
-        self._calculate_piece_moves(piece, row, col)
-
-        if bool:
-            # Optimize check validation for endgame
-            valid_moves = []
-            # Create board state array once
-            temp_squares = [[self.squares[r][c].piece for c in range(BOARD_WIDTH)]
-                          for r in range(BOARD_HEIGHT)]
-            
-            # Find king position once for the color
-            king_pos = None
-            if not isinstance(piece, King):  # Only need king position for non-king pieces
-                for r in range(BOARD_HEIGHT):
-                    for c in range(BOARD_WIDTH):
-                        p = self.squares[r][c].piece
-                        if isinstance(p, King) and p.color == piece.color:
-                            king_pos = (r, c)
-                            break
-                    if king_pos:
-                        break
-
-            for move in piece.moves:
-                # Save original pieces
-                moving_piece = temp_squares[move.initial.row][move.initial.col]
-                captured_piece = temp_squares[move.final.row][move.final.col]
-                
-                # Make move
-                temp_squares[move.final.row][move.final.col] = moving_piece
-                temp_squares[move.initial.row][move.initial.col] = None
-
-                # If the piece is a king, update king position for check validation
-                check_pos = (move.final.row, move.final.col) if isinstance(piece, King) else king_pos
-                
-                # Faster check validation
-                if not self._is_square_attacked(check_pos[0], check_pos[1], piece.color, temp_squares):
-                    valid_moves.append(move)
-                
-                # Restore position
-                temp_squares[move.initial.row][move.initial.col] = moving_piece
-                temp_squares[move.final.row][move.final.col] = captured_piece
-            
-            piece.moves = valid_moves
-            
-            # Cache the results
-            self.move_cache[cache_key] = piece.moves.copy()
-            
-            # Limit cache size to prevent memory issues
-            if len(self.move_cache) > 10000:  # Increased cache size for endgame
-                # Keep only the most recent entries
-                self.move_cache = dict(list(self.move_cache.items())[-5000:])
+            return self._calculate_piece_moves(piece, row, col)
+
+        # The hash covers every piece, castling rights and en passant
+        cache_key = (self.hash, row * 8 + col)
+        cached = self.move_cache.get(cache_key)
+        if cached is not None:
+            self.move_cache.move_to_end(cache_key)
+            return cached.copy()
+
+        moves = []
+        initial = Square(row, col)
+        for _, targets in self._legal_targets(COLOR_INDEX[piece.color], row * 8 + col):
+            for to_sq in iter_bits(targets):
+                moves.append(Move(initial, Square(to_sq >> 3, to_sq & 7)))
+
+        # Cache the results, evicting the least recently used entry
+        self.move_cache[cache_key] = moves.copy()
+        if len(self.move_cache) > MOVE_CACHE_SIZE:
+            self.move_cache.popitem(last=False)
+        return moves
 
     def _calculate_piece_moves(self, piece, row, col):
-        """Calculate raw moves for a piece without validation."""
-        if isinstance(piece, Pawn):
-            self._pawn_moves(piece, row, col)
-        elif isinstance(piece, Knight):
-            self._knight_moves(piece, row, col)
-        elif isinstance(piece, Bishop):
-            self._straightline_moves(piece, row, col, [(-1, -1), (-1, 1), (1, -1), (1, 1)])
-        elif isinstance(piece, Rook):
-            self._straightline_moves(piece, row, col, [(-1, 0), (1, 0), (0, -1), (0, 1)])
-        elif isinstance(piece, Queen):
-            self._straightline_moves(piece, row, col, [
-                (-1, -1), (-1, 1), (1, -1), (1, 1),
-                (-1, 0), (1, 0), (0, -1), (0, 1)
-            ])
-        elif isinstance(piece, King):
-            self._king_moves(piece, row, col)
-
-    def _is_square_attacked(self, row, col, color, board_state):
-        """Fast check if a square is attacked by any opponent piece."""
-        # Check knight attacks first (they're simpler)
-        knight_moves = [
-            (-2, -1), (-2, 1), (-1, -2), (-1, 2),
-            (1, -2), (1, 2), (2, -1), (2, 1)
-        ]
-        for dr, dc in knight_moves:
-            r, c = row + dr, col + dc
-            if 0 <= r < BOARD_HEIGHT and 0 <= c < BOARD_WIDTH:
-                piece = board_state[r][c]
-                if piece and piece.color != color and isinstance(piece, Knight):
-                    return True
-
-        # Check pawn attacks
-        pawn_direction = 1 if color == 'white' else -1
-        for dc in [-1, 1]:
-            r, c = row + pawn_direction, col + dc
-            if 0 <= r < BOARD_HEIGHT and 0 <= c < BOARD_WIDTH:
-                piece = board_state[r][c]
-                if piece and piece.color != color and isinstance(piece, Pawn):
-                    return True
-
-        # Check sliding pieces
-        directions = [
-            (-1, -1), (-1, 0), (-1, 1),
-            (0, -1),           (0, 1),
-            (1, -1),  (1, 0),  (1, 1)
-        ]
-        
-        for dr, dc in directions:
-            r, c = row + dr, col + dc
-            diagonal = dr != 0 and dc != 0
-            
-            while 0 <= r < BOARD_HEIGHT and 0 <= c < BOARD_WIDTH:
-                piece = board_state[r][c]
-                if piece:
-                    if piece.color != color:
-                        if diagonal and (isinstance(piece, Bishop) or isinstance(piece, Queen)):
-                            return True
-                        if not diagonal and (isinstance(piece, Rook) or isinstance(piece, Queen)):
-                            return True
-                        if abs(r - row) <= 1 and abs(c - col) <= 1 and isinstance(piece, King):
-                            return True
-                    break
-                r, c = r + dr, c + dc
-
-        return False
-
-    def _pawn_moves(self, piece, row, col):
-        """Calculate pawn moves."""
-        steps = -1 if piece.color == 'white' else 1
-        start_row = 6 if piece.color == 'white' else 1
-
-        # Forward moves
-        if 0 <= row + steps < BOARD_HEIGHT:
-            if not self.squares[row + steps][col].has_piece():
-                piece.add_move(Move(Square(row, col), Square(row + steps, col)))
-                if row == start_row and not self.squares[row + 2*steps][col].has_piece():
-                    piece.add_move(Move(Square(row, col), Square(row + 2*steps, col)))
-
-        # Captures
-        for c in [-1, 1]:
-            if 0 <= col + c < BOARD_WIDTH and 0 <= row + steps < BOARD_HEIGHT:
-                if self.squares[row + steps][col + c].has_piece():
-                    target = self.squares[row + steps][col + c].piece
-                    if target.color != piece.color:
-                        piece.add_move(Move(Square(row, col), Square(row + steps, col + c)))
-
-    def _knight_moves(self, piece, row, col):
-        """Calculate knight moves."""
-        moves = [
-            (row + 2, col + 1), (row + 2, col - 1),
-            (row - 2, col + 1), (row - 2, col - 1),
-            (row + 1, col + 2), (row + 1, col - 2),
-            (row - 1, col + 2), (row - 1, col - 2)
-        ]
-        
-        for r, c in moves:
-            if 0 <= r < BOARD_HEIGHT and 0 <= c < BOARD_WIDTH:
-                if not self.squares[r][c].has_piece() or \
-                   self.squares[r][c].piece.color != piece.color:
-                    piece.add_move(Move(Square(row, col), Square(r, c)))
-
-    def _king_moves(self, piece, row, col):
-        """Calculate king moves."""
-        moves = [
-            (row-1, col-1), (row-1, col), (row-1, col+1),
-            (row, col-1),                 (row, col+1),
-            (row+1, col-1), (row+1, col), (row+1, col+1)
-        ]
-        
-        for r, c in moves:
-            if 0 <= r < BOARD_HEIGHT and 0 <= c < BOARD_WIDTH:
-                if not self.squares[r][c].has_piece() or \
-                   self.squares[r][c].piece.color != piece.color:
-                    piece.add_move(Move(Square(row, col), Square(r, c)))
-
+        """List raw moves for a piece without validation."""
+        initial = Square(row, col)
+        return [Move(initial, Square(to_sq >> 3, to_sq & 7))
+                for to_sq in iter_bits(self._pseudo_targets(piece, row * 8 + col))]
+
+    def _pseudo_targets(self, piece, sq):
+        """Bitboard of squares the piece on sq can move to, ignoring checks."""
+        kind = PIECE_TYPES[type(piece)]
+        color = COLOR_INDEX[piece.color]
+        if kind == PAWN:
+            return self._pawn_targets(sq, color)
+        own = self.occupancy[color]
+        if kind == KNIGHT:
+            return KNIGHT_ATTACKS[sq] & ~own
+        if kind == BISHOP:
+            return bishop_attacks(sq, self.occupied) & ~own
+        if kind == ROOK:
+            return rook_attacks(sq, self.occupied) & ~own
+        if kind == QUEEN:
+            return queen_attacks(sq, self.occupied) & ~own
+        targets = KING_ATTACKS[sq] & ~own
         # Castling
-        if not piece.moved:
-            self._add_castling_moves(piece, row, col)
-
-    def _add_castling_moves(self, king, row, col):
-        """Add castling moves if available."""
+        if self.unmoved & BIT[sq]:
+            targets |= self._castling_targets(sq)
+        return targets
+
+    def attacks_from(self, piece, sq):
+        """Bitboard of squares the piece on sq attacks (own pieces included)."""
+        kind = PIECE_TYPES[type(piece)]
+        if kind == PAWN:
+            return PAWN_ATTACKS[COLOR_INDEX[piece.color]][sq]
+        if kind == KNIGHT:
+            return KNIGHT_ATTACKS[sq]
+        if kind == BISHOP:
+            return bishop_attacks(sq, self.occupied)
+        if kind == ROOK:
+            return rook_attacks(sq, self.occupied)
+        if kind == QUEEN:
+            return queen_attacks(sq, self.occupied)
+        return KING_ATTACKS[sq]
+
+    def _pawn_targets(self, sq, color):
+        """Pawn pushes and captures from sq."""
+        occupied = self.occupied
+        if color == WHITE:
+            one, two, start_row = sq - 8, sq - 16, 6
+        else:
+            one, two, start_row = sq + 8, sq + 16, 1
+
+        targets = PAWN_ATTACKS[color][sq] & self.occupancy[color ^ 1]
+        # En passant: the square skipped by the opponent's double push
+        ep = self.ep_square
+        if ep is not None and ep >> 3 == (2 if color == WHITE else 5):
+            targets |= PAWN_ATTACKS[color][sq] & BIT[ep]
+        # Forward moves
+        if 0 <= one < 64 and not occupied & BIT[one]:
+            targets |= BIT[one]
+            if sq >> 3 == start_row and not occupied & BIT[two]:
+                targets |= BIT[two]
+        return targets
+
+    def _castling_targets(self, sq):
+        """Castling destinations for an unmoved king on sq."""
+        col = sq & 7
+        targets = 0
         # Kingside
         if col + 3 < BOARD_WIDTH:
-            rook = self.squares[row][col + 3].piece
-            if isinstance(rook, Rook) and not rook.moved:
-                if not any(self.squares[row][c].has_piece() for c in range(col + 1, col + 3)):
-                    king.add_move(Move(Square(row, col), Square(row, col + 2)))
-        
+            rook = self.mailbox[sq + 3]
+            if isinstance(rook, Rook) and self.unmoved & BIT[sq + 3]:
+                if not self.occupied & BETWEEN[sq][sq + 3]:
+                    targets |= BIT[sq + 2]
+
         # Queenside
         if col - 4 >= 0:
-            rook = self.squares[row][col - 4].piece
-            if isinstance(rook, Rook) and not rook.moved:
-                if not any(self.squares[row][c].has_piece() for c in range(col - 3, col)):
-                    king.add_move(Move(Square(row, col), Square(row, col - 2)))
-
-    def _straightline_moves(self, piece, row, col, directions):
-        """Calculate moves for sliding pieces (Bishop, Rook, Queen)."""
-        for row_dir, col_dir in directions:
-            r, c = row + row_dir, col + col_dir
-            while 0 <= r < BOARD_HEIGHT and 0 <= c < BOARD_WIDTH:
-                if not self.squares[r][c].has_piece():
-                    piece.add_move(Move(Square(row, col), Square(r, c)))
-                else:
-                    if self.squares[r][c].piece.color != piece.color:
-                        piece.add_move(Move(Square(row, col), Square(r, c)))
-                    break
-                r, c = r + row_dir, c + col_dir
+            rook = self.mailbox[sq - 4]
+            if isinstance(rook, Rook) and self.unmoved & BIT[sq - 4]:
+                if not self.occupied & BETWEEN[sq][sq - 4]:
+                    targets |= BIT[sq - 2]
+        return targets
 
     def is_endgame(self):
         """Determine if the position is in endgame phase."""
-        # Simplified and faster endgame detection
-        total_pieces = 0
-        major_pieces = 0
-        
-        for row in range(BOARD_HEIGHT):
-            for col in range(BOARD_WIDTH):
-                piece = self.squares[row][col].piece
-                if piece and not isinstance(piece, King):
-                    total_pieces += 1
-                    if isinstance(piece, (Queen, Rook)):
-                        major_pieces += 1
-                    if total_pieces > 10:  # Early exit if too many pieces
-                        return False
-        
+        kings = self.pieces[WHITE][KING] | self.pieces[BLACK][KING]
+        total_pieces = popcount(self.occupied & ~kings)
+        if total_pieces > 10:
+            return False
+        major_pieces = popcount(self.pieces[WHITE][QUEEN] | self.pieces[WHITE][ROOK]
+                                | self.pieces[BLACK][QUEEN] | self.pieces[BLACK][ROOK])
+
         # Consider it endgame if:
         # 1. Less than 10 total pieces, or
         # 2. No queens and at most one rook per side
@@ -654,23 +838,20 @@ class Board:
 
     def make_move(self, from_square, to_square):
         """Validate and execute a move."""
-        piece = self.squares[from_square.row][from_square.col].piece
-        
+        piece = self.mailbox[from_square.row * 8 + from_square.col]
+
         if not piece:
             return False
-            
+
         if piece.color != 'white':  # Only white pieces can be moved by the player
             return False
-            
+
         move = Move(from_square, to_square)
-        
-        # Calculate valid moves for the piece
-        self.calc_moves(piece, from_square.row, from_square.col, bool=True)
-        
+
         # Check if the move is valid
         if not self.valid_move(piece, move):
             return False
-            
+
         # Execute the move
         self.move(piece, move)
         return True
@@ -1,43 +1,16 @@
-import copy
 import math
+import os
 import random
-from chessbot.board import Board
-from chessbot.move import Move
+import time
+from chessbot.board import PIECE_TYPES, PAWN_TABLE, KNIGHT_TABLE, BISHOP_TABLE
+from chessbot.move import CAPTURE, CASTLING, EN_PASSANT, PROMOTION_SHIFT, NULL_MOVE
 from chessbot.piece import *
-
-# Piece-Square tables for positional evaluation
-PAWN_TABLE = [
-    0,  0,  0,  0,  0,  0,  0,  0,
-    50, 50, 50, 50, 50, 50, 50, 50,
-    10, 10, 20, 30, 30, 20, 10, 10,
-    5,  5, 10, 25, 25, 10,  5,  5,
-    0,  0,  0, 20, 20,  0,  0,  0,
-    5, -5,-10,  0,  0,-10, -5,  5,
-    5, 10, 10,-20,-20, 10, 10,  5,
-    0,  0,  0,  0,  0,  0,  0,  0
-]
-
-KNIGHT_TABLE = [
-    -50,-40,-30,-30,-30,-30,-40,-50,
-    -40,-20,  0,  0,  0,  0,-20,-40,
-    -30,  0, 10, 15, 15, 10,  0,-30,
-    -30,  5, 15, 20, 20, 15,  5,-30,
-    -30,  0, 15, 20, 20, 15,  0,-30,
-    -30,  5, 10, 15, 15, 10,  5,-30,
-    -40,-20,  0,  5,  5,  0,-20,-40,
-    -50,-40,-30,-30,-30,-30,-40,-50
-]
-
-BISHOP_TABLE = [
-    -20,-10,-10,-10,-10,-10,-10,-20,
-    -10,  0,  0,  0,  0,  0,  0,-10,
-    -10,  0,  5, 10, 10,  5,  0,-10,
-    -10,  5,  5, 10, 10,  5,  5,-10,
-    -10,  0, 10, 10, 10, 10,  0,-10,
-    -10, 10, 10, 10, 10, 10, 10,-10,
-    -10,  5,  0,  0,  0,  0,  5,-10,
-    -20,-10,-10,-10,-10,-10,-10,-20
-]
+from chessbot.bitboard import *
+from chessbot.transposition import TranspositionTable, EXACT, LOWERBOUND, UPPERBOUND
+from chessbot.polyglot import get_book
+from chessbot.ingest import get_index
+from chessbot.tablebase import get_tablebase
+from chessbot.pawns import PawnTable
 
 # Simplified piece values for faster evaluation
 PIECE_VALUES = {
@@ -59,6 +32,129 @@ MAX_CACHE_SIZE = 500  # Reduced cache size
 # Add capture value multiplier
 CAPTURE_MULTIPLIER = 100
 
+# Ordering scores for quiet moves that caused cutoffs elsewhere: below the
+# winning captures (CAPTURE_MULTIPLIER * pawn value and up), above the rest
+KILLER_SCORES = (8000, 7900)
+COUNTER_MOVE_SCORE = 7800
+# History scores are halved once one reaches this, keeping them below killers
+HISTORY_LIMIT = 4000
+
+# Null-move pruning searches the pass this many plies shallower
+NULL_MOVE_REDUCTION = 2
+# Late move reductions: quiet moves from this index on, at this depth and up
+LMR_MIN_MOVES = 3
+LMR_MIN_DEPTH = 3
+
+# Quiescence search skips captures that fall this far short of alpha
+DELTA_MARGIN = 200
+
+# Per-move search budget; iterative deepening stops at whichever comes first
+SEARCH_TIME_LIMIT = 1.0  # seconds
+MAX_SEARCH_DEPTH = 32
+
+# Being mated scores this less the plies from the root, so shorter mates score higher
+MATE_SCORE = 99999
+# Tablebase wins score this less the plies to mate, below mates the search finds
+TABLEBASE_WIN = 90000
+# Scores beyond this are mates or tablebase wins, which count plies from the root
+DECISIVE_SCORE = TABLEBASE_WIN - 1000
+
+# Pawn-structure scores of recent pawn placements, shared by every search in the process
+pawn_table = PawnTable()
+
+# Processes a search runs in; more than one enables the parallel search,
+# which is experimental: it has yet to beat one process (see chessbot.parallel)
+SEARCH_WORKERS = int(os.environ.get('SEARCH_WORKERS', 1))
+
+# Score the children of frontier nodes in one NumPy batch (chessbot.batch)
+BATCH_EVAL = os.environ.get('BATCH_EVAL', '0') == '1'
+if BATCH_EVAL:
+    try:
+        from chessbot.batch import encode_bitboards, evaluate_batch
+    except ImportError as e:
+        print(f"Error loading batch evaluation: {str(e)}")
+        BATCH_EVAL = False
+
+# Named strengths: get_best_move arguments for each. The node budget sets
+# the compute a move costs, with the time limit as a backstop; noise
+# (centipawns, either way) blurs the evaluation so weaker levels misjudge
+# positions
+DIFFICULTY_LEVELS = {
+    'easy': {'depth': 2, 'time_limit': 0.2, 'node_limit': 500, 'noise': 150},
+    'medium': {'depth': None, 'time_limit': 0.5, 'node_limit': 3000, 'noise': 40},
+    'hard': {'depth': None, 'time_limit': SEARCH_TIME_LIMIT, 'node_limit': None, 'noise': 0},
+}
+DEFAULT_DIFFICULTY = 'hard'
+
+class SearchTimeout(Exception):
+    """Raised inside the search when the time or node budget is spent."""
+
+class SearchStats:
+    """What one get_best_move call did, for tuning and spotting regressions."""
+
+    def __init__(self):
+        self.source = None  # tablebase, book, index, only move, search or fallback
+        self.nodes = 0
+        self.qnodes = 0  # of which quiescence nodes
+        self.depth = 0
+        self.score = 0
+        self.cutoffs = 0
+        self.first_move_cutoffs = 0
+        self.tt_probes = 0
+        self.tt_hits = 0
+        self.tb_hits = 0
+        self.phases = {}  # seconds spent in each phase
+        self._mark = time.perf_counter()
+
+    def lap(self, phase):
+        """Charge the time since the last lap to `phase`."""
+        now = time.perf_counter()
+        self.phases[phase] = self.phases.get(phase, 0.0) + now - self._mark
+        self._mark = now
+
+    def add_counts(self, other):
+        """Add the node, cutoff and table counts of another search's stats."""
+        self.nodes += other.nodes
+        self.qnodes += other.qnodes
+        self.cutoffs += other.cutoffs
+        self.first_move_cutoffs += other.first_move_cutoffs
+        self.tt_probes += other.tt_probes
+        self.tt_hits += other.tt_hits
+        self.tb_hits += other.tb_hits
+
+    @property
+    def time(self):
+        return sum(self.phases.values())
+
+    @property
+    def nps(self):
+        search_time = self.phases.get('search', 0.0)
+        return self.nodes / search_time if search_time else 0.0
+
+    @property
+    def first_move_cutoff_rate(self):
+        """Share of beta cutoffs made by the first move tried: move ordering quality."""
+        return self.first_move_cutoffs / self.cutoffs if self.cutoffs else 0.0
+
+    @property
+    def tt_hit_rate(self):
+        return self.tt_hits / self.tt_probes if self.tt_probes else 0.0
+
+    def as_dict(self):
+        return {
+            'source': self.source,
+            'nodes': self.nodes,
+            'qnodes': self.qnodes,
+            'nps': round(self.nps),
+            'depth': self.depth,
+            'score': self.score,
+            'first_move_cutoff_rate': round(self.first_move_cutoff_rate, 3),
+            'tt_hit_rate': round(self.tt_hit_rate, 3),
+            'tb_hits': self.tb_hits,
+            'time': round(self.time, 4),
+            'phases': {phase: round(seconds, 4) for phase, seconds in self.phases.items()},
+        }
+
 def get_square_value(piece, row, col, is_endgame):
     """Get positional value for a piece."""
     if isinstance(piece, Pawn):
@@ -70,55 +166,40 @@ def get_square_value(piece, row, col, is_endgame):
     return 0
 
 def evaluate_board(board):
-    """Enhanced board evaluation focusing on material and position."""
-    try:
-        if board.is_checkmate('white'): return -99999
-        if board.is_checkmate('black'): return 99999
-        if board.is_stalemate('white') or board.is_stalemate('black'): return 0
+    """Static evaluation in centipawns, positive when white is better.
 
-        score = 0
+    Material and piece-square values are kept up to date by the board as
+    pieces move, and the pawn-structure score usually comes from the pawn
+    table, so only mobility and checks are computed in full here.
+    Checkmate and stalemate are left to the search, which knows when the
+    side to move has no legal moves.
+    """
+    try:
+        score = (board.material[WHITE] - board.material[BLACK]
+                 + board.placement[WHITE] - board.placement[BLACK])
         is_endgame = board.is_endgame()
-        
-        # Material and position evaluation
-        for row in range(8):
-            for col in range(8):
-                piece = board.squares[row][col].piece
-                if not piece: continue
-                
-                # Base piece value
-                value = PIECE_VALUES[type(piece)]
-                
-                # Add positional value
-                value += get_square_value(piece, row, col, is_endgame)
-                
-                # Mobility bonus (simplified)
-                if not isinstance(piece, (Pawn, King)):
-                    board.calc_moves(piece, row, col, bool=False)
-                    value += len(piece.moves) * 5
-                
-                # Pawn structure evaluation
-                if isinstance(piece, Pawn):
-                    # Doubled pawns penalty
-                    doubled = False
-                    for r in range(8):
-                        if r != row and isinstance(board.squares[r][col].piece, Pawn) and board.squares[r][col].piece.color == piece.color:
-                            doubled = True
-                            break
-                    if doubled:
-                        value -= 20
-                    
-                    # Passed pawn bonus
-                    passed = True
-                    pawn_direction = -1 if piece.color == 'white' else 1
-                    for r in range(row + pawn_direction, 0 if pawn_direction == -1 else 7, pawn_direction):
-                        if isinstance(board.squares[r][col].piece, Pawn):
-                            passed = False
-                            break
-                    if passed:
-                        value += 50
-                
-                score += value if piece.color == 'white' else -value
-        
+        occupied = board.occupied
+
+        for us in (WHITE, BLACK):
+            pieces = board.pieces[us]
+            not_own = ~board.occupancy[us]
+            value = 0
+
+            # Mobility bonus (simplified)
+            for sq in iter_bits(pieces[KNIGHT]):
+                value += popcount(KNIGHT_ATTACKS[sq] & not_own) * 5
+            for sq in iter_bits(pieces[BISHOP]):
+                value += popcount(bishop_attacks(sq, occupied) & not_own) * 5
+            for sq in iter_bits(pieces[ROOK]):
+                value += popcount(rook_attacks(sq, occupied) & not_own) * 5
+            for sq in iter_bits(pieces[QUEEN]):
+                value += popcount(queen_attacks(sq, occupied) & not_own) * 5
+
+            score += value if us == WHITE else -value
+
+        # Pawn structure evaluation, cached by pawn placement
+        score += pawn_table.score(board.pieces[WHITE][PAWN], board.pieces[BLACK][PAWN])
+
         # Quick check evaluation with higher penalty in endgame
         check_penalty = 80 if is_endgame else 50
         if board.is_in_check('white'): score -= check_penalty
@@ -129,6 +210,31 @@ def evaluate_board(board):
         print(f"Error in evaluate_board: {str(e)}")
         return 0
 
+def tablebase_score(value, ply):
+    """Search score, for the side to move, of a tablebase value `ply` plies from the root."""
+    if value > 0:
+        return TABLEBASE_WIN - ply - value
+    if value < 0:
+        return -(TABLEBASE_WIN - ply + value + 1)
+    return 0
+
+def score_to_table(score, ply):
+    """A score as the transposition table keeps it: decisive scores count
+    plies from the node `ply` plies from the root, not from the root."""
+    if score >= DECISIVE_SCORE:
+        return score + ply
+    if score <= -DECISIVE_SCORE:
+        return score - ply
+    return score
+
+def score_from_table(score, ply):
+    """The search score of a table score read `ply` plies from the root."""
+    if score >= DECISIVE_SCORE:
+        return score - ply
+    if score <= -DECISIVE_SCORE:
+        return score + ply
+    return score
+
 def evaluate_capture(attacker, target):
     """Evaluate the value of a capture move."""
     if not target or isinstance(target, King):  # Never evaluate king captures
@@ -143,67 +249,63 @@ def evaluate_capture(attacker, target):
     
     return capture_value * CAPTURE_MULTIPLIER + trade_bonus
 
+def capture_value(board, move):
+    """Material won by a capture move code."""
+    if move & EN_PASSANT:
+        return PIECE_VALUES[Pawn]
+    return PIECE_VALUES[type(board.mailbox[move >> 6 & 63])]
+
+def mvv_lva(board, move):
+    """Ordering key for captures: most valuable victim, then least valuable attacker."""
+    return capture_value(board, move) * 10 - PIECE_VALUES[type(board.mailbox[move & 63])] // 100
+
 def quick_move_eval(board, move, piece, move_history):
     """Enhanced move evaluation for better move ordering."""
     try:
         score = 0
-        target = board.squares[move.final.row][move.final.col].piece
+        to_sq = move >> 6 & 63
+        to_row, to_col = to_sq >> 3, to_sq & 7
+        target = board.mailbox[to_sq]
         
         # Never evaluate moves that would capture a king
         if target and isinstance(target, King):
             return float('-inf')
         
-        # Strongly prioritize captures
+        # Strongly prioritize captures that do not lose material
         if target:
-            capture_score = evaluate_capture(piece, target)
-            score += capture_score
-            
-            # Extra bonus for capturing undefended pieces
-            is_defended = False
-            for r in range(8):
-                for c in range(8):
-                    defender = board.squares[r][c].piece
-                    if defender and defender.color == target.color and (r, c) != (move.final.row, move.final.col):
-                        board.calc_moves(defender, r, c, bool=False)
-                        for def_move in defender.moves:
-                            if def_move.final.row == move.final.row and def_move.final.col == move.final.col:
-                                is_defended = True
-                                break
-                    if is_defended:
-                        break
-                if is_defended:
-                    break
-            
-            if not is_defended:
-                score += capture_score * 0.5  # 50% bonus for undefended pieces
+            exchange = board.see(move)
+            if exchange < 0:
+                score += exchange  # Losing captures go after the quiet moves
+            else:
+                capture_score = evaluate_capture(piece, target)
+                score += capture_score
+
+                # Extra bonus when the exchange wins the whole piece
+                if exchange >= PIECE_VALUES[type(target)]:
+                    score += capture_score * 0.5
         
-        # Positional evaluation (reduced weight compared to captures)
-        position_score = get_square_value(piece, move.final.row, move.final.col, board.is_endgame())
-        score += position_score
+        # Positional evaluation (reduced weight compared to captures);
+        # the tables score for white, move scores are for the mover
+        position_score = get_square_value(piece, to_row, to_col, board.is_endgame())
+        score += position_score if piece.color == 'white' else -position_score
         
         # Development bonus in opening (reduced weight)
         if len(move_history) < 10:
-            if isinstance(piece, (Knight, Bishop)) and not piece.moved:
+            if isinstance(piece, (Knight, Bishop)) and board.unmoved & BIT[move & 63]:
                 score += 20
-            if isinstance(piece, Pawn) and 2 <= move.final.row <= 5 and 2 <= move.final.col <= 5:
+            if isinstance(piece, Pawn) and 2 <= to_row <= 5 and 2 <= to_col <= 5:
                 score += 15
         
         # King safety
         if isinstance(piece, King):
             if len(move_history) < 15:
                 score -= 100  # Strongly discourage early king movement
-            elif abs(move.final.col - move.initial.col) == 2:
+            elif move & CASTLING:
                 score += 40  # Encourage castling but not as much as captures
-            
-            # Check if move puts king in danger
-            temp_board = copy.deepcopy(board)
-            temp_board.move(piece, move, testing=True)
-            if temp_board.is_in_check(piece.color):
-                score -= 500  # Heavily penalize moves that put king in check
         
         # Avoid repetition
         for prev_move in move_history[-6:]:
-            if prev_move and prev_move.final.row == move.final.row and prev_move.final.col == move.final.col:
+            if prev_move >> 6 & 63 == to_sq:
                 score -= 30
         
         return score
@@ -211,52 +313,383 @@ def quick_move_eval(board, move, piece, move_history):
         print(f"Error in quick_move_eval: {str(e)}")
         return float('-inf')  # Return worst possible score on error
 
-def get_best_move(board, depth=3, player='black'):
-    """Enhanced move selection with better search."""
+def search(board, player, depth=None, time_limit=None, node_limit=None,
+           table=None, start_depth=1, stop=None, stats=None, noise=0):
+    """Iterative-deepening search for `player`; return (move, score, depth).
+
+    Searches from `start_depth` one ply deeper at a time until `depth`, the
+    time or node budget, or a nonzero `stop[0]` ends it, and reports the
+    last completed iteration. `table` defaults to the board's
+    transposition table. Node, cutoff and table counts are added to
+    `stats`, a SearchStats, if given. With `noise`, every evaluation is
+    off by up to that many centipawns.
+    """
+    tt = table if table is not None else board.transposition_table
+    tablebase = get_tablebase()
+    # Noise is drawn per position, so a position scores the same each
+    # time this search meets it, and per search, so games vary
+    seed = random.getrandbits(64)
+
+    deadline = time.perf_counter() + time_limit if time_limit else None
+    nodes = qnodes = 0
+    # Static scores of the children of the frontier node being searched
+    leaf_scores = {}
+    cutoffs = first_move_cutoffs = tt_probes = tt_hits = tb_hits = 0
+
+    def count_node():
+        nonlocal nodes
+        nodes += 1
+        if node_limit and nodes >= node_limit:
+            raise SearchTimeout
+        if deadline and time.perf_counter() >= deadline:
+            raise SearchTimeout
+        if stop is not None and stop[0]:
+            raise SearchTimeout
+
+    def quiescence(board, alpha, beta, maximizing_player, ply):
+        """Resolve captures at the leaves so the evaluation is taken in a
+        quiet position."""
+        nonlocal qnodes
+        qnodes += 1
+        count_node()
+        color = 'white' if maximizing_player else 'black'
+        # In check every evasion is searched and standing pat is not allowed
+        in_check = board.is_in_check(color)
+        if in_check:
+            moves = board.legal_moves(color)
+            if not moves:
+                return -(MATE_SCORE - ply) if maximizing_player else MATE_SCORE - ply
+            best = float('-inf') if maximizing_player else float('inf')
+        else:
+            # The frontier node may have scored this position already
+            stand_pat = leaf_scores.pop(board.hash, None)
+            if stand_pat is None:
+                stand_pat = evaluate_board(board)
+            best = stand_pat
+            if noise:
+                best = stand_pat = stand_pat + hash((board.hash, seed)) % (2 * noise + 1) - noise
+            # The evaluation leaves stalemate to the search. A stand-pat
+            # cutoff only has to find one legal move; otherwise the moves
+            # are generated once, for this and for the captures
+            if (stand_pat >= beta) if maximizing_player else (stand_pat <= alpha):
+                return stand_pat if board._has_legal_move(color) else 0
+            if maximizing_player:
+                alpha = max(alpha, stand_pat)
+            else:
+                beta = min(beta, stand_pat)
+            moves = board.legal_moves(color)
+            if not moves:
+                return 0
+            # Captures that lose material in the exchange are not tried
+            moves = [move for move in moves if move & CAPTURE and board.see(move) >= 0]
+            moves.sort(key=lambda move: mvv_lva(board, move), reverse=True)
+
+        for move in moves:
+            # Delta pruning: skip captures that cannot lift the score
+            # back into the window even with a margin to spare
+            if not in_check and not move >> PROMOTION_SHIFT:
+                gain = capture_value(board, move) + DELTA_MARGIN
+                if (stand_pat + gain <= alpha) if maximizing_player else (stand_pat - gain >= beta):
+                    continue
+            board.push(move)
+            score = quiescence(board, alpha, beta, not maximizing_player, ply + 1)
+            board.pop()
+            if maximizing_player:
+                best = max(best, score)
+                alpha = max(alpha, score)
+            else:
+                best = min(best, score)
+                beta = min(beta, score)
+            if alpha >= beta:
+                break
+        return best
+
+    # Quiet moves that caused a beta cutoff: two killer slots per ply,
+    # a history score per (color, piece type, to-square) and the reply
+    # that refuted each (from, to) move
+    killers = [[0, 0] for _ in range(MAX_SEARCH_DEPTH + 1)]
+    history = [[0] * 64 for _ in range(12)]
+    counter_moves = [0] * 4096
+
+    def order_moves(board, moves, ply):
+        """Sort move codes best first for the side to move."""
+        mailbox = board.mailbox
+        killer1, killer2 = killers[ply]
+        last_move = board.last_move
+        counter = counter_moves[last_move & 4095] if last_move else 0
+        scores = {}
+        for move in moves:
+            piece = mailbox[move & 63]
+            if move & CAPTURE or move >> PROMOTION_SHIFT:
+                scores[move] = quick_move_eval(board, move, piece, board.move_history)
+            elif move == killer1:
+                scores[move] = KILLER_SCORES[0]
+            elif move == killer2:
+                scores[move] = KILLER_SCORES[1]
+            elif move == counter:
+                scores[move] = COUNTER_MOVE_SCORE
+            else:
+                scores[move] = (quick_move_eval(board, move, piece, board.move_history)
+                                + history[COLOR_INDEX[piece.color] * 6
+                                          + PIECE_TYPES[type(piece)]][move >> 6 & 63])
+        return sorted(moves, key=scores.__getitem__, reverse=True)
+
+    def record_cutoff(board, move, depth, ply):
+        """Remember a quiet move that refuted the opponent's last move."""
+        if move & CAPTURE or move >> PROMOTION_SHIFT:
+            return
+        slots = killers[ply]
+        if slots[0] != move:
+            slots[1], slots[0] = slots[0], move
+        piece = board.mailbox[move & 63]
+        table = history[COLOR_INDEX[piece.color] * 6 + PIECE_TYPES[type(piece)]]
+        table[move >> 6 & 63] += depth * depth
+        if table[move >> 6 & 63] >= HISTORY_LIMIT:
+            for scores in history:
+                for sq in range(64):
+                    scores[sq] >>= 1
+        if board.last_move:
+            counter_moves[board.last_move & 4095] = move
+
+    # Use minimax for main game
+    def minimax(board, depth, alpha, beta, maximizing_player, ply=0, pv=()):
+        """Principal variation search; return (score, principal variation).
+
+        The first move is searched with the full window and the rest
+        with a zero window, re-searching only those that turn out
+        better. `pv` is the line the previous iteration expected from
+        here; its first move is searched first.
+        """
+        nonlocal cutoffs, first_move_cutoffs, tt_probes, tt_hits, tb_hits
+        # Positions the tablebases cover have an exact score
+        if tablebase and ply and popcount(board.occupied) <= tablebase.max_pieces:
+            value = tablebase.probe(board)
+            if value is not None:
+                tb_hits += 1
+                score = tablebase_score(value, ply)
+                return (score if maximizing_player else -score), []
+        if depth <= 0:
+            return quiescence(board, alpha, beta, maximizing_player, ply), []
+        count_node()
+
+        # Reuse what an earlier visit of this position established
+        alpha_orig, beta_orig = alpha, beta
+        tt_move = None
+        entry = tt.probe(board.hash)
+        tt_probes += 1
+        if entry:
+            tt_hits += 1
+            tt_depth, flag, tt_score, tt_move = entry
+            tt_score = score_from_table(tt_score, ply)
+            if tt_depth >= depth:
+                if flag == EXACT:
+                    return tt_score, [tt_move] if tt_move else []
+                if flag == LOWERBOUND:
+                    alpha = max(alpha, tt_score)
+                else:
+                    beta = min(beta, tt_score)
+                if alpha >= beta:
+                    return tt_score, [tt_move] if tt_move else []
+        
+        color = 'white' if maximizing_player else 'black'
+        in_check = board.is_in_check(color)
+
+        # Null move: if passing still fails high the position is good
+        # enough to cut. Zugzwang makes passing unsound in the endgame.
+        if (ply and depth > NULL_MOVE_REDUCTION and not in_check
+                and board.last_move != NULL_MOVE and not board.is_endgame()
+                and alpha > -math.inf and beta < math.inf):
+            board.push_null()
+            if maximizing_player:
+                score, _ = minimax(board, depth - 1 - NULL_MOVE_REDUCTION,
+                                   beta - 1, beta, False, ply + 1)
+            else:
+                score, _ = minimax(board, depth - 1 - NULL_MOVE_REDUCTION,
+                                   alpha, alpha + 1, True, ply + 1)
+            board.pop()
+            # Only the bound is returned: a mate found after passing is not
+            # a mate the position has
+            if maximizing_player and score >= beta:
+                return beta, []
+            if not maximizing_player and score <= alpha:
+                return alpha, []
+
+        valid_moves = board.legal_moves(color)
+        
+        if not valid_moves:
+            if in_check:
+                return (-(MATE_SCORE - ply) if maximizing_player else MATE_SCORE - ply), []
+            return 0, []
+        
+        best_line = []
+        best_eval = float('-inf') if maximizing_player else float('inf')
+        
+        # Sort moves for better pruning; every legal move is searched
+        ordered_moves = order_moves(board, valid_moves, ply)
+        # Search the principal variation first, then the table's best move
+        for first in (tt_move, pv[0] if pv else None):
+            if first and first in ordered_moves:
+                ordered_moves.remove(first)
+                ordered_moves.insert(0, first)
+        # At the frontier the children are scored together
+        if BATCH_EVAL and depth == 1:
+            hashes, rows = [], []
+            for move in ordered_moves:
+                board.push(move)
+                hashes.append(board.hash)
+                rows.append(board.pieces[WHITE] + board.pieces[BLACK])
+                board.pop()
+            leaf_scores.clear()
+            leaf_scores.update(zip(hashes, evaluate_batch(encode_bitboards(rows)).tolist()))
+        quiet_from = LMR_MIN_MOVES if depth >= LMR_MIN_DEPTH and not in_check else len(ordered_moves)
+        
+        for index, move in enumerate(ordered_moves):
+            # Make move
+            board.push(move)
+            
+            # Recursive evaluation
+            child_pv = pv[1:] if pv and move == pv[0] else ()
+            if index == 0:
+                eval_score, line = minimax(board, depth - 1, alpha, beta,
+                                           not maximizing_player, ply + 1, child_pv)
+            else:
+                # Late quiet moves are searched one ply shallower first
+                reduction = 1 if (index >= quiet_from and not move & CAPTURE
+                                  and not move >> PROMOTION_SHIFT
+                                  and move not in killers[ply]) else 0
+                if maximizing_player:
+                    window = (alpha, alpha + 1)
+                else:
+                    window = (beta - 1, beta)
+                eval_score, line = minimax(board, depth - 1 - reduction, *window,
+                                           not maximizing_player, ply + 1, child_pv)
+                improves = eval_score > alpha if maximizing_player else eval_score < beta
+                if reduction and improves:
+                    eval_score, line = minimax(board, depth - 1, *window,
+                                               not maximizing_player, ply + 1, child_pv)
+                    improves = eval_score > alpha if maximizing_player else eval_score < beta
+                if improves and alpha < eval_score < beta:
+                    eval_score, line = minimax(board, depth - 1, alpha, beta,
+                                               not maximizing_player, ply + 1, child_pv)
+            
+            # Undo move
+            board.pop()
+            
+            # Update best move
+            if maximizing_player:
+                if eval_score > best_eval:
+                    best_eval = eval_score
+                    best_line = [move] + line
+                alpha = max(alpha, eval_score)
+            else:
+                if eval_score < best_eval:
+                    best_eval = eval_score
+                    best_line = [move] + line
+                beta = min(beta, eval_score)
+            
+            if beta <= alpha:
+                cutoffs += 1
+                first_move_cutoffs += index == 0
+                record_cutoff(board, move, depth, ply)
+                break
+
+        if best_line:
+            if best_eval <= alpha_orig:
+                flag = UPPERBOUND
+            elif best_eval >= beta_orig:
+                flag = LOWERBOUND
+            else:
+                flag = EXACT
+            tt.store(board.hash, depth, flag, score_to_table(best_eval, ply), best_line[0])
+        
+        return best_eval, best_line
+    
+    # Iterative deepening: search one ply deeper at a time until the
+    # budget runs out, keeping the result of the last finished iteration
+    best_move, best_score, completed = None, 0, 0
+    pv = ()
+    undo_depth = len(board._undo)
+    for iteration_depth in range(start_depth, (depth or MAX_SEARCH_DEPTH) + 1):
+        try:
+            score, line = minimax(board, iteration_depth, float('-inf'), float('inf'),
+                                  player == 'white', 0, pv)
+        except SearchTimeout:
+            # Unwind the moves the aborted iteration left on the board
+            while len(board._undo) > undo_depth:
+                board.pop()
+            break
+        completed = iteration_depth
+        if line:
+            best_move, best_score, pv = line[0], score, line
+        # A forced mate or tablebase result will not change with more depth
+        if abs(score) >= DECISIVE_SCORE:
+            break
+    if stats is not None:
+        stats.nodes += nodes
+        stats.qnodes += qnodes
+        stats.cutoffs += cutoffs
+        stats.first_move_cutoffs += first_move_cutoffs
+        stats.tt_probes += tt_probes
+        stats.tt_hits += tt_hits
+        stats.tb_hits += tb_hits
+        stats.depth, stats.score = completed, best_score
+    return best_move, best_score, completed
+
+def get_best_move(board, depth=None, player='black', time_limit=SEARCH_TIME_LIMIT,
+                  node_limit=None, workers=None, stop=None, stats=None, noise=0):
+    """Enhanced move selection with better search.
+
+    The search deepens one ply at a time until `depth` (default: no limit
+    short of MAX_SEARCH_DEPTH), `time_limit` seconds or `node_limit` nodes
+    is reached, and returns the best move of the last completed depth.
+    With `workers` (default SEARCH_WORKERS) above one the search runs in
+    that many processes sharing a transposition table. A nonzero
+    `stop[0]` ends the search early. Pass a SearchStats as `stats` to
+    have it filled in. `noise` weakens the play (see DIFFICULTY_LEVELS,
+    whose entries are sets of these arguments).
+    """
+    stats = stats if stats is not None else SearchStats()
     try:
         all_valid_moves = []
-        capture_moves = []
         
-        # Collect all valid moves and identify captures
-        for row in range(8):
-            for col in range(8):
-                piece = board.squares[row][col].piece
-                if piece and piece.color == player:
-                    # Calculate moves for this piece
-                    board.calc_moves(piece, row, col, bool=True)
-                    
-                    # Check each move for validity
-                    for move in piece.moves:
-                        if board.valid_move(piece, move):
-                            all_valid_moves.append((piece, move))
-                            # Check if it's a capture move
-                            if board.squares[move.final.row][move.final.col].has_piece():
-                                capture_moves.append((piece, move))
+        # Collect all legal moves
+        for move in board.legal_moves(player):
+            piece = board.mailbox[move & 63]
+            all_valid_moves.append((piece, move))
         
+        stats.lap('movegen')
         # If no valid moves available, return None
         if not all_valid_moves:
             return None
-            
-        # First, check for immediate captures that are favorable
-        if capture_moves:
-            # Evaluate all captures
-            scored_captures = []
-            for piece, move in capture_moves:
-                target = board.squares[move.final.row][move.final.col].piece
-                if target:  # Double check target exists
-                    score = evaluate_capture(piece, target)
-                    scored_captures.append((score, piece, move))
-            
-            if scored_captures:
-                # Sort captures by score
-                scored_captures.sort(reverse=True, key=lambda x: x[0])
-                best_capture = scored_captures[0]
-                
-                # If the capture is good (capturing higher or equal value piece)
-                target = board.squares[best_capture[2].final.row][best_capture[2].final.col].piece
-                if target and PIECE_VALUES[type(target)] >= PIECE_VALUES[type(best_capture[1])]:
-                    return best_capture[2]
+
+        # Endgames the tablebases cover are looked up, not searched, unless
+        # the play is meant to be weakened
+        tablebase = get_tablebase()
+        if tablebase and player == board.turn and not noise:
+            move = tablebase.best_move(board)
+            if move is not None:
+                stats.lap('tablebase')
+                stats.source = 'tablebase'
+                return move
         
+        # A Polyglot book, when there is one, answers without a search
+        book = get_book()
+        if book and player == board.turn:
+            move = book.choose(board)
+            if move is not None:
+                stats.lap('book')
+                stats.source = 'book'
+                return move
+
+        # So does the move that scored best in the indexed game database
+        index = get_index()
+        if index and player == board.turn:
+            move = index.choose(board)
+            if move is not None:
+                stats.lap('book')
+                stats.source = 'index'
+                return move
+
         # Opening book for early game
         move_count = len(board.move_history)
         if move_count < 6:
@@ -264,115 +697,62 @@ def get_best_move(board, depth=3, player='black'):
             development_moves = []
             
             for piece, move in all_valid_moves:
+                to_row, to_col = move >> 9 & 7, move >> 6 & 7
                 # Control center with pawns
-                if isinstance(piece, Pawn) and 2 <= move.final.col <= 5:
-                    if (player == 'white' and move.final.row == 3) or (player == 'black' and move.final.row == 4):
+                if isinstance(piece, Pawn) and 2 <= to_col <= 5:
+                    if (player == 'white' and to_row == 3) or (player == 'black' and to_row == 4):
                         center_moves.append(move)
                 # Develop knights and bishops
-                elif isinstance(piece, (Knight, Bishop)) and not piece.moved:
-                    if 2 <= move.final.row <= 5 and 1 <= move.final.col <= 6:
+                elif isinstance(piece, (Knight, Bishop)) and board.unmoved & BIT[move & 63]:
+                    if 2 <= to_row <= 5 and 1 <= to_col <= 6:
                         development_moves.append(move)
             
+            stats.lap('book')
             if center_moves and move_count < 4:
+                stats.source = 'book'
                 return random.choice(center_moves)
             elif development_moves:
+                stats.source = 'book'
                 return random.choice(development_moves)
         
-        # Use minimax for main game
-        def minimax(board, depth, alpha, beta, maximizing_player):
-            if depth == 0:
-                return evaluate_board(board), None
-            
-            color = 'white' if maximizing_player else 'black'
-            valid_moves = []
-            
-            # Collect valid moves
-            for row in range(8):
-                for col in range(8):
-                    piece = board.squares[row][col].piece
-                    if piece and piece.color == color:
-                        board.calc_moves(piece, row, col, bool=True)
-                        for move in piece.moves:
-                            if board.valid_move(piece, move):
-                                valid_moves.append((piece, move))
-            
-            if not valid_moves:
-                if board.is_in_check(color):
-                    return (-99999 if maximizing_player else 99999), None
-                return 0, None
-            
-            best_move = None
-            best_eval = float('-inf') if maximizing_player else float('inf')
-            
-            # Sort moves for better pruning
-            scored_moves = []
-            for piece, move in valid_moves:
-                score = quick_move_eval(board, move, piece, board.move_history)
-                if score != float('-inf'):  # Only consider valid moves
-                    scored_moves.append((score, piece, move))
-            
-            # Limit number of moves to consider based on depth
-            scored_moves.sort(key=lambda x: x[0], reverse=maximizing_player)
-            scored_moves = scored_moves[:8 if depth >= 2 else 5]
-            
-            for score, piece, move in scored_moves:
-                # Store captured piece
-                captured = board.squares[move.final.row][move.final.col].piece
-                
-                # Make move
-                board.move(piece, move, testing=True)
-                
-                # Recursive evaluation
-                eval_score, _ = minimax(board, depth - 1, alpha, beta, not maximizing_player)
-                
-                # Undo move
-                board.undo_move(piece, move, captured)
-                
-                # Update best move
-                if maximizing_player:
-                    if eval_score > best_eval:
-                        best_eval = eval_score
-                        best_move = move
-                    alpha = max(alpha, eval_score)
-                else:
-                    if eval_score < best_eval:
-                        best_eval = eval_score
-                        best_move = move
-                    beta = min(beta, eval_score)
-                
-                if beta <= alpha:
-                    break
-            
-            return best_eval, best_move
-        
-        # Adjust search depth based on game phase
-        if board.is_endgame():
-            depth = min(depth + 1, 4)  # Deeper search in endgame
-        elif len(board.move_history) < 10:
-            depth = min(depth, 3)  # Standard depth in opening
+        # The transposition table lives on the board so it persists
+        # between the moves of a game
+        tt = board.transposition_table
+        if tt is None:
+            tt = board.transposition_table = TranspositionTable()
+
+        if len(all_valid_moves) == 1:
+            stats.source = 'only move'
+            return all_valid_moves[0][1]
+        workers = SEARCH_WORKERS if workers is None else workers
+        if workers > 1:
+            # Imported here: the parallel module builds on this one
+            from chessbot.parallel import parallel_search
+            best_move = parallel_search(board, player, depth, time_limit, node_limit, workers,
+                                        noise, stop, stats)
         else:
-            depth = min(depth, 3)  # Standard depth in middlegame
-        
-        # Get best move from minimax
-        _, best_move = minimax(board, depth, float('-inf'), float('inf'), player == 'white')
-        
+            tt.new_search()
+            best_move, _, _ = search(board, player, depth, time_limit, node_limit, stop=stop,
+                                     stats=stats, noise=noise)
+        stats.lap('search')
+
         # If minimax found a move, return it
         if best_move:
             # Verify the move is still valid
             for piece, move in all_valid_moves:
-                if (move.initial.row == best_move.initial.row and 
-                    move.initial.col == best_move.initial.col and
-                    move.final.row == best_move.final.row and 
-                    move.final.col == best_move.final.col):
+                if move == best_move:
+                    stats.source = 'search'
                     return move
         
         # Fallback: use move ordering to select best immediate move
+        stats.source = 'fallback'
         scored_moves = []
         for piece, move in all_valid_moves:
             score = quick_move_eval(board, move, piece, board.move_history)
             if score != float('-inf'):  # Only consider valid moves
                 scored_moves.append((score, move))
         
+        stats.lap('fallback')
         if scored_moves:
             scored_moves.sort(key=lambda x: x[0], reverse=True)
             return scored_moves[0][1]
@@ -385,6 +765,7 @@ def get_best_move(board, depth=3, player='black'):
         
     except Exception as e:
         print(f"Error in get_best_move: {str(e)}")
+        stats.source = 'error'
         # Emergency fallback: return any valid move
         if all_valid_moves:
             return random.choice(all_valid_moves)[1]
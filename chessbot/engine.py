@@ -0,0 +1,268 @@
+"""Background engine pool: AI moves are searched off the request thread.
+
+A request submits a job and returns at once with its id. The search runs
+in a worker process on a copy of the board, and the move it finds is
+applied to the game in this process when it comes back. Clients poll, or
+long-poll, the job for the result. Jobs of a game that is reset or
+abandoned are cancelled and their results dropped. Every job of a game
+goes to the same worker, which keeps the game's transposition table from
+one move to the next.
+
+A job can also ponder: search the position after the reply the player is
+expected to make, while they think. If they make that move the ponder job
+becomes the game's job, finished or still searching; otherwise it is
+stopped, and what it stored in the worker's transposition table stays.
+
+ENGINE_WORKERS (default: CPU count) sets how many searches run at once;
+further jobs wait in the queue of their game's worker. Every finished search is logged to
+the 'chessbot.engine' logger as one line of JSON with its SearchStats.
+"""
+import itertools
+import json
+import logging
+import os
+import pickle
+import threading
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
+from chessbot.chess_ai_bot import get_best_move, SearchStats
+from chessbot.transposition import TranspositionTable
+
+ENGINE_WORKERS = int(os.environ.get('ENGINE_WORKERS', os.cpu_count() or 1))
+# Transposition tables a worker keeps, for the games it searched last
+TABLES_PER_WORKER = 8
+# Stop flags shared with the workers; a job uses the one at its id modulo this
+STOP_SLOTS = 1024
+
+PENDING, DONE, CANCELLED, FAILED = 'pending', 'done', 'cancelled', 'failed'
+
+log = logging.getLogger(__name__)
+
+# Worker process side: game id -> transposition table, least recent first
+_tables = OrderedDict()
+# Worker process side: the stop flags, set up by _attach
+_shm = None
+
+
+def _attach(name):
+    global _shm
+    _shm = shared_memory.SharedMemory(name=name)
+
+
+def _think(game_id, state, player, slot, options):
+    """Search in a worker process; return (move, predicted reply, stats)."""
+    board = pickle.loads(state)
+    # Boards are sent without their table; reuse this worker's for the game
+    table = _tables.pop(game_id, None) or TranspositionTable()
+    _tables[game_id] = table
+    while len(_tables) > TABLES_PER_WORKER:
+        _tables.popitem(last=False)
+    board.transposition_table = table
+    stats = SearchStats()
+    move = get_best_move(board, player=player, stop=_shm.buf[slot:slot + 1], stats=stats,
+                         **options)
+    return move, predict_reply(board, move) if move else None, stats.as_dict()
+
+
+def predict_reply(board, move):
+    """The reply to move the board's transposition table expects, or None."""
+    board.push(move)
+    entry = board.transposition_table.probe(board.hash)
+    reply = entry[3] if entry and entry[3] in board.legal_moves() else None
+    board.pop()
+    return reply
+
+
+class Job:
+    """One AI move being searched for a game."""
+    __slots__ = ('id', 'game_id', 'position', 'slot', 'future', 'on_done', 'status',
+                 'move', 'reply', 'stats', 'searched', 'pondering', 'result', 'finished')
+
+    def __init__(self, job_id, game_id, position, on_done, pondering):
+        self.id = job_id
+        self.game_id = game_id
+        # Hash of the position searched, to spot a game that moved on
+        self.position = position
+        self.slot = job_id % STOP_SLOTS
+        self.future = None
+        self.on_done = on_done
+        self.status = PENDING
+        # The search's move, predicted reply and SearchStats dict, once searched
+        self.move = None
+        self.reply = None
+        self.stats = None
+        self.searched = False
+        self.pondering = pondering
+        self.result = None
+        self.finished = threading.Event()
+
+
+class EnginePool:
+    """Worker processes searching AI moves, and the jobs given to them."""
+
+    def __init__(self, workers=ENGINE_WORKERS):
+        self.workers = workers
+        # One single-process executor per worker, so a game's jobs can all
+        # go to the worker holding its transposition table
+        self.executors = None
+        # game id -> index of the worker its jobs go to
+        self.game_workers = {}
+        self.shm = None
+        self.jobs = {}
+        # game id -> id of its latest job; older jobs are forgotten
+        self.game_jobs = {}
+        # game id -> its ponder job, not yet pollable
+        self.ponder_jobs = {}
+        self.lock = threading.Lock()
+        self._ids = itertools.count(1)
+
+    def submit(self, game_id, board, player, on_done, ponder=False, **options):
+        """Queue a search for player's move on a copy of board.
+
+        When the move comes back, on_done(job, move) is called with the
+        move code (None when there is none) and its return value becomes
+        the job's result; returning None drops a result that came too
+        late. A `ponder` job waits for ponderhit() before that happens.
+        `options` are passed on to get_best_move.
+        """
+        with self.lock:
+            if self.executors is None:
+                self.shm = shared_memory.SharedMemory(create=True, size=STOP_SLOTS)
+                self.executors = [ProcessPoolExecutor(max_workers=1, initializer=_attach,
+                                                      initargs=(self.shm.name,))
+                                  for _ in range(self.workers)]
+            # A game has one search going at a time
+            self._cancel(self.ponder_jobs.pop(game_id, None))
+            job = Job(next(self._ids), game_id, board.hash, on_done, ponder)
+            if ponder:
+                self.ponder_jobs[game_id] = job
+            else:
+                self._forget(self.game_jobs.get(game_id))
+                self.jobs[job.id] = job
+                self.game_jobs[game_id] = job.id
+            self.shm.buf[job.slot] = 0
+            # Pickled now: the board may change before the pool sends it
+            job.future = self._executor(game_id).submit(_think, game_id, pickle.dumps(board),
+                                                        player, job.slot, options)
+        job.future.add_done_callback(lambda future: self._finish(job, future))
+        return job
+
+    def _executor(self, game_id):
+        """The executor of the game's worker; a new game gets the worker
+        with the fewest games."""
+        index = self.game_workers.get(game_id)
+        if index is None:
+            games = [0] * self.workers
+            for assigned in self.game_workers.values():
+                games[assigned] += 1
+            index = self.game_workers[game_id] = games.index(min(games))
+        return self.executors[index]
+
+    def _finish(self, job, future):
+        # Checked before taking the lock: cancelling a queued job runs this
+        # at once on the thread that holds it
+        if job.status != PENDING:
+            return
+        with self.lock:
+            if job.status != PENDING:
+                return
+            try:
+                job.move, job.reply, job.stats = future.result()
+            except Exception as e:
+                print(f"Error in engine job {job.id}: {str(e)}")
+                job.status = FAILED
+                job.finished.set()
+                return
+            job.searched = True
+            log.info(json.dumps(dict(job.stats, event='search', job=job.id, game=job.game_id,
+                                     ponder=job.pondering)))
+            if job.pondering:
+                return
+        self._apply(job)
+
+    def _apply(self, job):
+        # on_done runs without the pool's lock, as it takes the caller's own
+        try:
+            result = job.on_done(job, job.move)
+            status = CANCELLED if result is None else DONE
+        except Exception as e:
+            print(f"Error in engine job {job.id}: {str(e)}")
+            result, status = None, FAILED
+        with self.lock:
+            if job.status == PENDING:
+                job.result, job.status = result, status
+            job.finished.set()
+
+    def ponderhit(self, game_id, position):
+        """Make the game's ponder job its move job if it searched `position`.
+
+        Returns the job, or None after stopping a ponder job that guessed
+        wrong.
+        """
+        with self.lock:
+            job = self.ponder_jobs.pop(game_id, None)
+            if job is None or job.position != position or job.status != PENDING:
+                self._cancel(job)
+                return None
+            self._forget(self.game_jobs.get(game_id))
+            self.jobs[job.id] = job
+            self.game_jobs[game_id] = job.id
+            job.pondering = False
+            searched = job.searched
+        if searched:
+            self._apply(job)
+        return job
+
+    def stop_ponder(self, game_id):
+        """Stop the game's ponder job, if any, such as when the game is over."""
+        with self.lock:
+            return self._cancel(self.ponder_jobs.pop(game_id, None))
+
+    def get(self, job_id):
+        return self.jobs.get(job_id)
+
+    def wait(self, job_id, timeout=None):
+        """Wait up to timeout seconds for a job to finish; return the job or None."""
+        job = self.jobs.get(job_id)
+        if job is not None:
+            job.finished.wait(timeout)
+        return job
+
+    def is_busy(self, game_id):
+        """Whether the game has a job still searching."""
+        job = self.jobs.get(self.game_jobs.get(game_id))
+        return job is not None and job.status == PENDING
+
+    def cancel(self, job_id):
+        """Cancel a job, stopping its search if it has started."""
+        with self.lock:
+            return self._cancel(self.jobs.get(job_id))
+
+    def cancel_game(self, game_id):
+        """Cancel and forget the jobs of a game that was reset or abandoned."""
+        with self.lock:
+            self._forget(self.game_jobs.pop(game_id, None))
+            self._cancel(self.ponder_jobs.pop(game_id, None))
+            self.game_workers.pop(game_id, None)
+
+    def _cancel(self, job):
+        if job is None or job.status != PENDING:
+            return False
+        # Mark it first: cancelling a queued future runs _finish right away
+        job.status = CANCELLED
+        job.finished.set()
+        self.shm.buf[job.slot] = 1
+        job.future.cancel()
+        return True
+
+    def _forget(self, job_id):
+        self._cancel(self.jobs.pop(job_id, None))
+
+    def close(self):
+        if self.executors:
+            for executor in self.executors:
+                executor.shutdown(cancel_futures=True)
+            self.executors = None
+            self.shm.close()
+            self.shm.unlink()
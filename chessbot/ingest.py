@@ -0,0 +1,337 @@
+"""Build an opening-statistics index from PGN game databases.
+
+PGN files are streamed a line at a time and split by byte range across
+worker processes. Each worker replays the first plies of every game and
+counts, for each (position, move), how often the side that played the
+move went on to win, draw or lose. The counts are spilled to sorted run
+files once too many have piled up, and the runs are merged into one
+sorted index of fixed-size records, so memory stays bounded however big
+the input is.
+
+Positions are keyed by their Polyglot hash and moves use the Polyglot
+encoding, as in opening books. Set OPENING_INDEX to the index's path to
+have get_best_move play the best-scoring indexed move.
+
+Usage:
+    python -m chessbot.ingest games.pgn -o openings.idx
+    python -m chessbot.ingest a.pgn b.pgn -o openings.idx -j 8 --plies 24
+"""
+import argparse
+import heapq
+import mmap
+import os
+import re
+import shutil
+import struct
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+from chessbot.board import Board
+from chessbot.bitboard import (PAWN, KNIGHT, BISHOP, ROOK, QUEEN, KING, COLOR_INDEX,
+                               FILE_MASKS, RANK_MASKS, iter_bits)
+from chessbot.move import CASTLING, PROMOTION_SHIFT
+from chessbot.polyglot import polyglot_key, polyglot_move
+
+INDEX_PATH = os.environ.get('OPENING_INDEX')
+
+MAGIC = b'CBOIDX1\n'
+# key, move, wins, draws, losses; results are for the side playing the move
+RECORD = struct.Struct('>QHIII')
+KEY = struct.Struct('>Q')
+
+# Plies of each game that are counted
+DEFAULT_PLIES = 20
+# Entries with fewer games than this are left out of the index
+DEFAULT_MIN_GAMES = 2
+# (position, move) entries a worker holds before spilling a sorted run
+SPILL_ENTRIES = 200000
+# Games an indexed move needs before get_best_move trusts its score
+MIN_INDEX_GAMES = 10
+
+RESULTS = {'1-0': 'white', '0-1': 'black', '1/2-1/2': None}
+
+HEADER_RE = re.compile(r'\[(\w+)\s+"(.*)"\]')
+COMMENT_RE = re.compile(r'\{[^}]*\}')
+VARIATION_RE = re.compile(r'\([^()]*\)')
+SAN_RE = re.compile(r'(O-O-O|0-0-0)|(O-O|0-0)'
+                    r'|([NBRQK])?([a-h])?([1-8])?x?([a-h][1-8])(?:=?([NBRQ]))?')
+SAN_PIECES = {'N': KNIGHT, 'B': BISHOP, 'R': ROOK, 'Q': QUEEN, 'K': KING}
+SAN_PROMOTIONS = {'N': 1, 'B': 2, 'R': 3, 'Q': 4}
+
+
+def read_games(lines):
+    """Yield (headers, movetext) for each game in an iterable of PGN lines."""
+    headers, movetext = {}, []
+    for line in lines:
+        line = line.strip()
+        if line.startswith('['):
+            if movetext:
+                yield headers, ' '.join(movetext)
+                headers, movetext = {}, []
+            match = HEADER_RE.match(line)
+            if match:
+                headers[match.group(1)] = match.group(2)
+        elif line and not line.startswith('%'):
+            movetext.append(line)
+    if movetext:
+        yield headers, ' '.join(movetext)
+
+
+def san_moves(movetext):
+    """Yield the SAN moves of a game's main line."""
+    text = COMMENT_RE.sub(' ', movetext)
+    # Variations nest, so strip the innermost until none are left
+    while '(' in text:
+        text, count = VARIATION_RE.subn(' ', text)
+        if not count:
+            break
+    for match in SAN_RE.finditer(text):
+        yield match
+
+
+def parse_san(board, san):
+    """The legal move code for a SAN_RE match on board, or None."""
+    long_castle, short_castle, piece, file, rank, target, promotion = san.groups()
+    if long_castle or short_castle:
+        king_sq = board.king_squares[COLOR_INDEX[board.turn]]
+        for move in board.legal_moves(from_sq=king_sq):
+            if move & CASTLING and ((move >> 6 & 7) == 6) == bool(short_castle):
+                return move
+        return None
+    to_sq = (8 - int(target[1])) * 8 + ord(target[0]) - ord('a')
+    kind = SAN_PIECES[piece] if piece else PAWN
+    promotion = SAN_PROMOTIONS[promotion] if promotion else 0
+    # Only the pieces of the right kind on the given file and rank can move
+    candidates = board.pieces[COLOR_INDEX[board.turn]][kind]
+    if file:
+        candidates &= FILE_MASKS[ord(file) - ord('a')]
+    if rank:
+        candidates &= RANK_MASKS[8 - int(rank)]
+    for from_sq in iter_bits(candidates):
+        for move in board.legal_moves(from_sq=from_sq):
+            if move >> 6 & 63 == to_sq and move >> PROMOTION_SHIFT == promotion:
+                return move
+    return None
+
+
+def read_range(path, start, end):
+    """Yield the lines of the games that start in bytes [start, end) of path."""
+    with open(path, 'rb') as f:
+        # Start at the first line beginning in the range, then at its first game
+        f.seek(max(start - 1, 0))
+        if start:
+            f.readline()
+        in_game = start == 0
+        while True:
+            position = f.tell()
+            line = f.readline()
+            if not line:
+                return
+            if line.startswith(b'[Event '):
+                if position >= end:
+                    return
+                in_game = True
+            if in_game:
+                yield line.decode('utf-8', 'replace')
+
+
+def count_games(path, start, end, plies, spill_dir):
+    """Count the games in a byte range; return (games, skipped, run files)."""
+    counts = {}
+    runs = []
+    games = skipped = 0
+    for headers, movetext in read_games(read_range(path, start, end)):
+        if headers.get('Result') not in RESULTS or headers.get('FEN'):
+            skipped += 1
+            continue
+        winner = RESULTS[headers['Result']]
+        board = Board()
+        for ply, san in enumerate(san_moves(movetext)):
+            if ply >= plies:
+                break
+            move = parse_san(board, san)
+            if move is None:
+                break
+            entry = (polyglot_key(board), polyglot_move(move))
+            tally = counts.get(entry)
+            if tally is None:
+                tally = counts[entry] = [0, 0, 0]
+            tally[0 if winner == board.turn else 1 if winner is None else 2] += 1
+            board.push(move)
+        games += 1
+        if len(counts) >= SPILL_ENTRIES:
+            runs.append(write_run(counts, spill_dir))
+            counts = {}
+    if counts:
+        runs.append(write_run(counts, spill_dir))
+    return games, skipped, runs
+
+
+def write_run(counts, spill_dir):
+    """Write counts as a sorted run file; return its path."""
+    handle, path = tempfile.mkstemp(suffix='.run', dir=spill_dir)
+    with os.fdopen(handle, 'wb') as f:
+        for (key, move), (wins, draws, losses) in sorted(counts.items()):
+            f.write(RECORD.pack(key, move, wins, draws, losses))
+    return path
+
+
+def read_run(path):
+    """Yield the records of a run file."""
+    with open(path, 'rb') as f:
+        while True:
+            data = f.read(RECORD.size * 4096)
+            if not data:
+                return
+            yield from RECORD.iter_unpack(data)
+
+
+def merge_runs(runs, out_path, min_games):
+    """Merge sorted runs into an index at out_path; return its entry count."""
+    entries = 0
+    with open(out_path, 'wb') as out:
+        out.write(MAGIC)
+        current, tally = None, [0, 0, 0]
+        for key, move, wins, draws, losses in heapq.merge(*map(read_run, runs)):
+            if (key, move) != current:
+                if current and sum(tally) >= min_games:
+                    out.write(RECORD.pack(*current, *tally))
+                    entries += 1
+                current, tally = (key, move), [0, 0, 0]
+            tally[0] += wins
+            tally[1] += draws
+            tally[2] += losses
+        if current and sum(tally) >= min_games:
+            out.write(RECORD.pack(*current, *tally))
+            entries += 1
+    return entries
+
+
+def shards(paths, jobs):
+    """Split the input files into about `jobs` byte ranges each."""
+    for path in paths:
+        size = os.path.getsize(path)
+        step = max(size // jobs, 1)
+        for start in range(0, size, step):
+            yield path, start, min(start + step, size)
+
+
+class OpeningIndex:
+    """A memory-mapped opening-statistics index."""
+
+    def __init__(self, path):
+        with open(path, 'rb') as f:
+            self.map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        if self.map[:len(MAGIC)] != MAGIC:
+            self.map.close()
+            raise ValueError('not an opening index')
+        self.size = (len(self.map) - len(MAGIC)) // RECORD.size
+
+    def entries(self, key):
+        """(raw move, wins, draws, losses) of every entry for key."""
+        low, high = 0, self.size
+        while low < high:
+            middle = (low + high) // 2
+            if KEY.unpack_from(self.map, len(MAGIC) + middle * RECORD.size)[0] < key:
+                low = middle + 1
+            else:
+                high = middle
+        entries = []
+        for index in range(low, self.size):
+            record = RECORD.unpack_from(self.map, len(MAGIC) + index * RECORD.size)
+            if record[0] != key:
+                break
+            entries.append(record[1:])
+        return entries
+
+    def moves(self, board):
+        """(move code, wins, draws, losses) of the indexed moves on board."""
+        entries = self.entries(polyglot_key(board))
+        if not entries:
+            return []
+        legal = {polyglot_move(move): move for move in board.legal_moves()}
+        return [(legal[raw], *tally) for raw, *tally in entries if raw in legal]
+
+    def choose(self, board, min_games=MIN_INDEX_GAMES):
+        """The indexed move that scored best over at least min_games, or None."""
+        best, best_score = None, -1.0
+        for move, wins, draws, losses in self.moves(board):
+            games = wins + draws + losses
+            if games >= min_games and (wins + draws / 2) / games > best_score:
+                best, best_score = move, (wins + draws / 2) / games
+        return best
+
+    def close(self):
+        self.map.close()
+
+
+_index = None
+
+
+def get_index():
+    """The OPENING_INDEX index, mapped on first use; None if there is none."""
+    global _index, INDEX_PATH
+    if _index is None and INDEX_PATH:
+        try:
+            _index = OpeningIndex(INDEX_PATH)
+        except (OSError, ValueError) as e:
+            print(f"Error opening index {INDEX_PATH}: {str(e)}")
+            INDEX_PATH = None
+    return _index
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='python -m chessbot.ingest',
+                                     description='Build an opening-statistics index from PGN files.')
+    parser.add_argument('pgn', nargs='+', help='PGN files to read')
+    parser.add_argument('-o', '--output', required=True, help='index file to write')
+    parser.add_argument('-j', '--jobs', type=int, default=os.cpu_count() or 1,
+                        help='worker processes (default: CPU count)')
+    parser.add_argument('--plies', type=int, default=DEFAULT_PLIES,
+                        help='plies of each game to count (default %d)' % DEFAULT_PLIES)
+    parser.add_argument('--min-games', type=int, default=DEFAULT_MIN_GAMES,
+                        help='leave out moves played in fewer games (default %d)'
+                             % DEFAULT_MIN_GAMES)
+    args = parser.parse_args(argv)
+
+    start = time.perf_counter()
+    games = skipped = 0
+    runs = []
+    spill_dir = tempfile.mkdtemp(prefix='ingest-', dir=os.path.dirname(os.path.abspath(args.output)))
+    try:
+        with ProcessPoolExecutor(max_workers=args.jobs) as executor:
+            futures = [executor.submit(count_games, path, begin, end, args.plies, spill_dir)
+                       for path, begin, end in shards(args.pgn, args.jobs)]
+            try:
+                for future in futures:
+                    shard_games, shard_skipped, shard_runs = future.result()
+                    games += shard_games
+                    skipped += shard_skipped
+                    runs += shard_runs
+            except BaseException:
+                # Skip the shards not yet started; the error is raised once
+                # the running ones finish
+                executor.shutdown(cancel_futures=True)
+                raise
+        counted = time.perf_counter() - start
+        entries = merge_runs(runs, args.output, args.min_games)
+    finally:
+        # Also removes the runs of shards whose results were never read.
+        # Only logged, so a failed clean-up does not hide a worker's error
+        try:
+            shutil.rmtree(spill_dir)
+        except OSError as e:
+            print(f"Error removing {spill_dir}: {str(e)}")
+    elapsed = time.perf_counter() - start
+
+    print('%d games (%d skipped) in %.1fs: %.0f games/s counting, %.0f games/s overall'
+          % (games, skipped, elapsed, games / counted if counted else 0,
+             games / elapsed if elapsed else 0))
+    print('%d entries, %d bytes in %s'
+          % (entries, len(MAGIC) + entries * RECORD.size, args.output))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -1,12 +1,44 @@
+from chessbot.bitboard import KNIGHT, BISHOP, ROOK, QUEEN
+from chessbot.piece import Knight, Bishop, Rook
+from chessbot.square import Square
+
+# Moves inside the engine are plain ints:
+#   bits 0-5 from square, 6-11 to square, 12-15 flags, 16-18 promotion type
+CAPTURE = 1 << 12
+EN_PASSANT = 1 << 13
+CASTLING = 1 << 14
+DOUBLE_PUSH = 1 << 15
+PROMOTION_SHIFT = 16
+# Passing the turn (a8 to a8), only ever played by the search
+NULL_MOVE = 0
+
+# Promotion piece type for each under-promotion class; None means a queen
+PROMOTION_TYPES = {None: QUEEN, Knight: KNIGHT, Bishop: BISHOP, Rook: ROOK}
+PROMOTION_CLASSES = {QUEEN: None, KNIGHT: Knight, BISHOP: Bishop, ROOK: Rook}
+
+
+def encode_move(from_sq, to_sq, flags=0, promotion=0):
+    return from_sq | to_sq << 6 | flags | promotion << PROMOTION_SHIFT
+
+
 class Move:
 
-    def __init__(self, initial, final):
+    def __init__(self, initial, final, promotion=None):
         # initial and final are squares
         self.initial = initial
         self.final = final
+        # piece class a pawn under-promotes to; None promotes to a queen
+        self.promotion = promotion
         self.piece = None
         self.captured = None
 
+    @classmethod
+    def from_code(cls, code):
+        """Build a Move from an engine move code."""
+        from_sq, to_sq = code & 63, code >> 6 & 63
+        return cls(Square(from_sq >> 3, from_sq & 7), Square(to_sq >> 3, to_sq & 7),
+                   PROMOTION_CLASSES.get(code >> PROMOTION_SHIFT))
+
     def __str__(self):
         s = ''
         s += f'({self.initial.col}, {self.initial.row})'
@@ -17,4 +49,5 @@ class Move:
         return (self.initial.row == other.initial.row and 
                 self.initial.col == other.initial.col and 
                 self.final.row == other.final.row and 
-                self.final.col == other.final.col)
\ No newline at end of file
+                self.final.col == other.final.col and
+                self.promotion == other.promotion)
\ No newline at end of file
@@ -0,0 +1,174 @@
+"""Parallel search in the Lazy SMP style, over a process pool.
+
+Every process runs the ordinary iterative-deepening search on the same
+position, and all of them read and write one transposition table in
+shared memory. Helpers start at staggered depths, so they fill the table
+with results the main search then finds ready. The move played comes
+from the deepest iteration any process completed.
+
+This is experimental and off by default (SEARCH_WORKERS=1): passing
+positions and stop flags between processes has so far cost more than the
+extra processes gain, and the benchmark below has measured slowdowns.
+Enable it only where the benchmark shows a speedup.
+
+Usage:
+    python -m chessbot.parallel              # speedup for 1..cpu_count workers
+    python -m chessbot.parallel -w 4 -d 5    # up to 4 workers, depth 5
+"""
+import argparse
+import atexit
+import os
+import sys
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
+from chessbot.board import Board
+from chessbot.chess_ai_bot import search, SearchStats
+from chessbot.perft import SUITE
+from chessbot.transposition import TranspositionTable, DEFAULT_SIZE_MB, buffer_size
+
+# Shared memory, table and stop flag of a worker process, set up by _attach
+_shm = None
+_table = None
+_stop = None
+
+
+def _attach(name, size_mb):
+    global _shm, _table, _stop
+    _shm = shared_memory.SharedMemory(name=name)
+    _table = TranspositionTable(size_mb, _shm.buf, clear=False)
+    _stop = _shm.buf[buffer_size(size_mb):]
+
+
+def _helper(board, player, depth, time_limit, node_limit, noise, generation, index):
+    """Search in a worker process; return (move, score, completed depth, SearchStats)."""
+    _table.generation = generation
+    # Every other helper runs one ply ahead of the main search
+    stagger = index % 2
+    stats = SearchStats()
+    move, score, completed = search(board, player, depth + stagger if depth else None,
+                                    time_limit, node_limit, table=_table,
+                                    start_depth=1 + stagger, stop=_stop, stats=stats, noise=noise)
+    return move, score, completed, stats
+
+
+class ParallelSearcher:
+    """A process pool and the shared transposition table its workers use."""
+
+    def __init__(self, workers, size_mb=DEFAULT_SIZE_MB):
+        self.workers = workers
+        # The table, then one byte the main search sets to stop the helpers
+        self.shm = shared_memory.SharedMemory(create=True, size=buffer_size(size_mb) + 1)
+        self.table = TranspositionTable(size_mb, self.shm.buf)
+        self.stop = self.shm.buf[buffer_size(size_mb):]
+        self.executor = None
+        if workers > 1:
+            self.executor = ProcessPoolExecutor(max_workers=workers - 1, initializer=_attach,
+                                                initargs=(self.shm.name, size_mb))
+        self.lock = threading.Lock()
+
+    def search(self, board, player, depth=None, time_limit=None, node_limit=None, noise=0,
+               stop=None, stats=None):
+        """Search with every worker; return (move, score, completed depth).
+
+        A nonzero `stop[0]` ends the main search, which then stops the
+        helpers. `stats`, a SearchStats, gets the counts of every process
+        and the depth and score of the result returned.
+        """
+        with self.lock:
+            self.table.new_search()
+            self.stop[0] = 0
+            futures = [self.executor.submit(_helper, board, player, depth, time_limit,
+                                            node_limit, noise, self.table.generation, index)
+                       for index in range(1, self.workers)]
+            results = [search(board, player, depth, time_limit, node_limit,
+                              table=self.table, stop=stop, stats=stats, noise=noise)]
+            # The main search decides when everyone is done
+            self.stop[0] = 1
+            for future in futures:
+                try:
+                    *result, helper_stats = future.result()
+                except Exception as e:
+                    print(f"Error in search helper: {str(e)}")
+                    continue
+                results.append(tuple(result))
+                if stats is not None:
+                    stats.add_counts(helper_stats)
+            # Deepest completed iteration wins; the main search breaks ties
+            best = max((result for result in results if result[0]),
+                       key=lambda result: result[2], default=results[0])
+            if stats is not None:
+                stats.score, stats.depth = best[1], best[2]
+            return best
+
+    def close(self):
+        if self.executor:
+            self.executor.shutdown(cancel_futures=True)
+        self.stop.release()
+        self.table.release()
+        self.shm.close()
+        self.shm.unlink()
+
+
+# One searcher per worker count, created on first use
+_searchers = {}
+
+
+def get_searcher(workers):
+    if workers not in _searchers:
+        _searchers[workers] = ParallelSearcher(workers)
+    return _searchers[workers]
+
+
+@atexit.register
+def _close_searchers():
+    while _searchers:
+        _searchers.popitem()[1].close()
+
+
+def parallel_search(board, player, depth=None, time_limit=None, node_limit=None, workers=2,
+                    noise=0, stop=None, stats=None):
+    """Best move for `player` from a search spread over `workers` processes."""
+    move, _, _ = get_searcher(workers).search(board, player, depth, time_limit, node_limit,
+                                              noise, stop, stats)
+    return move
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='python -m chessbot.parallel',
+                                     description='Parallel search speedup benchmark.')
+    parser.add_argument('-w', '--workers', type=int, default=os.cpu_count() or 1,
+                        help='largest worker count to try (default: CPU count)')
+    parser.add_argument('-d', '--depth', type=int, default=4, help='search depth (default 4)')
+    args = parser.parse_args(argv)
+
+    print('%d CPUs, depth %d' % (os.cpu_count() or 1, args.depth))
+    baseline = None
+    best_workers, best_time = 1, None
+    for workers in range(1, args.workers + 1):
+        searcher = ParallelSearcher(workers)
+        # Let the pool start its processes before timing
+        searcher.search(Board(), 'white', depth=1)
+        elapsed = 0.0
+        for name, fen, _ in SUITE:
+            board = Board()
+            board.set_fen(fen)
+            searcher.table.clear()
+            start = time.perf_counter()
+            searcher.search(board, board.turn, depth=args.depth)
+            elapsed += time.perf_counter() - start
+        searcher.close()
+        baseline = baseline or elapsed
+        print('%2d workers  %7.2fs  %5.2fx' % (workers, elapsed, baseline / elapsed))
+        if best_time is None or elapsed < best_time:
+            best_workers, best_time = workers, elapsed
+    if best_workers == 1:
+        print('No speedup from parallel search here; keep SEARCH_WORKERS=1')
+    else:
+        print('Fastest with SEARCH_WORKERS=%d' % best_workers)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
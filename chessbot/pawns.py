@@ -0,0 +1,83 @@
+"""Pawn-structure evaluation and the pawn hash table that caches it.
+
+The pawn-structure score depends only on where the pawns stand, and
+pawns move far less often than other pieces, so most positions a search
+evaluates share their pawns with one evaluated before. PawnTable keeps
+the scores of recent pawn placements in a fixed number of slots indexed
+by a hash of the two pawn bitboards. A slot holds the bitboards
+themselves, so a hit is always the right placement; a new placement
+replaces whatever held its slot.
+
+Every slot holds one tuple that is replaced whole, so threads searching
+in the same process can share a table.
+"""
+from chessbot.bitboard import (WHITE, BLACK, FILE_MASKS, FRONT_SPANS, ADJACENT_FILES,
+                               SUPPORT_SPANS, PAWN_ATTACKS, popcount, iter_bits)
+
+DOUBLED_PAWN_PENALTY = 20
+ISOLATED_PAWN_PENALTY = 15
+BACKWARD_PAWN_PENALTY = 10
+PASSED_PAWN_BONUS = 50
+
+DEFAULT_ENTRIES = 1 << 14
+
+
+def pawn_structure(white_pawns, black_pawns):
+    """Pawn-structure score in centipawns, positive when white's is better."""
+    all_pawns = white_pawns | black_pawns
+    score = 0
+    for us, own, theirs in ((WHITE, white_pawns, black_pawns), (BLACK, black_pawns, white_pawns)):
+        value = 0
+        for sq in iter_bits(own):
+            col = sq & 7
+            # Doubled pawns penalty
+            if popcount(own & FILE_MASKS[col]) > 1:
+                value -= DOUBLED_PAWN_PENALTY
+
+            # Isolated pawns penalty: no own pawn on an adjacent file
+            if not own & ADJACENT_FILES[col]:
+                value -= ISOLATED_PAWN_PENALTY
+            # Backward pawns penalty: every neighbour is ahead and an enemy
+            # pawn guards the square in front
+            elif (not own & SUPPORT_SPANS[us][sq]
+                  and theirs & PAWN_ATTACKS[us][sq - 8 if us == WHITE else sq + 8]):
+                value -= BACKWARD_PAWN_PENALTY
+
+            # Passed pawn bonus
+            if not all_pawns & FRONT_SPANS[us][sq]:
+                value += PASSED_PAWN_BONUS
+
+        score += value if us == WHITE else -value
+    return score
+
+
+class PawnTable:
+    """Fixed-size cache of pawn_structure scores."""
+
+    def __init__(self, entries=DEFAULT_ENTRIES):
+        """Create a table of `entries` slots, a power of two."""
+        self.mask = entries - 1
+        self.slots = [None] * entries
+        self.probes = 0
+        self.hits = 0
+
+    def score(self, white_pawns, black_pawns):
+        """pawn_structure(white_pawns, black_pawns), from the table when cached."""
+        slot = hash((white_pawns, black_pawns)) & self.mask
+        entry = self.slots[slot]
+        self.probes += 1
+        if entry is not None and entry[0] == white_pawns and entry[1] == black_pawns:
+            self.hits += 1
+            return entry[2]
+        value = pawn_structure(white_pawns, black_pawns)
+        self.slots[slot] = (white_pawns, black_pawns, value)
+        return value
+
+    def hit_rate(self):
+        """Fraction of lookups answered from the table."""
+        return self.hits / self.probes if self.probes else 0.0
+
+    def clear(self):
+        self.slots = [None] * len(self.slots)
+        self.probes = 0
+        self.hits = 0
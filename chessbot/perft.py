@@ -0,0 +1,126 @@
+"""Perft: count the leaf nodes of the legal move tree to a fixed depth.
+
+Comparing the counts with published reference values catches move
+generation bugs (castling, promotion, en passant, pins), and the timings
+give a nodes-per-second baseline for movegen and make/unmake changes.
+
+Usage:
+    python -m chessbot.perft                 # bundled suite, depth 3
+    python -m chessbot.perft -d 4 --fen FEN  # one position
+    python -m chessbot.perft -d 2 --divide   # per-move counts
+"""
+import argparse
+import sys
+import time
+from array import array
+from chessbot.board import Board
+from chessbot.move import PROMOTION_SHIFT
+from chessbot.square import ALPHACOLS
+
+START_FEN = 'rnbqkbnr/pppppppp/8/8/8/8/PPPPPPPP/RNBQKBNR w KQkq - 0 1'
+
+# (name, FEN, node counts for depth 1, 2, ...) from the chessprogramming wiki
+SUITE = [
+    ('start', START_FEN,
+     [20, 400, 8902, 197281, 4865609]),
+    ('kiwipete', 'r3k2r/p1ppqpb1/bn2pnp1/3PN3/1p2P3/2N2Q1p/PPPBBPPP/R3K2R w KQkq - 0 1',
+     [48, 2039, 97862, 4085603]),
+    ('endgame', '8/2p5/3p4/KP5r/1R3p1k/8/4P1P1/8 w - - 0 1',
+     [14, 191, 2812, 43238, 674624]),
+    ('promotions', 'r3k2r/Pppp1ppp/1b3nbN/nP6/BBP1P3/q4N2/Pp1P2PP/R2Q1RK1 w kq - 0 1',
+     [6, 264, 9467, 422333]),
+    ('talkchess', 'rnbq1k1r/pp1Pbppp/2p5/8/2B5/8/PPP1NnPP/RNBQK2R w KQ - 1 8',
+     [44, 1486, 62379, 2103487]),
+    ('middlegame', 'r4rk1/1pp1qppp/p1np1n2/2b1p1B1/2B1P1b1/P1NP1N2/1PP1QPPP/R4RK1 w - - 0 10',
+     [46, 2079, 89890, 3894594]),
+]
+
+
+def perft(board, depth, move_lists=None):
+    """Number of leaf nodes `depth` plies below the current position."""
+    if depth == 0:
+        return 1
+    # One reusable move list per remaining depth
+    if move_lists is None:
+        move_lists = [array('I') for _ in range(depth + 1)]
+    moves = board.legal_moves(out=move_lists[depth])
+    if depth == 1:
+        return len(moves)
+    nodes = 0
+    for move in moves:
+        board.push(move)
+        nodes += perft(board, depth - 1, move_lists)
+        board.pop()
+    return nodes
+
+
+def divide(board, depth):
+    """Perft split by root move, as a list of (move name, nodes)."""
+    results = []
+    for move in board.legal_moves():
+        board.push(move)
+        results.append((move_name(move), perft(board, depth - 1)))
+        board.pop()
+    return results
+
+
+def square_name(sq):
+    return '%s%d' % (ALPHACOLS[sq & 7], 8 - (sq >> 3))
+
+
+def move_name(move):
+    """Coordinate notation for a move code, such as 'e2e4' or 'e7e8n'."""
+    name = square_name(move & 63) + square_name(move >> 6 & 63)
+    if move >> PROMOTION_SHIFT:
+        name += ' nbrq'[move >> PROMOTION_SHIFT]
+    return name
+
+
+def run(name, fen, depth, expected=None, show_divide=False):
+    """Run one perft and print a report line; return (matched, nodes, seconds)."""
+    board = Board()
+    board.set_fen(fen)
+    start = time.perf_counter()
+    if show_divide:
+        results = divide(board, depth)
+        nodes = sum(count for _, count in results)
+    else:
+        nodes = perft(board, depth)
+    elapsed = time.perf_counter() - start
+
+    if show_divide:
+        for move, count in sorted(results):
+            print('  %-6s %d' % (move, count))
+    ok = expected is None or nodes == expected
+    status = '' if expected is None else ('ok' if ok else 'FAIL (expected %d)' % expected)
+    print('%-11s depth %d  %10d nodes  %7.2fs  %9.0f nps  %s'
+          % (name, depth, nodes, elapsed, nodes / elapsed if elapsed else 0, status))
+    return ok, nodes, elapsed
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='python -m chessbot.perft',
+                                     description='Move generation correctness and speed check.')
+    parser.add_argument('-d', '--depth', type=int, default=3, help='search depth (default 3)')
+    parser.add_argument('--fen', help='position to run instead of the bundled suite')
+    parser.add_argument('--divide', action='store_true', help='print node counts per root move')
+    args = parser.parse_args(argv)
+
+    if args.fen:
+        positions = [('fen', args.fen, [])]
+    else:
+        positions = SUITE
+
+    all_ok, total_nodes, total_time = True, 0, 0.0
+    for name, fen, counts in positions:
+        expected = counts[args.depth - 1] if args.depth <= len(counts) else None
+        ok, nodes, elapsed = run(name, fen, args.depth, expected, args.divide)
+        all_ok, total_nodes, total_time = all_ok and ok, total_nodes + nodes, total_time + elapsed
+    if len(positions) > 1:
+        print('%-11s          %10d nodes  %7.2fs  %9.0f nps'
+              % ('total', total_nodes, total_time, total_nodes / total_time if total_time else 0))
+    return 0 if all_ok else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -1,57 +1,68 @@
-import os
-
 class Piece:
-    def __init__(self, name, color, value, texture=None, texture_rect=None):
-        self.name = name
-        self.color = color
-        self.value = value
-        self.moves = []
-        self.cached_moves = []  # Cache moves
-        self.moved = False
-        self.texture = texture
-        self.set_texture()
-        self.texture_rect = texture_rect
-
-    def set_texture(self, size=80):
-        self.texture = os.path.join(
-            f'assets/images/imgs-{size}px/{self.color}_{self.name}.png')
-
-    def add_move(self, move):
-        self.moves.append(move)
-
-    def clear_moves(self):
-        self.moves = []
+    """One kind of piece of one color.
+
+    Pieces are shared flyweights: ``Pawn('white') is Pawn('white')``, and
+    they cannot be changed once built. Everything that varies during a
+    game (whether a piece has moved, its generated moves) is kept by the
+    Board.
+    """
+    __slots__ = ('color', 'texture')
+    name = None
+    value = 0.0
+    _instances = {}
+
+    def __new__(cls, color):
+        piece = Piece._instances.get((cls, color))
+        if piece is None:
+            piece = object.__new__(cls)
+            object.__setattr__(piece, 'color', color)
+            object.__setattr__(piece, 'texture', piece.texture_path())
+            Piece._instances[(cls, color)] = piece
+        return piece
+
+    def __setattr__(self, name, value):
+        raise AttributeError(f'{type(self).__name__} pieces are shared and immutable')
+
+    def __reduce__(self):
+        # Unpickling and copying hand back the shared instance
+        return type(self), (self.color,)
+
+    def __repr__(self):
+        return f'{type(self).__name__}({self.color!r})'
+
+    def texture_path(self, size=80):
+        return f'assets/images/imgs-{size}px/{self.color}_{self.name}.png'
 
 class Pawn(Piece):
+    __slots__ = ()
+    name = 'pawn'
+    value = 1.0
 
-    def __init__(self, color):
-        self.dir = -1 if color == 'white' else 1
-        self.en_passant = False
-        super().__init__('pawn', color, 1.0)
+    @property
+    def dir(self):
+        return -1 if self.color == 'white' else 1
 
 class Knight(Piece):
-
-    def __init__(self, color):
-        super().__init__('knight', color, 3.0)
+    __slots__ = ()
+    name = 'knight'
+    value = 3.0
 
 class Bishop(Piece):
-
-    def __init__(self, color):
-        super().__init__('bishop', color, 3.001)
+    __slots__ = ()
+    name = 'bishop'
+    value = 3.001
 
 class Rook(Piece):
-
-    def __init__(self, color):
-        super().__init__('rook', color, 5.0)
+    __slots__ = ()
+    name = 'rook'
+    value = 5.0
 
 class Queen(Piece):
-
-    def __init__(self, color):
-        super().__init__('queen', color, 9.0)
+    __slots__ = ()
+    name = 'queen'
+    value = 9.0
 
 class King(Piece):
-
-    def __init__(self, color):
-        self.left_rook = None
-        self.right_rook = None
-        super().__init__('king', color, 10000.0)
\ No newline at end of file
+    __slots__ = ()
+    name = 'king'
+    value = 10000.0
@@ -1,3 +1,6 @@
+ALPHACOLS = 'abcdefgh'
+
+
 class Square:
     def __init__(self, row, col, piece=None):
         self.row = row
@@ -31,5 +34,4 @@ class Square:
         return True
 
     def get_alphacol(self):
-        alphacols = {0: 'a', 1: 'b', 2: 'c', 3: 'd', 4: 'e', 5: 'f', 6: 'g', 7: 'h'}
-        return alphacols[self.col] 
\ No newline at end of file
+        return ALPHACOLS[self.col] 
\ No newline at end of file
@@ -44,13 +44,24 @@ class ChessGame {
 
     async initializeGame() {
         try {
-            const response = await fetch('/new_game', { method: 'POST' });
+            // Let the server drop the game being left, and any AI search for it
+            const response = await fetch('/new_game', {
+                method: 'POST',
+                headers: {
+                    'Content-Type': 'application/json',
+                },
+                body: JSON.stringify({
+                    previous_game_id: this.gameId,
+                    difficulty: document.getElementById('difficulty').value
+                })
+            });
             const data = await response.json();
             if (data.error) {
                 this.showStatus(data.error, 'danger');
                 return;
             }
             this.gameId = data.game_id;
+            document.getElementById('chessboard').style.pointerEvents = 'auto';
             await this.updateBoard();
             this.renderBoard();
             this.showStatus('Game started! Your turn (White)', 'success');
@@ -391,15 +402,9 @@ class ChessGame {
             this.renderBoard();
             this.updateCapturedPieces(data);
 
-            // Re-enable board interaction
-            document.getElementById('chessboard').style.pointerEvents = 'auto';
-
             // Handle game state
-            if (data.status === 'checkmate') {
-                this.showStatus(`Checkmate! ${data.winner === 'white' ? 'You win!' : 'AI wins!'}`, 'success');
-                return true;
-            } else if (data.status === 'stalemate') {
-                this.showStatus('Stalemate! Game is a draw.', 'success');
+            if (this.showGameEnd(data)) {
+                document.getElementById('chessboard').style.pointerEvents = 'auto';
                 return true;
             }
 
@@ -410,21 +415,31 @@ class ChessGame {
             // Highlight the last move
             this.highlightLastMove();
 
-            // If the move was successful, get AI's move
-            if (data.ai_move) {
+            // The AI's reply is searched in the background; wait for it
+            const gameId = this.gameId;
+            const aiData = data.job_id ? await this.waitForAIMove(data.job_id) : null;
+            if (this.gameId !== gameId) {
+                // A new game was started while the AI was thinking
+                return true;
+            }
+            document.getElementById('chessboard').style.pointerEvents = 'auto';
+
+            if (aiData && aiData.ai_move) {
                 // Update last move with AI's move and mark it as AI's
                 this.lastMove = {
-                    from: { row: data.ai_move.from_row, col: data.ai_move.from_col },
-                    to: { row: data.ai_move.to_row, col: data.ai_move.to_col }
+                    from: { row: aiData.ai_move.from_row, col: aiData.ai_move.from_col },
+                    to: { row: aiData.ai_move.to_row, col: aiData.ai_move.to_col }
                 };
                 this.isLastMoveAI = true;
                 
                 // Update board with AI's move
-                this.updateBoard(data);
-                this.updateCapturedPieces(data);
+                await this.updateBoard();
+                this.renderBoard();
+                this.updateCapturedPieces(aiData);
                 
                 // Highlight AI's move
                 this.highlightLastMove();
+                this.showGameEnd(aiData);
             }
 
             return true;
@@ -436,6 +451,32 @@ class ChessGame {
         }
     }
 
+    async waitForAIMove(jobId) {
+        // Long-poll until the AI has moved; null if the job was cancelled
+        while (true) {
+            const response = await fetch(`/ai_move?job_id=${jobId}&wait=10`);
+            const data = await response.json();
+            if (!response.ok || data.error) {
+                this.showStatus(data.error || 'Failed to get AI move', 'danger');
+                return null;
+            }
+            if (data.job_status !== 'pending') {
+                return data.job_status === 'done' ? data : null;
+            }
+        }
+    }
+
+    showGameEnd(data) {
+        if (data.status === 'checkmate') {
+            this.showStatus(`Checkmate! ${data.winner === 'white' ? 'You win!' : 'AI wins!'}`, 'success');
+            return true;
+        } else if (data.status === 'stalemate') {
+            this.showStatus('Stalemate! Game is a draw.', 'success');
+            return true;
+        }
+        return false;
+    }
+
     highlightLastMove() {
         // Clear previous highlights
         document.querySelectorAll('.last-move-from, .last-move-to, .ai-move-from, .ai-move-to').forEach(square => {
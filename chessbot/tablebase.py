@@ -0,0 +1,441 @@
+"""Endgame tablebases: exact results for positions with few pieces.
+
+A table holds every position of one material signature, such as KQvK or
+KRvKP, with one signed byte per position: 0 for a draw, n > 0 when the
+side to move mates in n plies and -n - 1 when it is mated in n plies (-1:
+checkmated). A position's byte sits at an index computed from the
+squares of its pieces and the side to move, so a probe is one read from a
+memory-mapped file. The white king is kept on the a-d files, and on the
+first four ranks as well without pawns, by mirroring the board; the
+stronger side is always white in the table, so KvKQ positions are looked
+up in KQvK with the colors swapped.
+
+Tables are generated here by retrograde analysis: every position with no
+moves is scored, then positions are resolved one ply further from mate at
+a time by taking moves back. Captures and promotions lead to smaller or
+other tables, which are generated first and looked up. Positions with
+castling rights, or an en-passant capture on, are not covered.
+
+Set TABLEBASE_DIR to the directory of the tables to have the search look
+up covered positions instead of searching them.
+
+Usage:
+    python -m chessbot.tablebase -d tables KQvK KRvK  # these and what they need
+    python -m chessbot.tablebase -d tables --pieces 4 # every table up to 4 pieces
+"""
+import argparse
+import itertools
+import mmap
+import os
+import sys
+import time
+from array import array
+from chessbot.board import Board, PIECE_CLASSES
+from chessbot.bitboard import (PAWN, KNIGHT, BISHOP, ROOK, QUEEN, KING, WHITE, BLACK, COLORS,
+                               COLOR_INDEX, BIT, RANK_MASKS, KNIGHT_ATTACKS, KING_ATTACKS,
+                               PAWN_ATTACKS, bishop_attacks, rook_attacks, queen_attacks,
+                               iter_bits, popcount)
+from chessbot.move import CAPTURE, PROMOTION_SHIFT
+
+TABLEBASE_DIR = os.environ.get('TABLEBASE_DIR')
+
+MAGIC = b'CBTB1\n'
+SUFFIX = '.tb'
+MAX_PIECES = 4
+
+# Piece letters, strongest first; signatures list each side's in this order
+LETTERS = 'KQRBNP'
+LETTER_TYPES = {'K': KING, 'Q': QUEEN, 'R': ROOK, 'B': BISHOP, 'N': KNIGHT, 'P': PAWN}
+SLIDER_ATTACKS = {BISHOP: bishop_attacks, ROOK: rook_attacks, QUEEN: queen_attacks}
+STEP_ATTACKS = {KNIGHT: KNIGHT_ATTACKS, KING: KING_ATTACKS}
+# No pawn stands on these
+BACK_RANKS = RANK_MASKS[0] | RANK_MASKS[7]
+
+
+def material(board, color):
+    """The piece letters of one side of the board, as in a signature."""
+    pieces = board.pieces[color]
+    return ''.join(letter * popcount(pieces[LETTER_TYPES[letter]]) for letter in LETTERS)
+
+
+def normalize(white, black):
+    """(signature, colors swapped) for the piece letters of each side."""
+    def strength(letters):
+        return len(letters), [-LETTERS.index(letter) for letter in letters]
+    if strength(black) > strength(white):
+        return black + 'v' + white, True
+    return white + 'v' + black, False
+
+
+def parse_signature(text):
+    """The normalized signature for text such as 'KRvK' or 'kvkq'."""
+    white, _, black = text.upper().partition('V')
+    letters = white + black
+    if (not black or white.count('K') != 1 or black.count('K') != 1
+            or any(letter not in LETTERS for letter in letters)):
+        raise ValueError('not a material signature: %r' % text)
+    order = LETTERS.index
+    return normalize(''.join(sorted(white, key=order)), ''.join(sorted(black, key=order)))[0]
+
+
+class Layout:
+    """Where each position of a signature is in its table."""
+
+    def __init__(self, signature):
+        white, black = signature.split('v')
+        self.signature = signature
+        self.pieces = ([(WHITE, LETTER_TYPES[letter]) for letter in white]
+                       + [(BLACK, LETTER_TYPES[letter]) for letter in black])
+        self.pawns = 'P' in signature
+        # Squares the white king is moved to by mirroring: a1-d4, or a-d files with pawns
+        rows = range(8) if self.pawns else range(4, 8)
+        self.king_squares = [row * 8 + col for row in rows for col in range(4)]
+        self.king_slots = [None] * 64
+        for slot, sq in enumerate(self.king_squares):
+            self.king_slots[sq] = slot
+        self.size = len(self.king_squares) * 64 ** (len(self.pieces) - 1) * 2
+
+    def index(self, squares, side):
+        """Index of the position with the pieces on `squares` and `side` to move."""
+        king = squares[0]
+        flip = 7 if king & 7 >= 4 else 0
+        if not self.pawns and king < 32:
+            flip |= 56
+        index = self.king_slots[king ^ flip]
+        for sq in squares[1:]:
+            index = index * 64 + (sq ^ flip)
+        return index * 2 + side
+
+    def squares(self, index):
+        """(squares of the pieces, side to move) at an index."""
+        side = index & 1
+        index >>= 1
+        squares = []
+        for _ in range(len(self.pieces) - 1):
+            index, sq = divmod(index, 64)
+            squares.append(sq)
+        squares.append(self.king_squares[index])
+        squares.reverse()
+        return squares, side
+
+    def board_squares(self, board, swapped):
+        """The squares of the board's pieces in table order."""
+        flip = 56 if swapped else 0
+        squares = []
+        for position, (color, kind) in enumerate(self.pieces):
+            # Pieces of a kind are next to each other; take them all at the first
+            if position and self.pieces[position - 1] == (color, kind):
+                continue
+            squares.extend(sq ^ flip for sq in iter_bits(board.pieces[color ^ swapped][kind]))
+        return squares
+
+
+class Table:
+    """A memory-mapped table of one signature."""
+
+    def __init__(self, path, layout):
+        with open(path, 'rb') as f:
+            self.map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        if self.map[:len(MAGIC)] != MAGIC or len(self.map) != len(MAGIC) + layout.size:
+            self.map.close()
+            raise ValueError('not a %s tablebase' % layout.signature)
+        self.layout = layout
+
+    def value(self, index):
+        value = self.map[len(MAGIC) + index]
+        return value - 256 if value > 127 else value
+
+    def close(self):
+        self.map.close()
+
+
+class Tablebase:
+    """The tables in a directory, mapped as they are first needed."""
+
+    def __init__(self, directory):
+        self.directory = directory
+        # signature -> Table, or None when there is no such table
+        self.tables = {}
+        signatures = [name[:-len(SUFFIX)] for name in os.listdir(directory)
+                      if name.endswith(SUFFIX)]
+        self.max_pieces = max((len(signature) - 1 for signature in signatures), default=2)
+
+    def path(self, signature):
+        return os.path.join(self.directory, signature + SUFFIX)
+
+    def table(self, signature):
+        if signature not in self.tables:
+            table = None
+            if os.path.exists(self.path(signature)):
+                try:
+                    table = Table(self.path(signature), Layout(signature))
+                except (OSError, ValueError) as e:
+                    print(f"Error opening tablebase {self.path(signature)}: {str(e)}")
+            self.tables[signature] = table
+        return self.tables[signature]
+
+    def probe(self, board):
+        """Value of the position for the side to move (see above), or None."""
+        if popcount(board.occupied) > self.max_pieces or board.castling_rights:
+            return None
+        us = COLOR_INDEX[board.turn]
+        ep_square = board.ep_square
+        if ep_square is not None and PAWN_ATTACKS[us ^ 1][ep_square] & board.pieces[us][PAWN]:
+            return None
+        signature, swapped = normalize(material(board, WHITE), material(board, BLACK))
+        if signature == 'KvK':
+            return 0
+        table = self.table(signature)
+        if table is None:
+            return None
+        layout = table.layout
+        return table.value(layout.index(layout.board_squares(board, swapped), us ^ swapped))
+
+    def best_move(self, board):
+        """The move that mates soonest, or else draws, or else holds out
+        longest; None unless every move's result is in the tables."""
+        if popcount(board.occupied) > self.max_pieces:
+            return None
+        best, best_rank = None, None
+        for move in board.legal_moves():
+            board.push(move)
+            value = self.probe(board)
+            board.pop()
+            if value is None:
+                return None
+            # The opponent's value: losing quickest is best, winning quickest worst
+            rank = (2, value) if value < 0 else (1, 0) if value == 0 else (0, value)
+            if best_rank is None or rank > best_rank:
+                best, best_rank = move, rank
+        return best
+
+    def close(self):
+        for table in self.tables.values():
+            if table:
+                table.close()
+        self.tables.clear()
+
+
+def conversions(signature):
+    """Signatures a capture or promotion in `signature` leads to."""
+    found = set()
+    sides = signature.split('v')
+    for side in (0, 1):
+        for promotion in [None] + (['Q', 'R', 'B', 'N'] if 'P' in sides[side] else []):
+            promoted = list(sides)
+            if promotion:
+                promoted[side] = promoted[side].replace('P', promotion, 1)
+            # The move may capture any piece but the king on the other side
+            captures = [None] + sorted(set(promoted[side ^ 1][1:]))
+            for captured in captures:
+                if promotion is None and captured is None:
+                    continue
+                result = list(promoted)
+                if captured:
+                    result[side ^ 1] = result[side ^ 1].replace(captured, '', 1)
+                found.add(parse_signature('v'.join(result)))
+    found.discard('KvK')
+    return found
+
+
+def signatures(pieces):
+    """Every signature of 3 to `pieces` pieces, smallest first."""
+    found = []
+    for count in range(1, pieces - 1):
+        for extra in itertools.combinations_with_replacement(LETTERS[1:], count):
+            for split in range(count + 1):
+                signature = parse_signature('K' + ''.join(extra[:split]) + 'vK'
+                                            + ''.join(extra[split:]))
+                if signature not in found:
+                    found.append(signature)
+    return found
+
+
+def predecessors(layout, squares, side):
+    """Indexes of the positions one move back from a position, without
+    captures or promotions; some may be illegal."""
+    mover = side ^ 1
+    occupied = 0
+    for sq in squares:
+        occupied |= BIT[sq]
+    empty = ~occupied
+    for position, (color, kind) in enumerate(layout.pieces):
+        if color != mover:
+            continue
+        to_sq = squares[position]
+        if kind == PAWN:
+            # White pawns move up the board, to lower rows
+            step, start_row = (8, 6) if color == WHITE else (-8, 1)
+            behind = to_sq + step
+            origins = BIT[behind] & empty & ~BACK_RANKS
+            if origins and (behind + step) >> 3 == start_row:
+                origins |= BIT[behind + step] & empty
+        elif kind in STEP_ATTACKS:
+            origins = STEP_ATTACKS[kind][to_sq] & empty
+        else:
+            origins = SLIDER_ATTACKS[kind](to_sq, occupied) & empty
+        for from_sq in iter_bits(origins):
+            squares[position] = from_sq
+            yield layout.index(squares, mover)
+        squares[position] = to_sq
+
+
+def generate(signature, tablebase, log=print):
+    """Write the table of a signature to the tablebase's directory.
+
+    The tables its captures and promotions lead to must be there already.
+    """
+    start = time.perf_counter()
+    layout = Layout(signature)
+    values = array('b', bytes(layout.size))
+    # Moves of each position not yet known to lose; -1 for illegal positions
+    counts = array('b', b'\xff' * layout.size)
+    # Plies -> positions with a capture or promotion winning, or losing, in that many
+    wins, losses = {}, {}
+    frontier = []
+
+    board = Board()
+    board.set_fen('8/8/8/8/8/8/8/8 w - -')
+    pieces = [PIECE_CLASSES[kind](COLORS[color]) for color, kind in layout.pieces]
+    placed = []
+    for index in range(layout.size):
+        squares, side = layout.squares(index)
+        if squares != placed:
+            if len(set(squares)) < len(squares) or any(
+                    kind == PAWN and BIT[sq] & BACK_RANKS
+                    for (_, kind), sq in zip(layout.pieces, squares)):
+                continue
+            for sq in placed:
+                board._remove_piece(sq)
+            for piece, sq in zip(pieces, squares):
+                board._put_piece(piece, sq)
+            placed = squares
+        # The side that just moved cannot be in check
+        them = side ^ 1
+        if board._is_square_attacked(board.king_squares[them], side, board.occupied):
+            continue
+        board.turn = COLORS[side]
+        moves = board.legal_moves()
+        counts[index] = len(moves)
+        if not moves:
+            if board.is_in_check(board.turn):
+                values[index] = -1
+                frontier.append(index)
+            continue
+        for move in moves:
+            if move & CAPTURE or move >> PROMOTION_SHIFT:
+                board.push(move)
+                value = tablebase.probe(board)
+                board.pop()
+                if value is None:
+                    raise ValueError('%s needs the tables of %s'
+                                     % (signature, ', '.join(sorted(conversions(signature)))))
+                if value < 0:
+                    wins.setdefault(-value, []).append(index)
+                elif value > 0:
+                    losses.setdefault(value + 1, []).append(index)
+    for sq in placed:
+        board._remove_piece(sq)
+
+    # Resolve the positions one ply further from mate at a time
+    for ply in itertools.count():
+        for index in wins.pop(ply, ()):
+            if not values[index]:
+                values[index] = ply
+                frontier.append(index)
+        for index in losses.pop(ply, ()):
+            counts[index] -= 1
+            if not counts[index] and not values[index]:
+                values[index] = -ply - 1
+                frontier.append(index)
+        if not frontier and not wins and not losses:
+            break
+        if ply > 126:
+            raise ValueError('%s has mates too long for the table' % signature)
+        resolved = []
+        for index in frontier:
+            lost = values[index] < 0
+            squares, side = layout.squares(index)
+            for previous in predecessors(layout, squares, side):
+                if values[previous] or counts[previous] < 0:
+                    continue
+                if lost:
+                    values[previous] = ply + 1
+                    resolved.append(previous)
+                else:
+                    counts[previous] -= 1
+                    if not counts[previous]:
+                        values[previous] = -ply - 2
+                        resolved.append(previous)
+        frontier = resolved
+
+    path = tablebase.path(signature)
+    with open(path + '.tmp', 'wb') as f:
+        f.write(MAGIC)
+        values.tofile(f)
+    os.replace(path + '.tmp', path)
+    tablebase.tables.pop(signature, None)
+    tablebase.max_pieces = max(tablebase.max_pieces, len(layout.pieces))
+
+    legal = sum(1 for count in counts if count >= 0)
+    won = sum(1 for value in values if value > 0)
+    lost = sum(1 for value in values if value < 0)
+    log('%s: %d positions, %d won, %d lost, %d drawn, longest mate %d plies, %.1fs'
+        % (signature, legal, won, lost, legal - won - lost, max(values) if won else 0,
+           time.perf_counter() - start))
+
+
+def ensure(signature, tablebase, log=print):
+    """Generate a signature's table and those it needs, unless already there."""
+    for needed in sorted(conversions(signature), key=len):
+        ensure(needed, tablebase, log)
+    if not os.path.exists(tablebase.path(signature)):
+        generate(signature, tablebase, log)
+
+
+_tablebase = None
+
+
+def get_tablebase():
+    """The TABLEBASE_DIR tables, found on first use; None if there are none."""
+    global _tablebase, TABLEBASE_DIR
+    if _tablebase is None and TABLEBASE_DIR:
+        try:
+            _tablebase = Tablebase(TABLEBASE_DIR)
+        except OSError as e:
+            print(f"Error opening tablebase {TABLEBASE_DIR}: {str(e)}")
+            TABLEBASE_DIR = None
+    return _tablebase
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='python -m chessbot.tablebase',
+                                     description='Generate endgame tablebases.')
+    parser.add_argument('signatures', nargs='*', help='material signatures such as KRvK')
+    parser.add_argument('-d', '--directory', default=TABLEBASE_DIR, required=not TABLEBASE_DIR,
+                        help='directory of the tables (default: TABLEBASE_DIR)')
+    parser.add_argument('--pieces', type=int, choices=range(3, MAX_PIECES + 1),
+                        help='generate every table with up to this many pieces')
+    args = parser.parse_args(argv)
+
+    try:
+        wanted = [parse_signature(text) for text in args.signatures]
+    except ValueError as e:
+        parser.error(str(e))
+    if args.pieces:
+        wanted += signatures(args.pieces)
+    if not wanted:
+        parser.error('name the signatures to generate, or use --pieces')
+    if any(len(signature) - 1 > MAX_PIECES for signature in wanted):
+        parser.error('tables have at most %d pieces' % MAX_PIECES)
+
+    os.makedirs(args.directory, exist_ok=True)
+    tablebase = Tablebase(args.directory)
+    for signature in wanted:
+        ensure(signature, tablebase)
+    tablebase.close()
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
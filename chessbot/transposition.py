@@ -0,0 +1,104 @@
+"""Fixed-size transposition table for the minimax search.
+
+Entries live in flat typed columns over one buffer so the table's memory
+use is fixed when it is created, and the buffer can be shared memory
+that several search processes read and write at once. Every bucket has
+two slots: slot 0 keeps the deepest result seen for the bucket
+(depth-preferred) and slot 1 is overwritten by every store
+(always-replace). Results from earlier searches age out of the
+depth-preferred slot, so a table can be reused across moves of a game.
+
+Shared tables take no locks: a slot written by two processes at once can
+mix the fields of two entries. The search only trusts a table move after
+finding it among the legal moves, so such an entry costs accuracy, not
+correctness.
+"""
+
+EXACT, LOWERBOUND, UPPERBOUND = 0, 1, 2
+
+DEFAULT_SIZE_MB = 2
+# (typecode, bytes) of each column: key, score, move code, depth, flag, generation
+COLUMNS = (('Q', 8), ('i', 4), ('I', 4), ('b', 1), ('B', 1), ('B', 1))
+ENTRY_SIZE = sum(size for _, size in COLUMNS)
+
+
+def slot_count(size_mb):
+    """Number of slots (two per bucket) that fit in size_mb megabytes."""
+    buckets = 1
+    while buckets * 4 * ENTRY_SIZE <= size_mb * 1024 * 1024:
+        buckets *= 2
+    return buckets * 2
+
+
+def buffer_size(size_mb):
+    """Bytes of buffer a table of size_mb megabytes needs."""
+    return slot_count(size_mb) * ENTRY_SIZE
+
+
+class TranspositionTable:
+    def __init__(self, size_mb=DEFAULT_SIZE_MB, buffer=None, clear=True):
+        """Create a table, in a new buffer or over `buffer` (at least
+        buffer_size(size_mb) bytes, such as a SharedMemory.buf). Pass
+        clear=False to attach to a table another process already set up.
+        """
+        slots = slot_count(size_mb)
+        self.mask = slots // 2 - 1
+        raw = memoryview(bytearray(slots * ENTRY_SIZE) if buffer is None else buffer)
+        self._views = [raw]
+        columns, offset = [], 0
+        for typecode, size in COLUMNS:
+            part = raw[offset:offset + slots * size]
+            columns.append(part.cast(typecode))
+            self._views += [part, columns[-1]]
+            offset += slots * size
+        self.keys, self.scores, self.moves, self.depths, self.flags, self.generations = columns
+        self.generation = 0
+        if clear:
+            self.clear()
+
+    def new_search(self):
+        """Start a new search so older entries become replaceable."""
+        self.generation = (self.generation + 1) & 0xFF
+
+    def clear(self):
+        slots = len(self.keys)
+        keys, depths = self.keys.cast('B'), self.depths.cast('B')
+        keys[:] = bytes(8 * slots)
+        # Depth -1 marks an empty slot
+        depths[:] = b'\xff' * slots
+        keys.release()
+        depths.release()
+
+    def release(self):
+        """Drop the views on the buffer so shared memory can be closed."""
+        for view in reversed(self._views):
+            view.release()
+
+    def probe(self, key):
+        """Return (depth, flag, score, move) stored for key, or None."""
+        slot = (key & self.mask) << 1
+        for index in (slot, slot + 1):
+            if self.keys[index] == key and self.depths[index] >= 0:
+                return (self.depths[index], self.flags[index],
+                        self.scores[index], self.moves[index] or None)
+        return None
+
+    def store(self, key, depth, flag, score, move):
+        slot = (key & self.mask) << 1
+        # The depth-preferred slot takes the entry when it is at least as
+        # deep, from an older search, or already holds this position.
+        if (depth >= self.depths[slot] or self.keys[slot] == key
+                or self.generations[slot] != self.generation):
+            index = slot
+        else:
+            index = slot + 1
+        # Keep the previous best move when re-storing a position without one
+        code = move or 0
+        if not code and self.keys[index] == key:
+            code = self.moves[index]
+        self.keys[index] = key
+        self.depths[index] = depth
+        self.flags[index] = flag
+        self.scores[index] = int(score)
+        self.moves[index] = code
+        self.generations[index] = self.generation
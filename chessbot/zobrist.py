@@ -0,0 +1,17 @@
+"""Zobrist keys for 64-bit position hashing.
+
+A position's hash is the XOR of one key per (color, piece type, square),
+the side-to-move key when black is to move, the key for the current
+castling-rights mask and the key for the en-passant file, if any. Board
+updates it incrementally as pieces are put down and lifted.
+"""
+import random
+
+_rng = random.Random(0x2D0C4E5)
+
+PIECE_KEYS = [[[_rng.getrandbits(64) for sq in range(64)]
+               for kind in range(6)]
+              for color in range(2)]
+SIDE_KEY = _rng.getrandbits(64)
+CASTLING_KEYS = [_rng.getrandbits(64) for rights in range(16)]
+EP_KEYS = [_rng.getrandbits(64) for col in range(8)]
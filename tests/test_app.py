@@ -0,0 +1,89 @@
+import time
+import types
+import pytest
+from chessbot import app as app_module
+from chessbot.ingest import san_moves, parse_san
+
+# Past the opening moves get_best_move answers without searching
+OPENING = '1. e4 e5 2. Nf3 Nc6 3. Bc4 Bc5 4. c3 Nf6'
+
+
+@pytest.fixture
+def client():
+    return app_module.app.test_client()
+
+
+def start_game(client, difficulty='easy'):
+    game_id = client.post('/new_game', json={'difficulty': difficulty}).get_json()['game_id']
+    board = app_module.games[game_id]
+    for san in san_moves(OPENING):
+        board.push(parse_san(board, san))
+    return game_id, board
+
+
+def test_new_game_difficulty(client):
+    response = client.post('/new_game', json={'difficulty': 'grandmaster'})
+    assert response.status_code == 400
+    assert response.get_json() == {'error': 'Unknown difficulty'}
+    assert client.post('/new_game', json={}).get_json()['difficulty'] == 'hard'
+    for level in app_module.DIFFICULTY_LEVELS:
+        assert client.post('/new_game', json={'difficulty': level}).get_json()['difficulty'] == level
+
+
+@pytest.mark.parametrize('level', sorted(app_module.DIFFICULTY_LEVELS))
+def test_difficulty_options_are_submitted(client, monkeypatch, level):
+    submitted = []
+
+    def submit(game_id, board, player, on_done, **options):
+        submitted.append(options)
+        return types.SimpleNamespace(id=0)
+
+    monkeypatch.setattr(app_module.engine, 'submit', submit)
+    game_id, board = start_game(client, level)
+    assert play(client, game_id, board.legal_moves()[0])['job_id'] == 0
+    assert submitted == [app_module.DIFFICULTY_LEVELS[level]]
+
+def squares(code):
+    from_sq, to_sq = code & 63, code >> 6 & 63
+    return {'from_row': from_sq >> 3, 'from_col': from_sq & 7,
+            'to_row': to_sq >> 3, 'to_col': to_sq & 7}
+
+
+def play(client, game_id, code):
+    return client.post('/make_move', json=dict(squares(code), game_id=game_id)).get_json()
+
+
+def ai_reply(client, job_id):
+    return client.get('/ai_move?job_id=%d&wait=30' % job_id).get_json()
+
+
+def test_ponder_hit_after_ponder_finished(client, monkeypatch):
+    monkeypatch.setattr(app_module, 'PONDER', True)
+    # Without noise the search predicts a reply to ponder on
+    monkeypatch.setitem(app_module.DIFFICULTY_LEVELS, 'exact',
+                        {'depth': 3, 'time_limit': None, 'node_limit': None, 'noise': 0})
+    game_id, board = start_game(client, 'exact')
+    try:
+        first = play(client, game_id, board.legal_moves()[0])
+        assert ai_reply(client, first['job_id'])['job_status'] == 'done'
+        reply = app_module.engine.get(first['job_id']).reply
+        ponder = app_module.engine.ponder_jobs.get(game_id)
+        assert reply is not None and ponder is not None
+        deadline = time.time() + 30
+        while not ponder.searched and time.time() < deadline:
+            time.sleep(0.05)
+        assert ponder.searched
+
+        board.push(reply)
+        expected = app_module.get_board_state(board)
+        board.pop()
+        response = play(client, game_id, reply)
+        # The player's move, not the AI's answer to it
+        assert response['board'] == expected
+        assert 'status' not in response
+        assert response['job_id'] == ponder.id
+        answer = ai_reply(client, ponder.id)
+        assert answer['job_status'] == 'done'
+        assert answer['board'] != expected
+    finally:
+        app_module.engine.cancel_game(game_id)
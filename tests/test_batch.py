@@ -0,0 +1,23 @@
+import pytest
+
+np = pytest.importorskip('numpy')
+
+from chessbot.batch import encode, evaluate_batch, evaluate_boards, regression_set
+from chessbot.chess_ai_bot import evaluate_board
+
+
+def test_batch_scores_match_evaluate_board():
+    boards = regression_set(1)
+    assert evaluate_boards(boards) == [evaluate_board(board) for board in boards]
+
+
+def test_batch_encoding_has_a_plane_per_piece():
+    boards = regression_set(0)
+    planes = encode(boards)
+    assert planes.shape == (len(boards), 12, 64)
+    assert [int(count) for count in planes.sum(axis=(1, 2))] == [
+        bin(board.occupied).count('1') for board in boards]
+
+
+def test_empty_batch():
+    assert evaluate_batch(np.zeros((0, 12, 64), dtype=np.uint8)).shape == (0,)
@@ -0,0 +1,133 @@
+import threading
+import time
+import pytest
+from chessbot.board import Board
+from chessbot.engine import EnginePool, DONE, CANCELLED
+from chessbot.chess_ai_bot import get_best_move, SearchStats, DIFFICULTY_LEVELS
+from chessbot.ingest import san_moves, parse_san
+
+# Past the opening moves get_best_move answers without searching
+OPENING = '1. e4 e5 2. Nf3 Nc6 3. Bc4 Bc5 4. c3 Nf6'
+
+
+def opening_board():
+    board = Board()
+    for san in san_moves(OPENING):
+        board.push(parse_san(board, san))
+    return board
+
+
+def played(job, move):
+    return move
+
+
+@pytest.fixture
+def pool():
+    pool = EnginePool(workers=2)
+    yield pool
+    pool.close()
+
+
+@pytest.fixture
+def single_pool():
+    pool = EnginePool(workers=1)
+    yield pool
+    pool.close()
+
+
+def returns(call, timeout=10):
+    """call()'s result, failing the test if it does not return in time."""
+    result = []
+    thread = threading.Thread(target=lambda: result.append(call()), daemon=True)
+    thread.start()
+    thread.join(timeout)
+    assert result, 'call did not return'
+    return result[0]
+
+
+def test_job_returns_searched_move(pool):
+    board = opening_board()
+    job = pool.submit('game', board, 'white', played, depth=2, time_limit=None)
+    assert pool.wait(job.id, 60) is job
+    assert job.status == DONE
+    assert job.result == job.move
+    assert job.move in board.legal_moves()
+    assert job.stats['source'] == 'search'
+
+
+@pytest.mark.parametrize('level', sorted(DIFFICULTY_LEVELS))
+def test_difficulty_budgets_reach_the_search(pool, level):
+    options = DIFFICULTY_LEVELS[level]
+    board = opening_board()
+    job = pool.submit(level, board, 'white', played, **options)
+    assert pool.wait(job.id, 60) is job
+    assert job.move in board.legal_moves()
+    if options['depth']:
+        assert job.stats['depth'] <= options['depth']
+    if options['node_limit']:
+        assert job.stats['nodes'] <= options['node_limit']
+    # Some slack for the search to notice the clock
+    assert job.stats['time'] <= options['time_limit'] + 0.5
+
+def test_game_jobs_share_a_worker_and_its_table(pool):
+    board = opening_board()
+    jobs = []
+    for game in ('first', 'second', 'first'):
+        job = pool.submit(game, board, 'white', played, depth=3, time_limit=None)
+        pool.wait(job.id, 60)
+        jobs.append(job)
+    assert pool.game_workers['first'] != pool.game_workers['second']
+    # The repeated search starts from the table the first one filled
+    assert jobs[2].stats['nodes'] < jobs[0].stats['nodes']
+
+
+def test_cancel_queued_job(single_pool):
+    board = opening_board()
+    jobs = [single_pool.submit('game%d' % index, board, 'white', played, time_limit=2)
+            for index in range(4)]
+    assert returns(lambda: single_pool.cancel(jobs[3].id))
+    assert jobs[3].status == CANCELLED
+    assert jobs[3].finished.is_set()
+    # A second job for a game cancels its queued one
+    returns(lambda: single_pool.submit('game2', board, 'white', played, time_limit=2))
+    assert jobs[2].status == CANCELLED
+    returns(lambda: single_pool.cancel_game('game1'))
+    assert jobs[1].status == CANCELLED
+    assert returns(lambda: single_pool.cancel(jobs[0].id))
+
+
+def test_cancel_stops_running_search(single_pool):
+    board = opening_board()
+    job = single_pool.submit('game', board, 'white', played, time_limit=30)
+    # Let the worker start searching
+    time.sleep(1)
+    start = time.perf_counter()
+    assert single_pool.cancel(job.id)
+    job.future.result(timeout=30)
+    assert time.perf_counter() - start < 10
+
+
+def test_ponderhit_on_other_position_stops_ponder(pool):
+    board = opening_board()
+    job = pool.submit('game', board, 'white', played, ponder=True, time_limit=30)
+    assert pool.get(job.id) is None
+    assert returns(lambda: pool.ponderhit('game', board.hash ^ 1)) is None
+    assert job.status == CANCELLED
+
+
+def test_ponderhit_makes_ponder_the_game_job(pool):
+    board = opening_board()
+    job = pool.submit('game', board, 'white', played, ponder=True, depth=2, time_limit=None)
+    assert pool.ponderhit('game', board.hash) is job
+    assert pool.wait(job.id, 60) is job
+    assert job.status == DONE
+    assert job.result in board.legal_moves()
+
+
+def test_parallel_search_honours_stop():
+    board = opening_board()
+    stats = SearchStats()
+    start = time.perf_counter()
+    get_best_move(board, player='white', time_limit=5, workers=2, stop=bytearray(b'\x01'),
+                  stats=stats)
+    assert time.perf_counter() - start < 2.5
@@ -0,0 +1,52 @@
+import random
+import pytest
+from chessbot.board import Board
+from chessbot.chess_ai_bot import evaluate_board, get_best_move
+from chessbot.perft import SUITE
+
+
+def fresh(board):
+    copy = Board()
+    copy.set_fen(board.fen())
+    return copy
+
+
+def test_incremental_terms_match_a_fresh_board():
+    rng = random.Random(7)
+    for _, fen, _ in SUITE:
+        board = Board()
+        board.set_fen(fen)
+        start = (list(board.material), list(board.placement), board.hash)
+        plies = 0
+        for _ in range(40):
+            moves = board.legal_moves()
+            if not moves:
+                break
+            board.push(rng.choice(moves))
+            plies += 1
+            copy = fresh(board)
+            assert board.material == copy.material
+            assert board.placement == copy.placement
+            assert evaluate_board(board) == evaluate_board(copy)
+        for _ in range(plies):
+            board.pop()
+        assert (board.material, board.placement, board.hash) == start
+
+
+def test_search_mates_instead_of_stalemating():
+    board = Board()
+    board.set_fen('k7/8/2K5/8/8/8/8/1Q6 w - - 0 1')
+    board.push(get_best_move(board, 3, 'white', time_limit=None))
+    assert board.is_checkmate('black')
+
+
+@pytest.mark.parametrize('fen', [
+    # Taking the rook leaves the white king no move
+    '3k4/8/1q6/8/8/1R6/8/K7 b - - 0 1',
+    '2k5/2q5/8/8/8/6R1/8/7K b - - 0 1',
+])
+def test_search_does_not_stalemate_a_lost_opponent(fen):
+    board = Board()
+    board.set_fen(fen)
+    board.push(get_best_move(board, 1, 'black', time_limit=None))
+    assert board.legal_moves()
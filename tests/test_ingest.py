@@ -0,0 +1,99 @@
+import os
+import pytest
+from chessbot.board import Board
+from chessbot.ingest import OpeningIndex, main, read_games, san_moves, parse_san
+
+PGN = '''[Event "one"]
+[Result "1-0"]
+
+1. e4 {best by test} e5 2. Nf3 (2. f4 exf4) Nc6 1-0
+
+[Event "two"]
+[Result "1-0"]
+
+1. e4 c5 2. Nf3 d6 1-0
+
+[Event "three"]
+[Result "0-1"]
+
+1. d4 d5 2. c4 e6 0-1
+
+[Event "four"]
+[Result "1/2-1/2"]
+
+1. d4 Nf6 1/2-1/2
+
+[Event "set up"]
+[FEN "4k3/8/8/8/8/8/8/4K2R w K - 0 1"]
+[Result "1-0"]
+
+1. Rh8# 1-0
+
+[Event "unfinished"]
+[Result "*"]
+
+1. e4 e5 *
+'''
+
+
+def move(board, san):
+    return parse_san(board, next(san_moves(san)))
+
+
+def test_read_games_splits_headers_and_movetext():
+    games = list(read_games(PGN.splitlines()))
+    assert [headers['Event'] for headers, _ in games] == [
+        'one', 'two', 'three', 'four', 'set up', 'unfinished']
+    # Comments and variations are dropped from the main line
+    assert [match.group(0) for match in san_moves(games[0][1])] == ['e4', 'e5', 'Nf3', 'Nc6']
+
+
+def test_parse_san_disambiguates():
+    board = Board()
+    board.set_fen('4k3/8/8/8/8/8/8/R3K2R w KQ - 0 1')
+    castle = move(board, 'O-O')
+    rook = move(board, 'Rhf1')
+    assert castle != rook
+    assert rook & 63 == 63 and castle & 63 == 60
+    assert move(board, 'Ra8+') & 63 == 56
+
+
+@pytest.fixture
+def index(tmp_path):
+    pgn = tmp_path / 'games.pgn'
+    pgn.write_text(PGN)
+    path = tmp_path / 'openings.idx'
+    assert main([str(pgn), '-o', str(path), '-j', '2', '--min-games', '1']) == 0
+    index = OpeningIndex(str(path))
+    yield index
+    index.close()
+
+
+def test_index_counts_results_for_the_side_to_move(index):
+    board = Board()
+    counts = {code: tally for code, *tally in index.moves(board)}
+    assert counts == {move(board, 'e4'): [2, 0, 0], move(board, 'd4'): [0, 1, 1]}
+    board.push(move(board, 'd4'))
+    counts = {code: tally for code, *tally in index.moves(board)}
+    assert counts == {move(board, 'd5'): [1, 0, 0], move(board, 'Nf6'): [0, 1, 0]}
+
+
+def test_index_leaves_out_skipped_games(index):
+    assert index.size == 12
+
+
+def test_index_chooses_best_scoring_move(index):
+    board = Board()
+    assert index.choose(board, min_games=1) == move(board, 'e4')
+    assert index.choose(board, min_games=3) is None
+
+
+def test_worker_error_is_raised_and_spill_files_removed(tmp_path):
+    pgn = tmp_path / 'games.pgn'
+    pgn.write_text(PGN)
+    folder = tmp_path / 'folder'
+    folder.mkdir()
+    (folder / 'filler').write_bytes(b'x' * 10)
+    with pytest.raises(IsADirectoryError):
+        main([str(pgn), str(folder), '-o', str(tmp_path / 'openings.idx'), '-j', '2'])
+    assert sorted(os.listdir(tmp_path)) == ['folder', 'games.pgn']
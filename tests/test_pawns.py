@@ -0,0 +1,69 @@
+import random
+import pytest
+from chessbot.bitboard import BIT, WHITE, BLACK, PAWN
+from chessbot.pawns import PawnTable, pawn_structure
+from chessbot.board import Board
+from chessbot.perft import SUITE
+
+
+def pawns(*names):
+    """Bitboard of squares named like 'e4'."""
+    bits = 0
+    for name in names:
+        bits |= BIT[(8 - int(name[1])) * 8 + ord(name[0]) - ord('a')]
+    return bits
+
+
+@pytest.mark.parametrize('white, black, score', [
+    # Isolated and passed
+    (('e4',), (), -15 + 50),
+    # Doubled and isolated; only the front pawn is passed
+    (('e2', 'e4'), (), 2 * -20 + 2 * -15 + 50),
+    # d3 is backward: its neighbours are ahead and e5 guards d4
+    (('c4', 'd3', 'e4'), ('e5',), (-10 + 50 + 50) - -15),
+    (('c4', 'd3', 'e4'), (), 3 * 50),
+    # Mirrored, from black's side
+    ((), ('e5',), -(-15 + 50)),
+])
+def test_pawn_structure_terms(white, black, score):
+    assert pawn_structure(pawns(*white), pawns(*black)) == score
+
+
+def test_table_scores_match_pawn_structure():
+    table = PawnTable()
+    rng = random.Random(5)
+    placements = []
+    for _, fen, _ in SUITE:
+        board = Board()
+        board.set_fen(fen)
+        for _ in range(200):
+            moves = board.legal_moves()
+            if not moves:
+                break
+            board.push(rng.choice(moves))
+            placements.append((board.pieces[WHITE][PAWN], board.pieces[BLACK][PAWN]))
+    for white, black in placements:
+        assert table.score(white, black) == pawn_structure(white, black)
+    assert table.probes == len(placements)
+    assert table.hit_rate() > 0.5
+
+
+def test_small_table_replaces_entries_without_mixing_them_up():
+    table = PawnTable(entries=2)
+    rng = random.Random(3)
+    middle = sum(BIT[sq] for sq in range(8, 56))
+    for _ in range(500):
+        white = rng.getrandbits(64) & middle & rng.getrandbits(64)
+        black = rng.getrandbits(64) & middle & ~white & rng.getrandbits(64)
+        assert table.score(white, black) == pawn_structure(white, black)
+    assert len(table.slots) == 2
+
+
+def test_clear_forgets_scores():
+    table = PawnTable(entries=4)
+    table.score(pawns('e4'), 0)
+    table.score(pawns('e4'), 0)
+    assert table.hits == 1
+    table.clear()
+    assert table.slots == [None] * 4
+    assert (table.probes, table.hits) == (0, 0)
@@ -0,0 +1,25 @@
+import pytest
+from chessbot.board import Board
+from chessbot.perft import SUITE, perft, divide
+
+
+@pytest.mark.parametrize('name, fen, counts', SUITE, ids=[name for name, _, _ in SUITE])
+def test_perft_matches_reference_counts(name, fen, counts):
+    board = Board()
+    board.set_fen(fen)
+    for depth, expected in enumerate(counts[:3], 1):
+        assert perft(board, depth) == expected
+
+
+def test_perft_leaves_board_unchanged():
+    board = Board()
+    board.set_fen(SUITE[1][1])
+    before = (board.fen(), board.hash)
+    perft(board, 3)
+    assert (board.fen(), board.hash) == before
+
+
+def test_divide_adds_up_to_perft():
+    board = Board()
+    board.set_fen(SUITE[1][1])
+    assert sum(nodes for _, nodes in divide(board, 2)) == SUITE[1][2][1]
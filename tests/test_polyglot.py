@@ -0,0 +1,76 @@
+import random
+import pytest
+from chessbot.board import Board
+from chessbot.ingest import san_moves, parse_san
+from chessbot.move import CASTLING
+from chessbot.polyglot import OpeningBook, ENTRY, polyglot_key, polyglot_move
+
+
+def board_after(moves):
+    board = Board()
+    for san in san_moves(moves):
+        board.push(parse_san(board, san))
+    return board
+
+
+# Keys from the Polyglot format description
+@pytest.mark.parametrize('moves, key', [
+    ('', 0x463B96181691FC9C),
+    ('e4', 0x823C9B50FD114196),
+    ('e4 d5', 0x0756B94461C50FB0),
+    ('e4 d5 e5', 0x662FAFB965DB29D4),
+    ('e4 d5 e5 f5', 0x22A48B5A8E47FF78),
+    ('e4 d5 e5 f5 Ke2', 0x652A607CA3F242C1),
+    ('e4 d5 e5 f5 Ke2 Kf7', 0x00FDD303C946BDD9),
+    ('a4 b5 h4 b4 c4', 0x3C8123EA7B067637),
+    ('a4 b5 h4 b4 c4 bxc3 Ra3', 0x5C3F9B829B279560),
+])
+def test_polyglot_key_matches_reference(moves, key):
+    assert polyglot_key(board_after(moves)) == key
+
+
+def test_castling_is_written_as_king_takes_rook():
+    board = Board()
+    board.set_fen('r3k2r/8/8/8/8/8/8/R3K2R w KQkq - 0 1')
+    castles = sorted(polyglot_move(move) for move in board.legal_moves() if move & CASTLING)
+    # e1a1 and e1h1
+    assert castles == [4 << 6, 4 << 6 | 7]
+
+
+def raw_move(board, san):
+    return polyglot_move(parse_san(board, next(san_moves(san))))
+
+
+@pytest.fixture
+def book(tmp_path):
+    board = Board()
+    start = polyglot_key(board)
+    entries = sorted([
+        (start, raw_move(board, 'e4'), 3, 0),
+        (start, raw_move(board, 'd4'), 1, 0),
+        (start, raw_move(board, 'a3'), 0, 0),
+        (start - 1, raw_move(board, 'c4'), 5, 0),
+        (start + 1, raw_move(board, 'Nf3'), 5, 0),
+    ])
+    path = tmp_path / 'book.bin'
+    path.write_bytes(b''.join(ENTRY.pack(*entry) for entry in entries))
+    book = OpeningBook(str(path))
+    yield book
+    book.close()
+
+
+def test_book_finds_the_position_entries(book):
+    board = Board()
+    moves = dict(book.moves(board))
+    assert sorted(moves.values()) == [0, 1, 3]
+    assert all(move in board.legal_moves() for move in moves)
+
+
+def test_book_skips_zero_weight_moves(book):
+    board = Board()
+    chosen = {book.choose(board, random.Random(seed)) for seed in range(50)}
+    assert chosen == {parse_san(board, next(san_moves(san))) for san in ('e4', 'd4')}
+
+
+def test_book_misses_unknown_position(book):
+    assert book.choose(board_after('e4')) is None
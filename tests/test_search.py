@@ -0,0 +1,97 @@
+import pytest
+from chessbot.board import Board
+from chessbot.chess_ai_bot import (search, score_to_table, score_from_table, MATE_SCORE,
+                                   TABLEBASE_WIN, DECISIVE_SCORE)
+from chessbot.transposition import TranspositionTable
+
+
+def board_from(fen):
+    board = Board()
+    board.set_fen(fen)
+    board.transposition_table = TranspositionTable()
+    return board
+
+
+@pytest.mark.parametrize('score', [MATE_SCORE - 7, -(MATE_SCORE - 4), TABLEBASE_WIN - 30,
+                                   -(TABLEBASE_WIN - 12)])
+def test_decisive_scores_are_stored_relative_to_the_node(score):
+    # A mate 7 plies from the root, found 3 plies down, is 4 plies from there
+    stored = score_to_table(score, 3)
+    assert abs(stored) == abs(score) + 3
+    assert score_from_table(stored, 3) == score
+    # Reached 5 plies from the root it is 2 plies further away
+    assert abs(score_from_table(stored, 5)) == abs(score) - 2
+    assert DECISIVE_SCORE < abs(score)
+
+
+def test_ordinary_scores_are_stored_as_they_are():
+    for score in (0, 350, -1200):
+        assert score_to_table(score, 6) == score_from_table(score, 6) == score
+
+
+def test_mate_distance_survives_the_table_between_moves():
+    # 1. Kc7 Ka7 2. Ra1#
+    board = board_from('k7/8/2K5/8/8/8/8/7R w - - 0 1')
+    move, score, _ = search(board, 'white', 4)
+    assert score == MATE_SCORE - 3
+    board.push(move)
+    reply, score, _ = search(board, 'black', 4)
+    assert score == MATE_SCORE - 2
+    board.push(reply)
+    # The same table, two plies nearer the mate
+    move, score, _ = search(board, 'white', 4)
+    assert score == MATE_SCORE - 1
+    board.push(move)
+    assert board.is_checkmate('black')
+
+
+def test_search_prefers_the_shorter_mate():
+    # Rh8 and Qg8 mate at once; other moves mate later
+    board = board_from('k7/8/1K6/8/8/8/8/6QR w - - 0 1')
+    move, score, _ = search(board, 'white', 4)
+    assert score == MATE_SCORE - 1
+    board.push(move)
+    assert board.is_checkmate('black')
+
+
+def square(name):
+    return (8 - int(name[1])) * 8 + ord(name[0]) - ord('a')
+
+
+@pytest.mark.parametrize('fen, player, depth, from_sq, to_sq', [
+    # Knight fork of king and rook
+    ('r3k3/8/8/1N6/8/8/8/4K3 w - - 0 1', 'white', 3, 'b5', 'c7'),
+    # Back-rank mate
+    ('6k1/5ppp/8/8/8/8/8/R5K1 w - - 0 1', 'white', 3, 'a1', 'a8'),
+    # Scholar's mate
+    ('r1bqkb1r/pppp1ppp/2n2n2/4p2Q/2B1P3/8/PPPP1PPP/RNB1K1NR w KQkq - 4 4', 'white', 3,
+     'h5', 'f7'),
+    # The queen takes a pawn with check instead of retreating from the knight
+    ('r1b1kbnr/pppp1ppp/2n5/4p3/3PP2q/5N2/PPP2PPP/RNBQKB1R b KQkq - 0 1', 'black', 3,
+     'h4', 'e4'),
+    # A quiet first move, searched late and reduced, mates in two
+    ('k7/8/2K5/8/8/8/8/7R w - - 0 1', 'white', 4, 'c6', 'c7'),
+])
+def test_search_finds_tactics_at_fixed_depth(fen, player, depth, from_sq, to_sq):
+    move, _, completed = search(board_from(fen), player, depth)
+    assert (move & 63, move >> 6 & 63) == (square(from_sq), square(to_sq))
+
+
+@pytest.mark.parametrize('depth', [3, 4, 5])
+def test_search_meets_a_mate_threat(depth):
+    # Re1 would mate; passing loses, so null-move cutoffs must not report it
+    board = board_from('4r1k1/5ppp/8/1N6/8/8/5PPP/6K1 w - - 0 1')
+    move, score, _ = search(board, 'white', depth)
+    assert abs(score) < DECISIVE_SCORE
+    board.push(move)
+    for reply in board.legal_moves():
+        board.push(reply)
+        assert not board.is_checkmate('white')
+        board.pop()
+
+
+def test_search_scores_are_stable_with_a_warm_table():
+    # Searching again with the filled table must not change the result
+    board = board_from('r1bqkb1r/pppp1ppp/2n2n2/4p3/2B1P3/5N2/PPPP1PPP/RNBQK2R w KQkq - 4 4')
+    first = search(board, 'white', 3)
+    assert search(board, 'white', 3)[:2] == first[:2]
@@ -0,0 +1,27 @@
+import pytest
+from chessbot.board import Board
+from chessbot.chess_ai_bot import get_best_move, SearchStats
+
+MIDDLEGAME = 'r4rk1/1pp1qppp/p1np1n2/2b1p1B1/2B1P1b1/P1NP1N2/1PP1QPPP/R4RK1 w - - 0 10'
+
+
+@pytest.mark.parametrize('workers', [1, 2])
+def test_search_fills_stats(workers):
+    board = Board()
+    board.set_fen(MIDDLEGAME)
+    stats = SearchStats()
+    move = get_best_move(board, 3, 'white', time_limit=None, workers=workers, stats=stats)
+    assert move in board.legal_moves()
+    assert stats.source == 'search'
+    assert stats.depth == 3
+    assert stats.nodes > stats.qnodes > 0
+    assert 0 < stats.tt_probes and stats.tt_hits <= stats.tt_probes
+    assert stats.as_dict()['nodes'] == stats.nodes
+
+
+def test_add_counts_sums_counters():
+    total, other = SearchStats(), SearchStats()
+    total.nodes, other.nodes = 10, 5
+    other.tt_probes, other.tt_hits = 4, 3
+    total.add_counts(other)
+    assert (total.nodes, total.tt_probes, total.tt_hits) == (15, 4, 3)
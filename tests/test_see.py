@@ -0,0 +1,65 @@
+import pytest
+from chessbot.bitboard import KNIGHT, QUEEN
+from chessbot.board import Board
+from chessbot.move import PROMOTION_SHIFT
+
+
+def square(name):
+    return (8 - int(name[1])) * 8 + ord(name[0]) - ord('a')
+
+
+def see(fen, from_name, to_name, promotion=QUEEN):
+    """Board.see of the legal move between the named squares."""
+    board = Board()
+    board.set_fen(fen)
+    for move in board.legal_moves():
+        if (move & 63 == square(from_name) and move >> 6 & 63 == square(to_name)
+                and move >> PROMOTION_SHIFT in (0, promotion)):
+            return board.see(move)
+    raise AssertionError(f"{from_name}{to_name} is not legal")
+
+
+@pytest.mark.parametrize('fen, from_name, to_name, value', [
+    # Undefended knight
+    ('4k3/8/8/4n3/8/8/8/K3R3 w - - 0 1', 'e1', 'e5', 320),
+    # Queen takes a pawn a pawn defends
+    ('4k3/8/4p3/3p4/8/8/8/K2Q4 w - - 0 1', 'd1', 'd5', 100 - 900),
+    # Quiet move onto a square a pawn guards
+    ('4k3/8/4p3/8/8/8/8/K2Q4 w - - 0 1', 'd1', 'd5', -900),
+    # Black recaptures with the king only when nothing takes it back
+    ('8/8/8/3kp3/8/8/8/K3R3 w - - 0 1', 'e1', 'e5', 100 - 500),
+    ('8/8/8/3kp3/8/8/4R3/K3R3 w - - 0 1', 'e2', 'e5', 100),
+])
+def test_see_of_captures(fen, from_name, to_name, value):
+    assert see(fen, from_name, to_name) == value
+
+
+@pytest.mark.parametrize('fen, from_name, to_name, value', [
+    # The rook behind on the file retakes: without it the exchange loses
+    ('3r2k1/8/8/3n4/8/8/3R4/K2R4 w - - 0 1', 'd2', 'd5', 320),
+    # The queen behind the bishop on the diagonal retakes the pawn
+    ('4k3/8/4p3/3n4/8/1B6/Q7/K7 w - - 0 1', 'b3', 'd5', 320 - 330 + 100),
+    # Black's x-ray through its own rook outnumbers white's single rook
+    ('3q2k1/3r4/8/3n4/8/8/8/K2R4 w - - 0 1', 'd1', 'd5', 320 - 500),
+])
+def test_see_counts_x_ray_attackers(fen, from_name, to_name, value):
+    assert see(fen, from_name, to_name) == value
+
+
+@pytest.mark.parametrize('fen, value', [
+    ('4k3/8/8/3pP3/8/8/8/4K3 w - d6 0 1', 100),
+    # The c-pawn takes back on d6
+    ('4k3/2p5/8/3pP3/8/8/8/4K3 w - d6 0 1', 0),
+])
+def test_see_of_en_passant(fen, value):
+    assert see(fen, 'e5', 'd6') == value
+
+
+@pytest.mark.parametrize('fen, promotion, value', [
+    ('r3k3/1P6/8/8/8/8/8/4K3 w - - 0 1', QUEEN, 500 + 900 - 100),
+    ('r3k3/1P6/8/8/8/8/8/4K3 w - - 0 1', KNIGHT, 500 + 320 - 100),
+    # The knight takes the new queen back
+    ('r3k3/1P6/1n6/8/8/8/8/4K3 w - - 0 1', QUEEN, 500 - 100),
+])
+def test_see_of_capture_promotions(fen, promotion, value):
+    assert see(fen, 'b7', 'a8', promotion) == value
@@ -0,0 +1,85 @@
+import random
+from array import array
+import pytest
+from chessbot.board import Board
+from chessbot.tablebase import MAGIC, Tablebase, ensure, normalize, parse_signature
+
+
+@pytest.fixture(scope='module')
+def tablebase(tmp_path_factory):
+    directory = tmp_path_factory.mktemp('tables')
+    tablebase = Tablebase(str(directory))
+    for signature in ('KQvK', 'KRvK'):
+        ensure(signature, tablebase, log=lambda line: None)
+    # Reopened so it sees the tables generated
+    tablebase.close()
+    tablebase = Tablebase(str(directory))
+    yield tablebase
+    tablebase.close()
+
+
+def board_from(fen):
+    board = Board()
+    board.set_fen(fen)
+    return board
+
+
+def test_signatures_put_stronger_side_first():
+    assert parse_signature('krvk') == 'KRvK'
+    assert normalize('K', 'KQ') == ('KQvK', True)
+    with pytest.raises(ValueError):
+        parse_signature('KQ')
+
+
+@pytest.mark.parametrize('fen, value', [
+    # Rh8 mates
+    ('k7/8/1K6/8/8/8/8/7R w - - 0 1', 1),
+    ('R6k/8/7K/8/8/8/8/8 b - - 0 1', -1),
+    # Stalemate
+    ('k7/8/1Q6/8/8/8/8/7K b - - 0 1', 0),
+    # The same mate with the colors swapped is looked up in KRvK
+    ('K7/8/1k6/8/8/8/8/7r b - - 0 1', 1),
+    # Bare kings
+    ('k7/8/8/8/8/8/8/7K w - - 0 1', 0),
+])
+def test_probe_known_positions(tablebase, fen, value):
+    assert tablebase.probe(board_from(fen)) == value
+
+
+def test_probe_declines_uncovered_positions(tablebase):
+    # Castling rights, a missing table and too many pieces
+    assert tablebase.probe(board_from('4k3/8/8/8/8/8/8/R3K3 w Q - 0 1')) is None
+    assert tablebase.probe(board_from('4k3/8/8/8/8/8/8/4KN2 w - - 0 1')) is None
+    assert tablebase.probe(board_from('4k3/8/8/8/8/8/8/R3KR2 w - - 0 1')) is None
+
+
+def test_best_move_mates(tablebase):
+    board = board_from('k7/8/1K6/8/8/8/8/7R w - - 0 1')
+    board.push(tablebase.best_move(board))
+    assert tablebase.probe(board) == -1
+    assert board.is_checkmate('black')
+
+
+def test_best_move_shortens_mate_by_one_ply(tablebase):
+    rng = random.Random(1)
+    checked = 0
+    while checked < 30:
+        placement = ['1'] * 64
+        for sq, letter in zip(rng.sample(range(64), 3), 'KRk'):
+            placement[sq] = letter
+        board = board_from('/'.join(''.join(placement[row * 8:row * 8 + 8]) for row in range(8))
+                           + ' w - - 0 1')
+        if board.is_in_check('black'):
+            continue
+        value = tablebase.probe(board)
+        if not value or value < 0:
+            continue
+        board.push(tablebase.best_move(board))
+        assert tablebase.probe(board) == -value
+        checked += 1
+
+
+def test_longest_mates(tablebase):
+    # Mate in 10 moves with the queen and 16 with the rook
+    for signature, plies in (('KQvK', 19), ('KRvK', 31)):
+        assert max(array('b', tablebase.table(signature).map[len(MAGIC):])) == plies
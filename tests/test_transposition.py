@@ -0,0 +1,50 @@
+from chessbot.transposition import TranspositionTable, EXACT, LOWERBOUND, buffer_size
+
+
+def test_store_then_probe_round_trip():
+    table = TranspositionTable(1)
+    table.store(0x123456789ABCDEF0, 5, EXACT, -42, 1234)
+    assert table.probe(0x123456789ABCDEF0) == (5, EXACT, -42, 1234)
+
+
+def test_probe_misses_unknown_key():
+    table = TranspositionTable(1)
+    table.store(1, 3, EXACT, 10, 99)
+    assert table.probe(2) is None
+    # Same bucket, different key
+    assert table.probe(1 + (table.mask + 1)) is None
+
+
+def test_restore_without_move_keeps_best_move():
+    table = TranspositionTable(1)
+    table.store(7, 2, EXACT, 5, 321)
+    table.store(7, 4, LOWERBOUND, 8, None)
+    assert table.probe(7) == (4, LOWERBOUND, 8, 321)
+
+
+def test_bucket_keeps_deep_entry_and_latest_entry():
+    table = TranspositionTable(1)
+    deep, shallow, latest = 3, 3 + (table.mask + 1), 3 + 2 * (table.mask + 1)
+    table.store(deep, 9, EXACT, 1, 11)
+    table.store(shallow, 1, EXACT, 2, 22)
+    table.store(latest, 1, EXACT, 3, 33)
+    assert table.probe(deep) == (9, EXACT, 1, 11)
+    assert table.probe(latest) == (1, EXACT, 3, 33)
+    assert table.probe(shallow) is None
+
+
+def test_clear_empties_table():
+    table = TranspositionTable(1)
+    table.store(5, 1, EXACT, 0, 1)
+    table.clear()
+    assert table.probe(5) is None
+
+
+def test_tables_over_one_buffer_share_entries():
+    buffer = bytearray(buffer_size(1))
+    writer = TranspositionTable(1, buffer)
+    writer.store(42, 6, EXACT, 17, 4321)
+    reader = TranspositionTable(1, buffer, clear=False)
+    assert reader.probe(42) == (6, EXACT, 17, 4321)
+    reader.release()
+    writer.release()